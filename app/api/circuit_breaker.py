@@ -0,0 +1,110 @@
+import asyncio
+import time
+from enum import Enum
+from typing import Awaitable, Callable, Optional
+
+from loguru import logger
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Запрос отклонён без обращения к серверу: цепь разомкнута."""
+
+    def __init__(self, retry_in: float):
+        super().__init__(f"Circuit open, retry in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+StateListener = Callable[[CircuitState, CircuitState], Awaitable[None]]
+
+
+class CircuitBreaker:
+    """Размыкатель цепи для запросов к серверу.
+
+    После failure_threshold сбоев подряд цепь размыкается, и запросы
+    сразу получают CircuitOpenError. Через reset_timeout пропускается
+    один пробный запрос: успех замыкает цепь, неудача снова размыкает
+    её с удвоенным таймаутом (не больше max_reset_timeout).
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 60,
+        max_reset_timeout: float = 15 * 60,
+        on_state_change: Optional[StateListener] = None,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.on_state_change = on_state_change
+        self.state = CircuitState.CLOSED
+        self._failures = 0
+        self._timeout = reset_timeout
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def closed(self) -> bool:
+        return self.state is CircuitState.CLOSED
+
+    @property
+    def retry_in(self) -> float:
+        """Сколько секунд до пробного запроса; 0 — можно пробовать."""
+        if self.state is not CircuitState.OPEN:
+            return 0.0
+        return max(self._opened_at + self._timeout - time.monotonic(), 0.0)
+
+    def before_call(self) -> None:
+        """Пропускает запрос или бросает CircuitOpenError."""
+        if self.state is CircuitState.CLOSED:
+            return
+        if self.state is CircuitState.OPEN:
+            if self.retry_in > 0:
+                raise CircuitOpenError(self.retry_in)
+            self._set_state(CircuitState.HALF_OPEN)
+        if self._probe_in_flight:
+            raise CircuitOpenError(0.0)
+        self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._probe_in_flight = False
+        if self.state is not CircuitState.CLOSED:
+            self._timeout = self.reset_timeout
+            self._set_state(CircuitState.CLOSED)
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self.state is CircuitState.HALF_OPEN:
+            self._probe_in_flight = False
+            self._timeout = min(self._timeout * 2, self.max_reset_timeout)
+            self._open()
+        elif (
+            self.state is CircuitState.CLOSED
+            and self._failures >= self.failure_threshold
+        ):
+            self._open()
+
+    def release(self) -> None:
+        """Пробный запрос завершился без вердикта (например, 4xx)."""
+        self._probe_in_flight = False
+
+    def _open(self) -> None:
+        self._opened_at = time.monotonic()
+        self._set_state(CircuitState.OPEN)
+
+    def _set_state(self, state: CircuitState) -> None:
+        previous, self.state = self.state, state
+        logger.warning(f"Circuit {previous.value} -> {state.value}")
+        if self.on_state_change is None:
+            return
+        task = asyncio.create_task(self.on_state_change(previous, state))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
@@ -1,36 +1,78 @@
 import asyncio
+import json
+import time
 from datetime import datetime
-from typing import Optional
+from typing import Any, Callable, Iterable, Mapping, Optional
 
-from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from aiohttp import ClientError, ClientSession, ClientTimeout, TCPConnector
 from loguru import logger
+from pydantic import ValidationError
 
+from app.api.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.api.http_cache import CacheEntry, HttpCache
+from app.api.priority_limiter import (
+    Lane,
+    PriorityRateLimiter,
+    parse_retry_after,
+)
+from app.metrics import (
+    DANBOORU_REQUEST_SECONDS,
+    DANBOORU_RESPONSES,
+    RATE_LIMIT_WAIT_SECONDS,
+)
 from app.models.danbooru import DanbooruPost
 
+try:
+    from orjson import loads as json_loads
+except ImportError:  # orjson — необязательная зависимость (extra speedups)
+    json_loads = json.loads
+
+# Пост в виде словаря из JSON-ответа, до валидации
+RawPost = dict[str, Any]
+
+DANBOORU_URL = "https://danbooru.donmai.us"
+
+
+class DanbooruUnavailableError(Exception):
+    """Временный отказ Danbooru (429, 5xx, сеть): запрос стоит повторить.
+
+    None из методов клиента означает окончательный ответ — например,
+    4xx на неверный запрос.
+    """
+
+    def __init__(self, url: str, reason: str):
+        super().__init__(f"Danbooru unavailable ({reason}): {url}")
+        self.reason = reason
+
 
 class RateLimiter:
-    """Token bucket rate limiter."""
+    """Token bucket rate limiter.
 
-    def __init__(self, max_calls: int, period: float):
+    Ожидание жетона пишется в RATE_LIMIT_WAIT_SECONDS с меткой name.
+    """
+
+    def __init__(self, max_calls: int, period: float, name: str = "default"):
         self.max_calls = max_calls
         self.period = period
+        self.name = name
         self.tokens = float(max_calls)
         self.last_update: Optional[float] = None
         self._lock = asyncio.Lock()
 
+    def _refill(self, now: float) -> None:
+        if self.last_update is not None:
+            elapsed = now - self.last_update
+            self.tokens = min(
+                self.max_calls,
+                self.tokens + elapsed * (self.max_calls / self.period),
+            )
+        self.last_update = now
+
     async def acquire(self) -> None:
+        started = asyncio.get_running_loop().time()
         async with self._lock:
             loop = asyncio.get_running_loop()
-            now = loop.time()
-
-            if self.last_update is not None:
-                elapsed = now - self.last_update
-                self.tokens = min(
-                    self.max_calls,
-                    self.tokens + elapsed * (self.max_calls / self.period),
-                )
-
-            self.last_update = now
+            self._refill(loop.time())
 
             if self.tokens < 1:
                 wait_time = (1 - self.tokens) * (self.period / self.max_calls)
@@ -39,16 +81,47 @@ class RateLimiter:
                 self.last_update = loop.time()
             else:
                 self.tokens -= 1
+        RATE_LIMIT_WAIT_SECONDS.observe(loop.time() - started, self.name)
+
+    def try_acquire(self) -> float:
+        """Берёт жетон без ожидания.
+
+        Возвращает 0, если жетон взят, иначе — через сколько секунд
+        он появится.
+        """
+        self._refill(asyncio.get_running_loop().time())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) * (self.period / self.max_calls)
+
+    def idle(self) -> bool:
+        """Ведро снова полное: лимитер можно пересоздать без потерь."""
+        self._refill(asyncio.get_running_loop().time())
+        return self.tokens >= self.max_calls
 
 
 class DanbooruAPI:
-    def __init__(self):
-        self.base_url = "https://danbooru.donmai.us"
-        self.rate_limiter = RateLimiter(max_calls=5, period=1)
-        self.server_error_backoff = 60
+    def __init__(
+        self,
+        tag_limit: int = 2,
+        cache: Optional[HttpCache] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        base_url: str = DANBOORU_URL,
+    ):
+        self.base_url = base_url.rstrip("/")
+        # Сколько тэгов аккаунт может указать в одном поиске
+        self.tag_limit = tag_limit
+        # Один бюджет запросов на всех: клики в диалоге, опрос, догрузка
+        self.rate_limiter = PriorityRateLimiter(max_calls=5, period=1)
+        # Во время аварии сервера запросы отклоняются сразу
+        self.breaker = breaker or CircuitBreaker()
+        self.cache = cache or HttpCache()
+        # Время жизни кэша по эндпоинтам, в секундах
+        self.cache_ttl = {"popular": 600, "hot": 300}
         self._session: Optional[ClientSession] = None
 
-    async def _get_session(self) -> ClientSession:
+    async def get_session(self) -> ClientSession:
         """Возвращает переиспользуемую сессию."""
         if self._session is None or self._session.closed:
             self._session = ClientSession(
@@ -60,64 +133,200 @@ class DanbooruAPI:
 
     async def close(self) -> None:
         """Закрывает HTTP-сессию."""
+        await self.rate_limiter.close()
         if self._session and not self._session.closed:
             await self._session.close()
             self._session = None
 
-    async def _make_request(
-        self, url: str, params: Optional[dict] = None
-    ) -> Optional[dict | list]:
-        """Выполняет HTTP-запрос с retry."""
-        retries = 3
-        session = await self._get_session()
+    async def _request(
+        self,
+        url: str,
+        params: Optional[dict] = None,
+        headers: Optional[dict] = None,
+        lane: Lane = Lane.SCHEDULED,
+    ) -> Optional[tuple[int, Any, Mapping[str, str]]]:
+        """Выполняет HTTP-запрос с retry.
 
+        Возвращает статус, тело и заголовки ответа; для 304 тело None,
+        для прочих ошибок 4xx — None. Повторы с паузами только в полосе
+        INTERACTIVE, где ждёт пользователь: фоновые полосы делают одну
+        попытку, чтобы не держать воркер опроса во сне. Временный отказ
+        (429, 5xx, сеть) после последней попытки бросает
+        DanbooruUnavailableError, чтобы вызывающий мог повторить позже.
+        Паузы делаются после закрытия ответа, чтобы не занимать
+        соединение пула. При разомкнутой цепи бросает CircuitOpenError,
+        не обращаясь к серверу.
+        """
+        retries = 3 if lane is Lane.INTERACTIVE else 1
+        session = await self.get_session()
+        endpoint = self._endpoint(url)
+
+        reason = "error"
         for attempt in range(retries):
-            await self.rate_limiter.acquire()
+            self.breaker.before_call()
+            started = None
             try:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        return await response.json()
-
-                    if response.status == 429:
-                        wait_time = 2**attempt
-                        logger.debug(f"Rate limited, retry in {wait_time}s")
-                        await asyncio.sleep(wait_time)
-                        continue
-
-                    if response.status >= 500:
-                        logger.error(f"Server error {response.status}: {url}")
-                        if attempt < retries - 1:
-                            await asyncio.sleep(self.server_error_backoff)
-                            continue
-                        return None
-
-                    logger.debug(f"Error {response.status}: {url}")
-                    return None
-
-            except asyncio.TimeoutError:
-                logger.error(f"Timeout: {url}")
+                await self.rate_limiter.acquire(lane)
+                started = time.perf_counter()
+                async with session.get(
+                    url, params=params, headers=headers
+                ) as response:
+                    status = response.status
+                    DANBOORU_RESPONSES.inc(str(status))
+                    self.rate_limiter.apply_headers(response.headers)
+                    if status < 500:
+                        # Сервер отвечает, даже если запрос неудачный
+                        self.breaker.record_success()
+
+                    if status == 200:
+                        data = await response.json(loads=json_loads)
+                        self.rate_limiter.on_success()
+                        return status, data, response.headers
+
+                    if status == 304:
+                        self.rate_limiter.on_success()
+                        return status, None, response.headers
+
+                    retry_after = parse_retry_after(
+                        response.headers.get("Retry-After")
+                    )
+
+            except (asyncio.TimeoutError, ClientError) as e:
+                logger.error(f"Request failed {url}: {e!r}")
+                reason = type(e).__name__
+                DANBOORU_RESPONSES.inc("error")
+                self.breaker.record_failure()
                 if attempt < retries - 1:
                     await asyncio.sleep(2**attempt)
-                    continue
+                continue
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
             except Exception as e:
                 logger.error(f"Request error {url}: {e}")
+                self.breaker.release()
                 return None
+            finally:
+                if started is not None:
+                    DANBOORU_REQUEST_SECONDS.observe(
+                        time.perf_counter() - started, endpoint
+                    )
 
-        logger.error(f"Failed after {retries} attempts: {url}")
-        return None
+            reason = str(status)
+            if status == 429:
+                # Пауза ложится на общий лимитер — её переждут все полосы
+                logger.warning(f"Rate limited ({lane.name.lower()}): {url}")
+                self.rate_limiter.on_rate_limited(retry_after)
+                continue
 
-    def _parse_posts(
-        self, data: Optional[list]
-    ) -> Optional[list[DanbooruPost]]:
-        """Парсит список постов."""
+            if status >= 500:
+                logger.error(f"Server error {status}: {url}")
+                self.breaker.record_failure()
+                if attempt < retries - 1:
+                    await asyncio.sleep(retry_after or 2**attempt)
+                continue
+
+            logger.debug(f"Error {status}: {url}")
+            return None
+
+        raise DanbooruUnavailableError(url, reason)
+
+    def _endpoint(self, url: str) -> str:
+        """Путь запроса без id поста — метка метрик."""
+        path = url.removeprefix(self.base_url)
+        if path.startswith("/posts/"):
+            return "/posts/:id.json"
+        return path
+
+    async def _make_request(
+        self,
+        url: str,
+        params: Optional[dict] = None,
+        lane: Lane = Lane.SCHEDULED,
+    ) -> Optional[dict | list]:
+        response = await self._request(url, params, lane=lane)
+        return response[1] if response else None
+
+    async def _cached_request(
+        self,
+        url: str,
+        params: dict,
+        ttl: float,
+        parse: Callable[[Any], Any],
+        lane: Lane = Lane.SCHEDULED,
+    ) -> Any:
+        """Запрос через кэш с ревалидацией по ETag/Last-Modified.
+
+        Свежая запись отдаётся без запроса, а на 304 возвращается уже
+        разобранный результат без повторного парсинга.
+        """
+        key = self.cache.key(url, params)
+        entry = await self.cache.get(key, parse)
+        if entry is not None and entry.fresh:
+            return entry.value
+
+        headers = entry.validators() if entry is not None else None
+        try:
+            response = await self._request(url, params, headers, lane)
+        except (CircuitOpenError, DanbooruUnavailableError):
+            if entry is None:
+                raise
+            # Пока сервер лежит, устаревший ответ лучше, чем никакого
+            return entry.value
+        if response is None:
+            return None
+
+        status, data, response_headers = response
+        if status == 304 and entry is not None:
+            logger.debug(f"Not modified: {url}")
+            await self.cache.touch(key, entry, ttl)
+            return entry.value
+
+        value = parse(data)
+        await self.cache.put(
+            key,
+            CacheEntry(
+                value=value,
+                raw=data,
+                expires_at=time.time() + ttl,
+                etag=response_headers.get("ETag"),
+                last_modified=response_headers.get("Last-Modified"),
+            ),
+        )
+        return value
+
+    @staticmethod
+    def _raw_posts(data: Optional[list]) -> Optional[list[RawPost]]:
         if data is None:
             return None
         if isinstance(data, list):
             return [
-                DanbooruPost(**post) for post in data if isinstance(post, dict)
+                post
+                for post in data
+                if isinstance(post, dict) and isinstance(post.get("id"), int)
             ]
         return []
 
+    @staticmethod
+    def build_posts(raw_posts: Iterable[RawPost]) -> list[DanbooruPost]:
+        """Полная валидация постов; битые посты пропускаются."""
+        posts = []
+        for raw in raw_posts:
+            try:
+                posts.append(DanbooruPost.model_validate(raw))
+            except ValidationError as e:
+                logger.debug(f"Skipping post {raw.get('id')}: {e}")
+        return posts
+
+    def _parse_posts(
+        self, data: Optional[list]
+    ) -> Optional[list[DanbooruPost]]:
+        """Парсит список постов."""
+        raw_posts = self._raw_posts(data)
+        if raw_posts is None:
+            return None
+        return self.build_posts(raw_posts)
+
     async def get_post(self, post_id: int) -> Optional[DanbooruPost]:
         url = f"{self.base_url}/posts/{post_id}.json"
         data = await self._make_request(url)
@@ -126,7 +335,7 @@ class DanbooruAPI:
         return None
 
     async def get_popular_posts(
-        self, page: int = 1, limit: int = 10
+        self, page: int = 1, limit: int = 10, lane: Lane = Lane.SCHEDULED
     ) -> Optional[list[DanbooruPost]]:
         url = f"{self.base_url}/explore/posts/popular.json"
         params = {
@@ -135,18 +344,85 @@ class DanbooruAPI:
             "page": page,
             "limit": limit,
         }
-        return self._parse_posts(await self._make_request(url, params))
+        return await self._cached_request(
+            url, params, self.cache_ttl["popular"], self._parse_posts, lane
+        )
 
     async def get_hot_posts(
-        self, limit: int = 10
+        self, limit: int = 10, lane: Lane = Lane.SCHEDULED
     ) -> Optional[list[DanbooruPost]]:
         url = f"{self.base_url}/posts.json"
         params = {"d": 1, "tags": "order:rank", "limit": limit}
-        return self._parse_posts(await self._make_request(url, params))
+        return await self._cached_request(
+            url, params, self.cache_ttl["hot"], self._parse_posts, lane
+        )
 
-    async def search_posts(
-        self, tags: str, limit: int = 10
-    ) -> Optional[list[DanbooruPost]]:
+    async def fetch_posts(
+        self, tags: str, limit: int = 10, lane: Lane = Lane.SCHEDULED
+    ) -> Optional[list[RawPost]]:
+        """Свежие посты по запросу без валидации моделей."""
+        url = f"{self.base_url}/posts.json"
+        params = {"tags": tags, "limit": limit}
+        return self._raw_posts(await self._make_request(url, params, lane))
+
+    async def fetch_posts_after(
+        self,
+        tags: str,
+        after_id: int,
+        limit: int = 100,
+        max_pages: int = 5,
+        lane: Lane = Lane.SCHEDULED,
+    ) -> Optional[list[RawPost]]:
+        """Забирает посты с id > after_id, листая страницы вперёд.
+
+        Использует последовательную пагинацию Danbooru (page=a<id>),
+        поэтому каждая страница продолжает предыдущую без пропусков.
+        """
+        url = f"{self.base_url}/posts.json"
+        collected: list[RawPost] = []
+        cursor = after_id
+
+        for _ in range(max_pages):
+            params = {"tags": tags, "limit": limit, "page": f"a{cursor}"}
+            try:
+                data = await self._make_request(url, params, lane)
+            except (CircuitOpenError, DanbooruUnavailableError):
+                if not collected:
+                    raise
+                data = None
+            posts = self._raw_posts(data)
+            if posts is None:
+                # Уже полученные страницы непрерывны — отдаём их
+                return collected or None
+            collected.extend(posts)
+            if len(posts) < limit:
+                break
+            cursor = max(post["id"] for post in posts)
+
+        return collected
+
+    async def fetch_posts_before(
+        self,
+        tags: str,
+        before_id: Optional[int],
+        limit: int = 100,
+        lane: Lane = Lane.BACKFILL,
+    ) -> Optional[list[RawPost]]:
+        """Страница постов с id < before_id, от новых к старым.
+
+        Без before_id отдаёт самые свежие посты; следующую страницу
+        запрашивают с id самого старого поста текущей (page=b<id>).
+        """
         url = f"{self.base_url}/posts.json"
         params = {"tags": tags, "limit": limit}
-        return self._parse_posts(await self._make_request(url, params))
+        if before_id is not None:
+            params["page"] = f"b{before_id}"
+        return self._raw_posts(await self._make_request(url, params, lane))
+
+    async def search_posts(
+        self, tags: str, limit: int = 10, lane: Lane = Lane.SCHEDULED
+    ) -> Optional[list[DanbooruPost]]:
+        raw_posts = await self.fetch_posts(tags, limit, lane)
+        if raw_posts is None:
+            return None
+        return self.build_posts(raw_posts)
@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+from urllib.parse import urlencode
+
+from loguru import logger
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    raw: Any
+    expires_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def fresh(self) -> bool:
+        return self.expires_at > time.time()
+
+    def validators(self) -> dict[str, str]:
+        """Заголовки условного запроса."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """Ограниченный LRU-кэш ответов с необязательной копией на диске.
+
+    В памяти хранится уже разобранный результат, поэтому ответ 304
+    не требует ни декодирования JSON, ни валидации. На диск пишется
+    исходный JSON — он разбирается один раз после перезапуска. Файлы
+    читаются и пишутся в отдельном потоке, а устаревшие удаляет prune.
+    """
+
+    def __init__(
+        self, max_entries: int = 128, directory: Optional[str] = None
+    ):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(url: str, params: Optional[dict] = None) -> str:
+        if not params:
+            return url
+        return f"{url}?{urlencode(sorted(params.items()))}"
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _load(
+        self, key: str, parse: Callable[[Any], Any]
+    ) -> Optional[CacheEntry]:
+        if not self.directory or not os.path.exists(self._path(key)):
+            return None
+        try:
+            with open(self._path(key), encoding="utf-8") as file:
+                stored = json.load(file)
+            return CacheEntry(
+                value=parse(stored["raw"]),
+                raw=stored["raw"],
+                expires_at=stored["expires_at"],
+                etag=stored.get("etag"),
+                last_modified=stored.get("last_modified"),
+            )
+        except Exception as e:
+            logger.debug(f"Broken cache file for {key}: {e}")
+            return None
+
+    def _store(self, key: str, entry: CacheEntry) -> None:
+        if not self.directory:
+            return
+        try:
+            with open(self._path(key), "w", encoding="utf-8") as file:
+                json.dump(
+                    {
+                        "raw": entry.raw,
+                        "expires_at": entry.expires_at,
+                        "etag": entry.etag,
+                        "last_modified": entry.last_modified,
+                    },
+                    file,
+                )
+        except OSError as e:
+            logger.debug(f"Cache write failed for {key}: {e}")
+
+    async def get(
+        self, key: str, parse: Callable[[Any], Any]
+    ) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            if not self.directory:
+                return None
+            entry = await asyncio.to_thread(self._load, key, parse)
+            if entry is None:
+                return None
+            self._remember(key, entry)
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remember(self, key: str, entry: CacheEntry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def put(self, key: str, entry: CacheEntry) -> None:
+        self._remember(key, entry)
+        if self.directory:
+            await asyncio.to_thread(self._store, key, entry)
+
+    async def touch(self, key: str, entry: CacheEntry, ttl: float) -> None:
+        """Продлевает запись после ответа 304."""
+        entry.expires_at = time.time() + ttl
+        if self.directory:
+            await asyncio.to_thread(self._store, key, entry)
+
+    def _remove_stale(self, before: float) -> int:
+        removed = 0
+        with os.scandir(self.directory) as files:
+            for file in files:
+                if not file.name.endswith(".json"):
+                    continue
+                try:
+                    if file.stat().st_mtime < before:
+                        os.remove(file.path)
+                        removed += 1
+                except OSError as e:
+                    logger.debug(f"Cache prune failed for {file.name}: {e}")
+        return removed
+
+    async def prune(self, max_age: float) -> int:
+        """Удаляет с диска файлы, не обновлявшиеся max_age секунд.
+
+        Ключ популярных постов содержит дату, поэтому без чистки
+        каталог растёт каждый день. Возвращает число удалённых файлов.
+        """
+        if not self.directory:
+            return 0
+        removed = await asyncio.to_thread(
+            self._remove_stale, time.time() - max_age
+        )
+        logger.info(f"HTTP cache: removed {removed} stale files")
+        return removed
@@ -0,0 +1,194 @@
+import asyncio
+from collections import deque
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from enum import IntEnum
+from typing import Mapping, Optional
+
+from loguru import logger
+
+from app.metrics import RATE_LIMIT_WAIT_SECONDS
+
+
+class Lane(IntEnum):
+    """Полосы запросов; меньше значение — выше приоритет."""
+
+    INTERACTIVE = 0
+    SCHEDULED = 1
+    BACKFILL = 2
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After в секундах: число или HTTP-дата."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((moment - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class PriorityRateLimiter:
+    """Общий token bucket с приоритетными полосами.
+
+    Жетоны выдаются диспетчером: сначала ждущим из более приоритетной
+    полосы. Полосам с долей (по умолчанию BACKFILL) дополнительно
+    ограничен собственный темп, чтобы фоновая работа не съедала весь
+    бюджет. Скорость адаптивна: 429 вдвое снижает её и ставит бюджет
+    на паузу по Retry-After, успешные ответы постепенно возвращают её.
+    """
+
+    def __init__(
+        self,
+        max_calls: int,
+        period: float,
+        shares: Optional[dict[Lane, float]] = None,
+        min_rate_factor: float = 0.2,
+        recovery: float = 0.05,
+        default_backoff: float = 2.0,
+    ):
+        self.max_rate = max_calls / period
+        self.rate = self.max_rate
+        self.burst = max_calls
+        self.tokens = float(max_calls)
+        self.shares = shares if shares is not None else {Lane.BACKFILL: 0.3}
+        self.min_rate = self.max_rate * min_rate_factor
+        self.recovery = recovery
+        self.default_backoff = default_backoff
+        self._lane_tokens = {lane: 1.0 for lane in self.shares}
+        self._queues: dict[Lane, deque[asyncio.Future]] = {
+            lane: deque() for lane in Lane
+        }
+        self._last_update: Optional[float] = None
+        self._paused_until = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def waiting(self, lane: Optional[Lane] = None) -> int:
+        lanes = [lane] if lane is not None else list(Lane)
+        return sum(
+            sum(1 for future in self._queues[item] if not future.done())
+            for item in lanes
+        )
+
+    async def acquire(self, lane: Lane = Lane.SCHEDULED) -> None:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        future = loop.create_future()
+        self._queues[lane].append(future)
+        self._ensure_dispatcher()
+        self._wakeup.set()
+        await future
+        RATE_LIMIT_WAIT_SECONDS.observe(
+            loop.time() - started, lane.name.lower()
+        )
+
+    async def close(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+
+    def _ensure_dispatcher(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    def _refill(self, now: float) -> None:
+        if self._last_update is not None:
+            elapsed = now - self._last_update
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+            for lane, share in self.shares.items():
+                self._lane_tokens[lane] = min(
+                    max(1.0, self.burst * share),
+                    self._lane_tokens[lane] + elapsed * self.rate * share,
+                )
+        self._last_update = now
+
+    def _next_lane(self) -> tuple[Optional[Lane], float]:
+        """Полоса, которой отдать жетон, и сколько ждать, если никому."""
+        wait = float("inf")
+        for lane in Lane:
+            queue = self._queues[lane]
+            while queue and queue[0].done():
+                queue.popleft()
+            if not queue:
+                continue
+            if self.tokens < 1:
+                return None, (1 - self.tokens) / self.rate
+            share = self.shares.get(lane)
+            if share is None or self._lane_tokens[lane] >= 1:
+                return lane, 0.0
+            wait = min(
+                wait, (1 - self._lane_tokens[lane]) / (self.rate * share)
+            )
+        return None, wait
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            self._refill(now)
+            if self._paused_until > now:
+                delay = self._paused_until - now
+            else:
+                lane, delay = self._next_lane()
+                if lane is not None:
+                    self.tokens -= 1
+                    if lane in self._lane_tokens:
+                        self._lane_tokens[lane] -= 1
+                    self._queues[lane].popleft().set_result(None)
+                    continue
+
+            self._wakeup.clear()
+            if delay == float("inf"):
+                await self._wakeup.wait()
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def pause(self, seconds: float) -> None:
+        """Останавливает выдачу жетонов всем полосам."""
+        until = asyncio.get_running_loop().time() + seconds
+        self._paused_until = max(self._paused_until, until)
+        self.tokens = min(self.tokens, 0.0)
+
+    def on_success(self) -> None:
+        if self.rate < self.max_rate:
+            self.rate = min(
+                self.max_rate, self.rate + self.max_rate * self.recovery
+            )
+
+    def on_rate_limited(self, retry_after: Optional[float]) -> None:
+        self.rate = max(self.min_rate, self.rate / 2)
+        delay = (
+            retry_after if retry_after is not None else self.default_backoff
+        )
+        logger.debug(
+            f"Rate limited: pausing {delay:.1f}s, rate {self.rate:.2f}/s"
+        )
+        self.pause(delay)
+
+    def apply_headers(self, headers: Mapping[str, str]) -> None:
+        """Учитывает стандартные заголовки остатка лимита, если они есть."""
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        try:
+            remaining_calls, reset_after = float(remaining), float(reset)
+        except ValueError:
+            return
+        # Reset бывает и unix-временем, и числом секунд
+        if reset_after > 1e9:
+            reset_after -= datetime.now(timezone.utc).timestamp()
+        if remaining_calls <= 0 and reset_after > 0:
+            self.pause(reset_after)
@@ -0,0 +1,41 @@
+from aiogram.types import CallbackQuery
+from aiogram_dialog import DialogManager
+from aiogram_dialog.widgets.kbd import Button
+
+from app.services.backfill import BackfillService
+from app.services.danbooru import DanbooruService
+
+
+async def _from_admin(callback: CallbackQuery, manager: DialogManager) -> bool:
+    """Кнопки скрыты от остальных, но callback можно прислать и вручную."""
+    danbooru: DanbooruService = manager.middleware_data.get("danbooru")
+    if callback.from_user.id == danbooru.admin_id:
+        return True
+    await callback.answer("⛔ Доступно администратору")
+    return False
+
+
+async def on_backfill_start(
+    callback: CallbackQuery, button: Button, manager: DialogManager
+):
+    if not await _from_admin(callback, manager):
+        return
+    backfill: BackfillService = manager.middleware_data.get("backfill")
+    sub_id = manager.dialog_data.get("selected_sub")
+    if await backfill.start(sub_id, callback.message.chat.id):
+        await callback.answer("📜 История загрузится в фоне")
+    else:
+        await callback.answer("⏳ История уже загружается")
+
+
+async def on_backfill_cancel(
+    callback: CallbackQuery, button: Button, manager: DialogManager
+):
+    if not await _from_admin(callback, manager):
+        return
+    backfill: BackfillService = manager.middleware_data.get("backfill")
+    sub_id = manager.dialog_data.get("selected_sub")
+    if await backfill.cancel(sub_id, callback.message.chat.id):
+        await callback.answer("⏹ Загрузка истории остановлена")
+    else:
+        await callback.answer("🤷 Загрузка уже завершилась")
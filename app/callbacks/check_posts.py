@@ -10,7 +10,7 @@ async def on_popular_click(
 ):
     danbooru: DanbooruService = manager.middleware_data.get("danbooru")
     await callback.answer("🚀 Получаем популярные посты")
-    await danbooru.check_popular_posts()
+    await danbooru.check_popular_posts(callback.message.chat.id)
 
 
 async def on_hot_click(
@@ -18,4 +18,4 @@ async def on_hot_click(
 ):
     danbooru: DanbooruService = manager.middleware_data.get("danbooru")
     await callback.answer("🌶 Получаем горячие посты")
-    await danbooru.check_hot_posts()
+    await danbooru.check_hot_posts(callback.message.chat.id)
@@ -2,10 +2,13 @@ from aiogram.types import CallbackQuery
 from aiogram_dialog import DialogManager
 from aiogram_dialog.widgets.kbd import Button
 
+from app.getters.subscribes_selector import SCROLL_ID
+
 
 async def on_clear_filter(
     callback: CallbackQuery, button: Button, manager: DialogManager
 ):
     del manager.dialog_data["search_query"]
+    await manager.find(SCROLL_ID).set_page(0)
     await callback.answer("🧹 Поисковый фильтр очищен!")
     await manager.update({})
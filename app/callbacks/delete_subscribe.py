@@ -11,16 +11,18 @@ from app.states.danmenu import DanMenu
 async def on_select_sub(
     callback: ChatEvent, select: Any, manager: DialogManager, item_id: str
 ):
-    manager.dialog_data["sub_to_delete"] = int(item_id)
-    await manager.switch_to(state=DanMenu.delete)
+    manager.dialog_data["selected_sub"] = int(item_id)
+    await manager.switch_to(state=DanMenu.subscription)
 
 
 async def on_delete_confirm(
     callback: CallbackQuery, button: Button, manager: DialogManager
 ):
     repo: Repo = manager.middleware_data.get("repo")
-    sub_id = manager.dialog_data.get("sub_to_delete")
-    tag = await repo.delete_sub(sub_id=int(sub_id))
+    sub_id = manager.dialog_data.get("selected_sub")
+    tag = await repo.delete_sub(
+        sub_id=int(sub_id), chat_id=callback.message.chat.id
+    )
     if tag:
         await callback.message.answer(
             f"<b>👌 Подписка '{tag}' успешно удалена!</b>", parse_mode="HTML"
@@ -0,0 +1,22 @@
+from aiogram.types import BufferedInputFile, CallbackQuery
+from aiogram_dialog import DialogManager
+from aiogram_dialog.widgets.kbd import Button
+
+from app.services.repository import Repo
+from app.services.subscription_io import export_document
+
+
+async def on_export_click(
+    callback: CallbackQuery, button: Button, manager: DialogManager
+):
+    repo: Repo = manager.middleware_data.get("repo")
+    subscriptions = await repo.get_subscriptions_list(callback.message.chat.id)
+    if not subscriptions:
+        await callback.answer("🤷 Подписок пока нет")
+        return
+    await callback.answer("📤 Готовим список подписок")
+    document = export_document(tags for _, tags in subscriptions)
+    await callback.message.answer_document(
+        BufferedInputFile(document, filename="subscriptions.txt"),
+        caption=f"📤 Подписок: {len(subscriptions)}",
+    )
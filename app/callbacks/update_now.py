@@ -1,12 +1,18 @@
 from aiogram_dialog import DialogManager
 from aiogram_dialog.widgets.kbd import Button
 from aiogram.types import CallbackQuery
+from app.services.danbooru import DanbooruService
 from app.services.schedules import Schedules
 
 
 async def on_update_now(
     callback: CallbackQuery, button: Button, manager: DialogManager
 ):
+    danbooru: DanbooruService = manager.middleware_data.get("danbooru")
+    # Кнопка скрыта от остальных, но callback можно прислать и вручную
+    if callback.from_user.id != danbooru.admin_id:
+        await callback.answer("⛔ Доступно администратору")
+        return
     scheduler: Schedules = manager.middleware_data.get("scheduler")
     await callback.answer("Запущена проверка обновлений!")
     await scheduler.do_next_job_now()
@@ -8,6 +8,14 @@ async def set_default_commands(bot: Bot):
             command="start",
             description="Меню",
         ),
+        BotCommand(
+            command="filter",
+            description="Фильтры постов",
+        ),
+        BotCommand(
+            command="stats",
+            description="Статистика бота",
+        ),
     ]
 
     await bot.set_my_commands(
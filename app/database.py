@@ -0,0 +1,95 @@
+import time
+
+from sqlalchemy import QueuePool, event, make_url
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.metrics import DB_QUERY_SECONDS
+
+DEFAULT_DATABASE_URL = "sqlite+aiosqlite:///database/db.sqlite"
+
+# Вставка с ON CONFLICT для каждого поддерживаемого диалекта
+_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def dialect_insert(dialect_name: str):
+    """insert() с on_conflict_* для диалекта соединения."""
+    try:
+        return _INSERTS[dialect_name]
+    except KeyError:
+        raise ValueError(f"Unsupported database: {dialect_name}") from None
+
+
+def _sqlite_pragmas(cache_mb: int, mmap_mb: int) -> list[str]:
+    return [
+        # WAL: читатели не ждут писателя, коммит без fsync основного файла
+        "PRAGMA journal_mode=WAL",
+        # В режиме WAL NORMAL не теряет целостность, только последний коммит
+        "PRAGMA synchronous=NORMAL",
+        # Отрицательное значение — размер в KiB, а не в страницах
+        f"PRAGMA cache_size=-{cache_mb * 1024}",
+        f"PRAGMA mmap_size={mmap_mb * 1024 * 1024}",
+        "PRAGMA temp_store=MEMORY",
+        # Несколько процессов (RUN_MODE) пишут в один файл
+        "PRAGMA busy_timeout=5000",
+    ]
+
+
+def _statement_kind(statement: str) -> str:
+    # Первое слово запроса: SELECT, INSERT, UPDATE, PRAGMA...
+    head = statement.lstrip()[:16].split(None, 1)
+    return head[0].upper() if head else "OTHER"
+
+
+def _instrument(engine: AsyncEngine) -> None:
+    """Время каждого запроса к БД в гистограмму DB_QUERY_SECONDS."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context, many):
+        started = conn.info["query_started"].pop()
+        DB_QUERY_SECONDS.observe(
+            time.perf_counter() - started, _statement_kind(statement)
+        )
+
+    @event.listens_for(sync_engine, "handle_error")
+    def drop_timer(context):
+        # Упавший запрос не доходит до after_cursor_execute
+        conn = context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+
+
+def create_engine(
+    url: str = DEFAULT_DATABASE_URL,
+    pool_size: int = 5,
+    max_overflow: int = 10,
+    sqlite_cache_mb: int = 64,
+    sqlite_mmap_mb: int = 256,
+) -> AsyncEngine:
+    """Движок БД: настроенный SQLite или PostgreSQL (asyncpg)."""
+    parsed = make_url(url)
+    pool_options = {}
+    # SQLite в памяти живёт в одном соединении (StaticPool), и
+    # размеры пула такому пулу не передаются
+    if issubclass(parsed.get_dialect().get_pool_class(parsed), QueuePool):
+        pool_options = {"pool_size": pool_size, "max_overflow": max_overflow}
+    engine = create_async_engine(
+        parsed, echo=False, pool_pre_ping=True, **pool_options
+    )
+    if engine.dialect.name == "sqlite":
+        pragmas = _sqlite_pragmas(sqlite_cache_mb, sqlite_mmap_mb)
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+    _instrument(engine)
+    return engine
@@ -0,0 +1,16 @@
+from typing import Optional
+
+from aiogram.filters import BaseFilter
+from aiogram.types import Message
+
+
+class AllowedFilter(BaseFilter):
+    """Пускает пользователей из списка; None — всех."""
+
+    def __init__(self, allowed_ids: Optional[set[int]]):
+        self.allowed_ids = allowed_ids
+
+    async def __call__(self, message: Message) -> bool:
+        if self.allowed_ids is None:
+            return True
+        return message.from_user.id in self.allowed_ids
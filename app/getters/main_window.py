@@ -1,5 +1,6 @@
 from aiogram_dialog import DialogManager
 
+from app.services.danbooru import DanbooruService
 from app.services.repository import Repo
 from app.services.schedules import Schedules
 
@@ -7,9 +8,15 @@ from app.services.schedules import Schedules
 async def main_window_getter(dialog_manager: DialogManager, **kwargs):
     repo: Repo = dialog_manager.middleware_data.get("repo")
     scheduler: Schedules = dialog_manager.middleware_data.get("scheduler")
-    subscribes = await repo.get_subscriptions_list() or []
+    danbooru: DanbooruService = dialog_manager.middleware_data.get("danbooru")
+    chat = dialog_manager.middleware_data.get("event_chat")
+    subs_counter = await repo.cached(
+        chat.id, ("count", None), lambda: repo.count_subscriptions(chat.id)
+    )
     minutes_until_next_run = await scheduler.get_next_update_time()
     return {
         "minutes_until_next_update": f"{str(minutes_until_next_run)}",
-        "subs_counter": f"{str(len(subscribes))}",
+        "subs_counter": f"{str(subs_counter)}",
+        # Внеочередной опрос всех подписок — только для администратора
+        "is_admin": chat.id == danbooru.admin_id,
     }
@@ -2,16 +2,49 @@ from aiogram_dialog import DialogManager
 
 from app.services.repository import Repo
 
+# Кнопок подписок на странице: две колонки по десять
+PAGE_SIZE = 20
+SCROLL_ID = "subs_scroll"
+
 
 async def get_subscribes(dialog_manager: DialogManager, **kwargs):
     repo: Repo = dialog_manager.middleware_data.get("repo")
+    chat = dialog_manager.middleware_data.get("event_chat")
     search_query = dialog_manager.dialog_data.get("search_query")
 
-    if search_query:
-        subscriptions = await repo.search_subscribes_by_tags(search_query)
+    # Из БД читается только текущая страница
+    total = await repo.cached(
+        chat.id,
+        ("count", search_query),
+        lambda: repo.count_subscriptions(chat.id, search_query),
+    )
+    pages = max((total + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+    scroll = dialog_manager.find(SCROLL_ID)
+    page = await scroll.get_page()
+    if page >= pages:
+        # Страница опустела после удаления подписок
+        page = pages - 1
+        await scroll.set_page(page)
+    offset = page * PAGE_SIZE
+
+    if not total:
+        subscriptions = None
+    elif search_query:
+        subscriptions = await repo.cached(
+            chat.id,
+            ("search", search_query, page),
+            lambda: repo.search_subscribes_by_tags(
+                search_query, chat.id, PAGE_SIZE, offset
+            ),
+        )
     else:
-        subscriptions = await repo.get_subscriptions_list()
+        subscriptions = await repo.cached(
+            chat.id,
+            ("page", page),
+            lambda: repo.get_subscriptions_list(chat.id, PAGE_SIZE, offset),
+        )
 
     return {
         "subscriptions": subscriptions or None,
+        "pages": pages,
     }
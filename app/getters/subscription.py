@@ -0,0 +1,35 @@
+from aiogram_dialog import DialogManager
+
+from app.models.backfill import (
+    BACKFILL_CANCELLED,
+    BACKFILL_DONE,
+    BACKFILL_RUNNING,
+)
+from app.services.danbooru import DanbooruService
+from app.services.repository import Repo
+
+BACKFILL_STATUSES = {
+    BACKFILL_RUNNING: "⏳ загружается",
+    BACKFILL_DONE: "✅ загружена",
+    BACKFILL_CANCELLED: "⏹ остановлена",
+}
+
+
+async def subscription_getter(dialog_manager: DialogManager, **kwargs):
+    repo: Repo = dialog_manager.middleware_data.get("repo")
+    danbooru: DanbooruService = dialog_manager.middleware_data.get("danbooru")
+    chat = dialog_manager.middleware_data.get("event_chat")
+    sub_id = dialog_manager.dialog_data.get("selected_sub")
+
+    tags = await repo.get_subscription_tags(sub_id, chat.id)
+    # Прогресс меняется каждую страницу, поэтому мимо кэша геттеров
+    job = await repo.get_backfill(sub_id, chat.id)
+    return {
+        "tags": tags or "—",
+        "is_admin": chat.id == danbooru.admin_id,
+        "backfill_status": BACKFILL_STATUSES.get(job.status) if job else None,
+        "backfill_running": bool(job) and job.status == BACKFILL_RUNNING,
+        "fetched": job.fetched if job else 0,
+        "max_posts": job.max_posts if job else 0,
+        "queued": job.queued if job else 0,
+    }
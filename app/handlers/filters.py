@@ -0,0 +1,114 @@
+from html import escape
+from typing import Optional
+
+from aiogram.enums import ParseMode
+from aiogram.filters import CommandObject
+from aiogram.types import Message
+
+from app.models.filter_rules import (
+    RULE_EXCLUDE,
+    RULE_INCLUDE,
+    RULE_KINDS,
+    RULE_RATING,
+)
+from app.services.content_filter import RATINGS
+from app.services.danbooru import DanbooruService
+from app.services.repository import Repo
+from app.services.subscription_io import normalize_query
+
+FILTER_HELP = (
+    "<b>🧹 Фильтры постов</b>\n"
+    "/filter — показать правила\n"
+    "/filter exclude тэги — не присылать посты с любым из тэгов\n"
+    "/filter include тэги — присылать только посты со всеми тэгами\n"
+    "/filter rating g s — допустимые рейтинги (g, s, q, e)\n"
+    "/filter remove id — удалить правило\n"
+    "/filter clear — удалить все правила чата\n\n"
+    "Добавьте в конце <code>@ запрос подписки</code>, чтобы правило "
+    "действовало только на неё. Администратор может начать команду "
+    "со слова global — правило для всех чатов."
+)
+
+_KIND_ICONS = {RULE_EXCLUDE: "⛔", RULE_INCLUDE: "✅", RULE_RATING: "🔞"}
+
+
+def _format_rule(
+    rule: tuple[int, Optional[int], Optional[str], str, str],
+) -> str:
+    rule_id, chat_id, sub_tags, kind, value = rule
+    line = f"#{rule_id} {_KIND_ICONS[kind]} {kind} {escape(value)}"
+    if chat_id is None:
+        line += " — все чаты"
+    if sub_tags is not None:
+        line += f" — подписка {escape(sub_tags)}"
+    return line
+
+
+async def filter_command(
+    message: Message,
+    command: CommandObject,
+    repo: Repo,
+    danbooru: DanbooruService,
+):
+    chat_id = message.chat.id
+    is_admin = chat_id == danbooru.admin_id
+    args = (command.args or "").split()
+
+    if not args:
+        rules = await repo.get_chat_filter_rules(chat_id)
+        text = "\n".join(map(_format_rule, rules)) or "Правил пока нет"
+        await message.answer(
+            f"{FILTER_HELP}\n\n{text}", parse_mode=ParseMode.HTML
+        )
+        return
+
+    scope_chat: Optional[int] = chat_id
+    if args[0] == "global":
+        if not is_admin:
+            await message.answer("⛔ Общие правила задаёт администратор")
+            return
+        scope_chat = None
+        args = args[1:]
+
+    action, values = (args[0], args[1:]) if args else ("", [])
+    if action == "remove" and len(values) == 1 and values[0].isdigit():
+        removed = await repo.delete_filter_rule(
+            int(values[0]), chat_id, is_admin
+        )
+        await message.answer(
+            "🗑 Правило удалено" if removed else "🤷 Правило не найдено"
+        )
+        return
+    if action == "clear" and not values:
+        count = await repo.clear_filter_rules(chat_id)
+        await message.answer(f"🗑 Удалено правил: {count}")
+        return
+    if action not in RULE_KINDS or not values:
+        await message.answer(FILTER_HELP, parse_mode=ParseMode.HTML)
+        return
+
+    sub_id = None
+    if "@" in values:
+        split = values.index("@")
+        values, sub_query = values[:split], " ".join(values[split + 1 :])
+        if scope_chat is None:
+            await message.answer("⛔ Общее правило не привязать к подписке")
+            return
+        sub_id = await repo.get_chat_subscription_id(
+            chat_id, normalize_query(sub_query)
+        )
+        if sub_id is None:
+            await message.answer(f"🤷 Нет подписки «{sub_query}»")
+            return
+
+    if action == RULE_RATING:
+        ratings = {value[0] for value in values if value[:1] in RATINGS}
+        values = ["".join(sorted(ratings))] if ratings else []
+    else:
+        values = normalize_query(" ".join(values)).split()
+    if not values:
+        await message.answer(FILTER_HELP, parse_mode=ParseMode.HTML)
+        return
+
+    added = await repo.add_filter_rules(scope_chat, sub_id, action, values)
+    await message.answer(f"✅ Добавлено правил: {added}")
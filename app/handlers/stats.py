@@ -0,0 +1,66 @@
+from aiogram.enums import ParseMode
+from aiogram.types import Message
+
+from app.metrics import (
+    DANBOORU_REQUEST_SECONDS,
+    DANBOORU_RESPONSES,
+    DB_QUERY_SECONDS,
+    RATE_LIMIT_WAIT_SECONDS,
+    SWEEP_POSTS,
+    SWEEP_SECONDS,
+    TELEGRAM_SEND_ERRORS,
+    TELEGRAM_SEND_SECONDS,
+    Histogram,
+)
+from app.services.danbooru import DanbooruService
+from app.services.repository import Repo
+
+
+def _latency(histogram: Histogram) -> str:
+    series = histogram.merged()
+    if not series.count:
+        return "нет данных"
+    p50 = histogram.quantile(0.5, series)
+    p95 = histogram.quantile(0.95, series)
+    return f"{series.count} шт., p50 ≤ {p50:g} с, p95 ≤ {p95:g} с"
+
+
+def _status_count(prefix: str) -> int:
+    return int(
+        sum(
+            value
+            for (status,), value in DANBOORU_RESPONSES.values.items()
+            if status.startswith(prefix)
+        )
+    )
+
+
+async def stats_command(
+    message: Message, repo: Repo, danbooru: DanbooruService
+):
+    if message.chat.id != danbooru.admin_id:
+        await message.answer("⛔ Статистика доступна администратору")
+        return
+
+    outbox = await repo.count_outbox()
+    outbox_text = (
+        ", ".join(f"{status}: {count}" for status, count in outbox.items())
+        or "пусто"
+    )
+    sweeps = SWEEP_POSTS.merged()
+    text = (
+        "<b>📊 Статистика процесса</b>\n"
+        f"Danbooru: {_latency(DANBOORU_REQUEST_SECONDS)}\n"
+        f"Ответы 429: {_status_count('429')}, 5xx: {_status_count('5')}, "
+        f"сетевые ошибки: {_status_count('error')}\n"
+        f"Ожидание лимита: {_latency(RATE_LIMIT_WAIT_SECONDS)}\n"
+        f"Цепь Danbooru: {danbooru.api.breaker.state.value}, "
+        f"в очереди лимитера: {danbooru.api.rate_limiter.waiting()}\n"
+        f"Опросы: {_latency(SWEEP_SECONDS)}, "
+        f"новых доставок: {sweeps.sum:g}\n"
+        f"БД: {_latency(DB_QUERY_SECONDS)}\n"
+        f"Telegram: {_latency(TELEGRAM_SEND_SECONDS)}, "
+        f"ошибок: {TELEGRAM_SEND_ERRORS.total():g}\n"
+        f"Outbox: {outbox_text}"
+    )
+    await message.answer(text, parse_mode=ParseMode.HTML)
@@ -1,18 +1,32 @@
+from html import escape
+
 from aiogram.enums import ParseMode
 from aiogram.types import Message
 from aiogram_dialog import DialogManager, StartMode
 from aiogram_dialog.widgets.input import MessageInput
 
+from app.getters.subscribes_selector import SCROLL_ID
+from app.services.danbooru import DanbooruService
 from app.services.repository import Repo
+from app.services.subscription_io import normalize_query, parse_import
 from app.states.danmenu import DanMenu
 
+VALIDATE_ID = "validate_import"
+# Документы больше мегабайта не скачиваем
+MAX_IMPORT_BYTES = 1_000_000
+# Отчёт должен уложиться в одно сообщение Telegram
+REPORT_LIMIT = 10
+REPORT_ITEM_LENGTH = 50
+
 
 async def add_new_subscribe(
     message: Message, message_input: MessageInput, manager: DialogManager
 ):
     repo: Repo = manager.middleware_data.get("repo")
-    tags = message.text
-    result = await repo.add_subscription(tags)
+    tags = normalize_query(message.text)
+    if not tags:
+        return
+    result = await repo.add_subscription(tags, message.chat.id)
     if result:
         await message.answer(
             f"<b>✅ {tags} - успешно добавлено!</b>", parse_mode=ParseMode.HTML
@@ -31,3 +45,71 @@ async def search_subscribes(
 ):
     tags = message.text
     manager.dialog_data["search_query"] = tags
+    # Новый поиск начинается с первой страницы
+    await manager.find(SCROLL_ID).set_page(0)
+
+
+def _report_section(title: str, queries: list[str]) -> list[str]:
+    if not queries:
+        return []
+    lines = [f"<b>{title}: {len(queries)}</b>"]
+    lines += [
+        f"• {escape(query[:REPORT_ITEM_LENGTH])}"
+        for query in queries[:REPORT_LIMIT]
+    ]
+    if len(queries) > REPORT_LIMIT:
+        lines.append(f"… и ещё {len(queries) - REPORT_LIMIT}")
+    return lines
+
+
+async def import_subscribes(
+    message: Message, message_input: MessageInput, manager: DialogManager
+):
+    repo: Repo = manager.middleware_data.get("repo")
+    danbooru: DanbooruService = manager.middleware_data.get("danbooru")
+
+    if message.document:
+        if (message.document.file_size or 0) > MAX_IMPORT_BYTES:
+            await message.answer(
+                "<b>❌ Файл больше 1 МБ</b>", parse_mode=ParseMode.HTML
+            )
+            return
+        data = (await message.bot.download(message.document)).read()
+    else:
+        data = (message.text or "").encode()
+
+    queries, malformed = parse_import(data)
+    if not queries:
+        await message.answer(
+            "<b>🤷 В документе не нашлось ни одного запроса</b>",
+            parse_mode=ParseMode.HTML,
+        )
+        return
+
+    rejected, empty, unchecked = [], [], []
+    if manager.find(VALIDATE_ID).is_checked():
+        await message.answer(
+            f"<b>🔎 Проверяю запросы на Danbooru: {len(queries)}</b>",
+            parse_mode=ParseMode.HTML,
+        )
+        rejected, empty, unchecked = await danbooru.validate_queries(queries)
+        skipped = set(rejected)
+        queries = [query for query in queries if query not in skipped]
+
+    result = await repo.add_subscriptions_bulk(queries, message.chat.id)
+    if result is None:
+        await message.answer(
+            "<b>❌ Не удалось сохранить подписки</b>",
+            parse_mode=ParseMode.HTML,
+        )
+        return
+    added, existing = result
+
+    lines = [f"<b>✅ Добавлено: {len(added)}</b>"]
+    lines += _report_section("💡 Уже были", existing)
+    lines += _report_section("❌ Отклонены Danbooru", rejected)
+    lines += _report_section("⚠️ Пока без постов", empty)
+    lines += _report_section("⏳ Не проверены, Danbooru недоступен", unchecked)
+    lines += _report_section("🚫 Слишком длинные или сверх лимита", malformed)
+    await message.answer("\n".join(lines), parse_mode=ParseMode.HTML)
+    await manager.switch_to(DanMenu.sub_list)
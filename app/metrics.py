@@ -0,0 +1,246 @@
+"""Метрики горячих путей в формате Prometheus.
+
+Счётчики и гистограммы — простые числа и заранее выделенные списки
+корзин. Бот работает в одном потоке событийного цикла, поэтому
+обновление метрики — это пара операций без блокировок и await.
+"""
+
+from bisect import bisect_left
+from typing import Callable, Optional
+
+from aiohttp import web
+from loguru import logger
+
+# Секунды: от быстрых запросов к БД до долгих опросов
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+LabelValues = tuple[str, ...]
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{v}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        REGISTRY.append(self)
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self.values: dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        values = self.values
+        values[labels] = values.get(labels, 0) + amount
+
+    def total(self) -> float:
+        return sum(self.values.values())
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for labels, value in sorted(self.values.items()):
+            lines.append(
+                f"{self.name}{_format_labels(self.labels, labels)} {value:g}"
+            )
+        return lines
+
+
+class Gauge(Metric):
+    """Значение, которое вычисляется в момент чтения метрик."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self.function: Optional[Callable[[], float]] = None
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self.function = function
+
+    def value(self) -> Optional[float]:
+        return None if self.function is None else float(self.function())
+
+    def render(self) -> list[str]:
+        value = self.value()
+        if value is None:
+            return []
+        return super().render() + [f"{self.name} {value:g}"]
+
+
+class _Series:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        # Корзины не накопительные: так observe обновляет одну ячейку
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        self.series: dict[LabelValues, _Series] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = _Series(len(self.buckets) + 1)
+        series.counts[bisect_left(self.buckets, value)] += 1
+        series.sum += value
+        series.count += 1
+
+    def merged(self) -> _Series:
+        """Все серии вместе — для сводки /stats."""
+        total = _Series(len(self.buckets) + 1)
+        for series in self.series.values():
+            total.counts = [a + b for a, b in zip(total.counts, series.counts)]
+            total.sum += series.sum
+            total.count += series.count
+        return total
+
+    def quantile(self, q: float, series: Optional[_Series] = None) -> float:
+        """Оценка квантиля по верхней границе корзины."""
+        series = series or self.merged()
+        if not series.count:
+            return 0.0
+        rank = q * series.count
+        seen = 0
+        for bound, count in zip(self.buckets, series.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for labels, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(
+                (*self.buckets, float("inf")), series.counts
+            ):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                bucket_labels = _format_labels(
+                    (*self.labels, "le"), (*labels, le)
+                )
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            suffix = _format_labels(self.labels, labels)
+            lines.append(f"{self.name}_sum{suffix} {series.sum:g}")
+            lines.append(f"{self.name}_count{suffix} {series.count}")
+        return lines
+
+
+REGISTRY: list[Metric] = []
+
+DANBOORU_REQUEST_SECONDS = Histogram(
+    "boorubot_danbooru_request_seconds",
+    "Danbooru request latency",
+    ("endpoint",),
+)
+DANBOORU_RESPONSES = Counter(
+    "boorubot_danbooru_responses_total",
+    "Danbooru responses by status",
+    ("status",),
+)
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "boorubot_rate_limit_wait_seconds",
+    "Time spent waiting for a rate limiter token",
+    ("limiter",),
+)
+SWEEP_SECONDS = Histogram(
+    "boorubot_sweep_seconds", "Subscription sweep duration"
+)
+SWEEP_POSTS = Histogram(
+    "boorubot_sweep_posts",
+    "New deliveries queued per sweep",
+    buckets=COUNT_BUCKETS,
+)
+DB_QUERY_SECONDS = Histogram(
+    "boorubot_db_query_seconds", "Database statement latency", ("operation",)
+)
+TELEGRAM_SEND_SECONDS = Histogram(
+    "boorubot_telegram_send_seconds",
+    "Bot API call latency",
+    ("method",),
+)
+TELEGRAM_SEND_ERRORS = Counter(
+    "boorubot_telegram_send_errors_total",
+    "Bot API call errors by type",
+    ("error",),
+)
+LIMITER_WAITING = Gauge(
+    "boorubot_rate_limiter_waiting", "Danbooru requests waiting for a token"
+)
+CIRCUIT_OPEN = Gauge(
+    "boorubot_circuit_open", "1 while the Danbooru circuit is not closed"
+)
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(
+        text=render(), content_type="text/plain", charset="utf-8"
+    )
+
+
+async def start_metrics_server(port: int) -> web.AppRunner:
+    """Поднимает /metrics на отдельном порту."""
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, port=port).start()
+    logger.info(f"Metrics available on :{port}/metrics")
+    return runner
@@ -0,0 +1,20 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.services.backfill import BackfillService
+
+
+class BackfillMiddleware(BaseMiddleware):
+    def __init__(self, backfill: BackfillService):
+        self.backfill = backfill
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        data["backfill"] = self.backfill
+        return await handler(event, data)
@@ -4,12 +4,18 @@ from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from app.services.getter_cache import GetterCache
 from app.services.repository import Repo
 
 
 class RepoMiddleware(BaseMiddleware):
-    def __init__(self, sessionmaker: async_sessionmaker[AsyncSession]):
+    def __init__(
+        self,
+        sessionmaker: async_sessionmaker[AsyncSession],
+        cache: GetterCache,
+    ):
         self.async_sessionmaker = sessionmaker
+        self.cache = cache
 
     async def __call__(
         self,
@@ -17,6 +23,10 @@ class RepoMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any],
     ) -> Any:
-        async with self.async_sessionmaker() as session:
-            data["repo"] = Repo(session)
+        # Сессия откроется, только если обработчику понадобится БД
+        repo = Repo(cache=self.cache, session_pool=self.async_sessionmaker)
+        data["repo"] = repo
+        try:
             return await handler(event, data)
+        finally:
+            await repo.close()
@@ -4,12 +4,21 @@ from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
+from app.services.getter_cache import GetterCache
+from app.services.poll_scheduler import PollScheduler
 from app.services.schedules import Schedules
 
 
 class SchedulerMiddleware(BaseMiddleware):
-    def __init__(self, scheduler: AsyncIOScheduler):
+    def __init__(
+        self,
+        scheduler: AsyncIOScheduler,
+        poll_scheduler: PollScheduler,
+        cache: GetterCache,
+    ):
         self._scheduler = scheduler
+        self._poll_scheduler = poll_scheduler
+        self._cache = cache
 
     async def __call__(
         self,
@@ -17,5 +26,7 @@ class SchedulerMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any],
     ) -> Any:
-        data["scheduler"] = Schedules(self._scheduler)
+        data["scheduler"] = Schedules(
+            self._scheduler, self._poll_scheduler, self._cache
+        )
         return await handler(event, data)
@@ -0,0 +1,32 @@
+import time
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from app.metrics import TELEGRAM_SEND_ERRORS, TELEGRAM_SEND_SECONDS
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Время и ошибки каждого вызова Bot API по методам."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            TELEGRAM_SEND_ERRORS.inc(type(e).__name__)
+            raise
+        finally:
+            TELEGRAM_SEND_SECONDS.observe(
+                time.perf_counter() - started, method.__api_method__
+            )
@@ -0,0 +1,42 @@
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    Integer,
+    String,
+)
+
+from app.models.base import Base
+
+BACKFILL_RUNNING = "running"
+BACKFILL_DONE = "done"
+BACKFILL_CANCELLED = "cancelled"
+
+
+class BackfillJob(Base):
+    """Догрузка истории подписки для чата, от новых постов к старым.
+
+    cursor — id самого старого обработанного поста: следующая страница
+    запрашивается как page=b<cursor>, поэтому после перезапуска задача
+    продолжается с того же места.
+    """
+
+    __tablename__ = "backfill_jobs"
+
+    id = Column(Integer, primary_key=True)
+    subscription_id = Column(
+        Integer,
+        ForeignKey("subscriptions.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    chat_id = Column(BigInteger, nullable=False)
+    status = Column(String(16), nullable=False, index=True)
+    cursor = Column(Integer, nullable=True)
+    # Сколько постов прочитано и сколько из них ушло в outbox
+    fetched = Column(Integer, nullable=False, default=0)
+    queued = Column(Integer, nullable=False, default=0)
+    max_posts = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
@@ -1,3 +1,37 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
+
+
+def utcnow() -> datetime:
+    """Текущее время UTC без tzinfo — в таком виде оно хранится в БД."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def add_missing_columns(connection: Connection) -> None:
+    """Добавляет в существующие таблицы новые колонки и индексы моделей."""
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {col["name"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"{column.name} {column.type.compile(connection.dialect)}"
+            if column.server_default is not None:
+                default = column.server_default.arg
+                if isinstance(default, str):
+                    default = f"'{default}'"
+                ddl += f" DEFAULT {getattr(default, 'text', default)}"
+            connection.execute(text(f"ALTER TABLE {table.name} ADD {ddl}"))
+        indexes = {
+            index["name"] for index in inspector.get_indexes(table.name)
+        }
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(connection)
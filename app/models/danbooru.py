@@ -7,6 +7,7 @@ class DanbooruPost(BaseModel):
     model_config = ConfigDict(extra="ignore")
 
     id: int
+    md5: Optional[str] = None
     large_file_url: Optional[str] = None
     file_ext: str
     file_size: Optional[int]
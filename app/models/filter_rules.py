@@ -0,0 +1,29 @@
+from sqlalchemy import BigInteger, Column, ForeignKey, Integer, String
+
+from app.models.base import Base
+
+RULE_EXCLUDE = "exclude"
+RULE_INCLUDE = "include"
+RULE_RATING = "rating"
+RULE_KINDS = (RULE_EXCLUDE, RULE_INCLUDE, RULE_RATING)
+
+
+class FilterRule(Base):
+    """Локальное правило фильтрации постов перед отправкой.
+
+    chat_id NULL — правило для всех чатов (задаёт администратор),
+    subscription_id NULL — для всех подписок чата.
+    """
+
+    __tablename__ = "filter_rules"
+
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(BigInteger, nullable=True, index=True)
+    subscription_id = Column(
+        Integer,
+        ForeignKey("subscriptions.id", ondelete="CASCADE"),
+        nullable=True,
+    )
+    kind = Column(String(16), nullable=False)
+    # Тэг для exclude/include, буквы рейтингов для rating
+    value = Column(String(255), nullable=False)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, DateTime, String
+
+from app.models.base import Base
+
+
+class Lease(Base):
+    """Аренда разовой фоновой задачи: её выполняет только держатель."""
+
+    __tablename__ = "leases"
+
+    name = Column(String(64), primary_key=True)
+    owner = Column(String(128), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
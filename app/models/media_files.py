@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String
+
+from app.models.base import Base
+
+
+class MediaFile(Base):
+    """file_id, выданный Telegram для файла поста."""
+
+    __tablename__ = "media_files"
+
+    post_id = Column(Integer, primary_key=True)
+    md5 = Column(String(32), primary_key=True)
+    file_id = Column(String(255), nullable=False)
+    media_type = Column(String(16), nullable=False)
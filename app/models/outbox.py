@@ -0,0 +1,73 @@
+from loguru import logger
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    String,
+    Text,
+    inspect,
+    text,
+)
+from sqlalchemy.engine import Connection
+
+from app.models.base import Base, utcnow
+
+OUTBOX_PENDING = "pending"
+OUTBOX_SENT = "sent"
+OUTBOX_FAILED = "failed"
+
+
+class OutboxItem(Base):
+    """Пост, ожидающий отправки в чат.
+
+    Пара (chat_id, post_id) уникальна: она же служит историей доставок,
+    по которой один пост не уходит в чат дважды.
+    """
+
+    __tablename__ = "outbox"
+    __table_args__ = (
+        Index("ix_outbox_status_id", "status", "id"),
+        Index("uq_outbox_chat_post", "chat_id", "post_id", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(BigInteger, nullable=False)
+    post_id = Column(Integer, nullable=False, index=True)
+    # Исходный JSON поста: после перезапуска он отправляется без запроса
+    payload = Column(Text, nullable=False)
+    status = Column(String(16), nullable=False, default=OUTBOX_PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(String(255), nullable=True)
+    # Процесс-отправитель, забравший запись, и срок его аренды
+    lease_owner = Column(String(128), nullable=True)
+    lease_until = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False, index=True)
+
+
+def migrate_legacy_posts(connection: Connection, chat_id: int) -> None:
+    """Переносит историю из таблицы posts прежних версий в outbox.
+
+    До мультичата все посты уходили администратору, поэтому каждая
+    строка posts становится отправленной записью (chat_id, post_id).
+    Таблица удаляется только после переноса, в той же транзакции.
+    """
+    if not inspect(connection).has_table("posts"):
+        return
+    now = utcnow()
+    result = connection.execute(
+        text(
+            "INSERT INTO outbox "
+            "(chat_id, post_id, payload, status, attempts, "
+            "created_at, updated_at) "
+            "SELECT :chat_id, id, '', :status, 0, :now, :now FROM posts "
+            # Без WHERE SQLite примет ON CONFLICT за условие соединения
+            "WHERE true "
+            "ON CONFLICT (chat_id, post_id) DO NOTHING"
+        ),
+        {"chat_id": chat_id, "status": OUTBOX_SENT, "now": now},
+    )
+    connection.execute(text("DROP TABLE posts"))
+    logger.info(f"Migrated {result.rowcount} legacy posts to outbox")
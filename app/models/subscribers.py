@@ -0,0 +1,16 @@
+from sqlalchemy import BigInteger, Column, ForeignKey, Integer
+
+from app.models.base import Base
+
+
+class Subscriber(Base):
+    """Чат, подписанный на поисковый запрос."""
+
+    __tablename__ = "subscribers"
+
+    subscription_id = Column(
+        Integer,
+        ForeignKey("subscriptions.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    chat_id = Column(BigInteger, primary_key=True, index=True)
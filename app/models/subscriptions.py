@@ -1,10 +1,70 @@
-from sqlalchemy import Column, Integer, String
+from loguru import logger
+from sqlalchemy import Column, DateTime, Float, Integer, String, text
+from sqlalchemy.engine import Connection
 
 from app.models.base import Base
 
+# Полнотекстовый индекс по тегам подписок (только SQLite)
+SEARCH_TABLE = "subscriptions_fts"
+
+_SEARCH_DDL = (
+    # trigram ищет любую подстроку от трёх символов, без учёта регистра
+    f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+    "tags, content='subscriptions', content_rowid='id', "
+    "tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ai "
+    "AFTER INSERT ON subscriptions BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, tags) VALUES (new.id, new.tags); "
+    "END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ad "
+    "AFTER DELETE ON subscriptions BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, tags) "
+    "VALUES ('delete', old.id, old.tags); "
+    "END",
+    f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_au "
+    "AFTER UPDATE OF tags ON subscriptions BEGIN "
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, tags) "
+    "VALUES ('delete', old.id, old.tags); "
+    f"INSERT INTO {SEARCH_TABLE}(rowid, tags) VALUES (new.id, new.tags); "
+    "END",
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')",
+)
+
 
 class Subscription(Base):
     __tablename__ = "subscriptions"
 
     id = Column(Integer, primary_key=True)
     tags = Column(String(255), unique=True)
+    # ID самого свежего поста, уже полученного по подписке
+    last_post_id = Column(Integer, nullable=True)
+    # Адаптивный опрос: интервал (сек), оценка потока (постов в час)
+    poll_interval = Column(Integer, nullable=True)
+    post_rate = Column(Float, nullable=True)
+    polled_at = Column(DateTime, nullable=True)
+    next_poll_at = Column(DateTime, nullable=True, index=True)
+    # Процесс-опросчик, забравший подписку; аренда длится до next_poll_at
+    lease_owner = Column(String(128), nullable=True)
+
+
+def create_search_index(connection: Connection) -> None:
+    """Создаёт FTS5-индекс по тегам подписок, если его ещё нет.
+
+    Индекс наполняется из существующих подписок и дальше обновляется
+    триггерами. Без FTS5 (другая БД или старый SQLite) поиск работает
+    через LIKE.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+        {"name": SEARCH_TABLE},
+    ).first()
+    if exists:
+        return
+    try:
+        with connection.begin_nested():
+            for statement in _SEARCH_DDL:
+                connection.execute(text(statement))
+    except Exception as e:
+        logger.warning(f"Subscription search index unavailable: {e}")
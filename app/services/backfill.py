@@ -0,0 +1,111 @@
+import time
+from typing import Optional
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.api.circuit_breaker import CircuitOpenError
+from app.api.danbooru_client import DanbooruUnavailableError
+from app.api.priority_limiter import Lane
+from app.models.base import utcnow
+from app.services.danbooru import DanbooruService
+from app.services.repository import Repo
+
+
+class BackfillService:
+    """Догрузка истории подписок страницами от новых постов к старым.
+
+    Запросы идут в полосе BACKFILL общего лимитера и не мешают опросу.
+    Каждая страница сразу проходит фильтры и дедупликацию и попадает в
+    outbox, а курсор сохраняется в БД — в памяти не копится ничего, и
+    после перезапуска задача продолжается с последней страницы.
+    Рассылает догруженное обычная задача outbox: отправка в медленные
+    чаты не должна растягивать запуск дольше аренды.
+    Несколько задач обслуживаются по очереди, по странице за раз.
+    """
+
+    def __init__(
+        self,
+        session_pool: async_sessionmaker[AsyncSession],
+        danbooru: DanbooruService,
+        page_size: int = 100,
+        max_posts: int = 1000,
+        run_budget: float = 4 * 60,
+    ):
+        self.session_pool = session_pool
+        self.danbooru = danbooru
+        self.page_size = page_size
+        # Сколько постов истории догружать по умолчанию
+        self.max_posts = max_posts
+        # Запуск не дольше аренды, чтобы задачей не занялись два процесса
+        self.run_budget = run_budget
+
+    async def start(self, sub_id: int, chat_id: int) -> bool:
+        async with self.session_pool() as session:
+            return await Repo(session).start_backfill(
+                sub_id, chat_id, self.max_posts, utcnow()
+            )
+
+    async def cancel(self, sub_id: int, chat_id: int) -> bool:
+        async with self.session_pool() as session:
+            return await Repo(session).cancel_backfill(
+                sub_id, chat_id, utcnow()
+            )
+
+    async def run(self) -> None:
+        """Обрабатывает идущие задачи, пока они есть или не вышло время."""
+        deadline = time.monotonic() + self.run_budget
+        while time.monotonic() < deadline:
+            # Список перечитывается каждый круг: так видна отмена
+            async with self.session_pool() as session:
+                jobs = await Repo(session).get_running_backfills()
+            if not jobs:
+                return
+            for job in jobs:
+                if not await self._step(*job):
+                    return
+        logger.info("Backfill run budget exhausted, resuming next run")
+
+    async def _step(
+        self,
+        job_id: int,
+        sub_id: int,
+        chat_id: int,
+        tags: str,
+        cursor: Optional[int],
+        fetched: int,
+        max_posts: int,
+    ) -> bool:
+        """Одна страница задачи; False — сервер недоступен, пора прерваться."""
+        limit = min(self.page_size, max_posts - fetched)
+        try:
+            posts = await self.danbooru.api.fetch_posts_before(
+                tags, cursor, limit, Lane.BACKFILL
+            )
+        except (CircuitOpenError, DanbooruUnavailableError) as e:
+            # Курсор не сдвигается: страница повторится в следующий запуск
+            logger.info(f"Backfill paused for '{tags}': {e}")
+            return False
+
+        if posts is None:
+            # Сервер отклонил запрос: пустая страница завершит задачу
+            logger.warning(f"Backfill query rejected: '{tags}'")
+            posts = []
+
+        queued = 0
+        if posts:
+            queued = await self.danbooru.queue_chat_posts(
+                chat_id, sub_id, posts
+            )
+            if queued is None:
+                return False
+            cursor = min(post["id"] for post in posts)
+
+        done = len(posts) < limit or fetched + len(posts) >= max_posts
+        async with self.session_pool() as session:
+            active = await Repo(session).advance_backfill(
+                job_id, cursor, len(posts), queued, done, utcnow()
+            )
+        if active and done:
+            logger.info(f"Backfill for '{tags}' done")
+        return True
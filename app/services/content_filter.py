@@ -0,0 +1,92 @@
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from app.models.filter_rules import RULE_EXCLUDE, RULE_INCLUDE, RULE_RATING
+
+RATINGS = frozenset("gsqe")
+
+# (chat_id, subscription_id); None — правило для всех
+Scope = tuple[Optional[int], Optional[int]]
+# (chat_id, subscription_id, вид правила, значение)
+RuleRow = tuple[Optional[int], Optional[int], str, str]
+
+
+@dataclass
+class CompiledScope:
+    """Правила одной области в виде битовых масок над id тэгов."""
+
+    exclude: int = 0
+    include: int = 0
+    ratings: Optional[frozenset[str]] = None
+
+    def allows(self, mask: int, rating: Optional[str]) -> bool:
+        if mask & self.exclude:
+            return False
+        if mask & self.include != self.include:
+            return False
+        return self.ratings is None or rating in self.ratings
+
+
+class PostVerdict:
+    """Маска тэгов одного поста, проверяемая по областям правил."""
+
+    def __init__(self, engine: "FilterEngine", mask: int, rating):
+        self._engine = engine
+        self._mask = mask
+        self._rating = rating
+
+    def allows(self, chat_id: int, sub_id: Optional[int] = None) -> bool:
+        scopes = self._engine._scopes
+        for scope in ((None, None), (chat_id, None), (chat_id, sub_id)):
+            compiled = scopes.get(scope)
+            if compiled is not None and not compiled.allows(
+                self._mask, self._rating
+            ):
+                return False
+        return True
+
+
+class FilterEngine:
+    """Локальные фильтры постов: чёрные списки, обязательные тэги, рейтинг.
+
+    Каждый тэг из правил получает свой бит, а правила области
+    сворачиваются в маски. Пост проверяется за один проход по его
+    тэгам: маска поста собирается из инвертированного индекса
+    тэг → бит, после чего каждая область — пара побитовых операций.
+    Число правил не влияет на стоимость проверки поста.
+    """
+
+    def __init__(self):
+        self._bits: dict[str, int] = {}
+        self._scopes: dict[Scope, CompiledScope] = {}
+        self.fingerprint: Optional[tuple] = None
+
+    def __bool__(self) -> bool:
+        return bool(self._scopes)
+
+    def compile(self, rules: Iterable[RuleRow], fingerprint=None) -> None:
+        bits: dict[str, int] = {}
+        scopes: dict[Scope, CompiledScope] = {}
+        for chat_id, sub_id, kind, value in rules:
+            compiled = scopes.setdefault((chat_id, sub_id), CompiledScope())
+            if kind == RULE_RATING:
+                allowed = frozenset(value) & RATINGS
+                compiled.ratings = (compiled.ratings or frozenset()) | allowed
+                continue
+            bit = 1 << bits.setdefault(value, len(bits))
+            if kind == RULE_EXCLUDE:
+                compiled.exclude |= bit
+            elif kind == RULE_INCLUDE:
+                compiled.include |= bit
+        self._bits = bits
+        self._scopes = scopes
+        self.fingerprint = fingerprint
+
+    def verdict(self, tag_string: str, rating: Optional[str]) -> PostVerdict:
+        bits = self._bits
+        mask = 0
+        for tag in tag_string.split():
+            bit = bits.get(tag)
+            if bit is not None:
+                mask |= 1 << bit
+        return PostVerdict(self, mask, rating)
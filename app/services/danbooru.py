@@ -1,16 +1,102 @@
 import asyncio
-from typing import Callable
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from functools import partial
+from typing import Callable, Iterator, Optional
 
 from aiogram import Bot
 from aiogram.enums import ParseMode
-from aiogram.exceptions import TelegramBadRequest
-from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import (
+    BufferedInputFile,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InputMediaPhoto,
+    InputMediaVideo,
+    Message,
+)
 from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from app.api.danbooru_client import DanbooruAPI
+from app.api.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitState,
+)
+from app.api.danbooru_client import (
+    DANBOORU_URL,
+    DanbooruAPI,
+    DanbooruUnavailableError,
+    RawPost,
+    json_loads,
+)
+from app.api.http_cache import HttpCache
+from app.api.priority_limiter import Lane
+from app.metrics import SWEEP_POSTS, SWEEP_SECONDS
+from app.models.base import utcnow
 from app.models.danbooru import DanbooruPost
+from app.services.content_filter import FilterEngine
+from app.services.delivery import DeliveryQueue
+from app.services.media import MediaProcessor
+from app.services.query_planner import (
+    FetchGroup,
+    SubscriptionRow,
+    plan_queries,
+)
 from app.services.repository import Repo
+from app.services.seen_cache import SeenPostCache
+
+EXT_TO_METHOD = {
+    ("jpg", "jpeg", "png", "webp"): ("send_photo", "photo"),
+    ("mp4", "webm", "zip"): ("send_video", "video"),
+    ("gif",): ("send_animation", "animation"),
+}
+ALBUM_PHOTO_EXTS = ("jpg", "jpeg", "png", "webp")
+ALBUM_VIDEO_EXTS = ("mp4", "webm")
+ALBUM_MAX_SIZE = 10
+# Сколько ответ опроса может ждать, пока пакет дедупликации наполнится
+SWEEP_LINGER = 0.5
+# Метка конца работы воркера загрузки в очереди ответов
+FETCH_DONE = object()
+
+
+@dataclass
+class SweepBatch:
+    """Ответы нескольких групп опроса, записываемые в БД вместе."""
+
+    posts: dict[int, RawPost] = field(default_factory=dict)
+    post_subs: dict[int, set[int]] = field(default_factory=dict)
+    marks: dict[int, int] = field(default_factory=dict)
+    arrivals: dict[int, int] = field(default_factory=dict)
+    groups: int = 0
+
+    def __bool__(self) -> bool:
+        return self.groups > 0
+
+    @property
+    def size(self) -> int:
+        return len(self.posts)
+
+    def add(self, group: FetchGroup, result: list[RawPost]) -> bool:
+        """Раскладывает ответ группы; False — если были несопоставленные.
+
+        При несопоставленных постах отметки и счётчики группы не
+        трогаются, а сопоставленные посты всё равно доставляются.
+        """
+        self.groups += 1
+        matched, unmatched = group.split(result)
+        for sub_id, posts in matched.items():
+            for post in posts:
+                self.posts.setdefault(post["id"], post)
+                self.post_subs.setdefault(post["id"], set()).add(sub_id)
+            if not unmatched:
+                self.arrivals[sub_id] = len(posts)
+        if unmatched:
+            return False
+        self.marks.update(group.advance_marks(result))
+        return True
 
 
 class DanbooruService:
@@ -19,43 +105,148 @@ class DanbooruService:
         session_pool: async_sessionmaker[AsyncSession],
         bot: Bot,
         admin_id: int,
+        tag_limit: int = 2,
+        seen_cache_size: int = 100_000,
+        delivery: Optional[DeliveryQueue] = None,
+        album_mode: bool = False,
+        media_max_download: int = 50_000_000,
+        media_concurrency: int = 2,
+        http_cache_dir: Optional[str] = None,
+        outbox_batch_size: int = 50,
+        outbox_max_attempts: int = 5,
+        outbox_lease: int = 300,
+        worker_id: str = "local",
+        deliver_after_poll: bool = True,
+        danbooru_url: str = DANBOORU_URL,
+        sweep_concurrency: int = 8,
+        sweep_batch_size: int = 500,
     ):
         self.session_pool = session_pool
         self.telegram_bot = bot
         self.admin_id = admin_id
         self.file_size_limit = 1_950_000
-        self.api = DanbooruAPI()
-        self._send_delay = 0.3
+        self.api = DanbooruAPI(
+            tag_limit=tag_limit,
+            cache=HttpCache(directory=http_cache_dir),
+            breaker=CircuitBreaker(on_state_change=self._on_circuit_change),
+            base_url=danbooru_url,
+        )
+        self.delivery = delivery or DeliveryQueue()
+        self.media = MediaProcessor(
+            self.api.get_session,
+            max_bytes=self.file_size_limit,
+            max_download=media_max_download,
+            concurrency=media_concurrency,
+        )
+        # Группировать подряд идущие фото и видео в альбомы
+        self.album_mode = album_mode
+        # Тэги, которые не удалось сопоставить локально (алиасы и т.п.)
+        self._unpackable: set[str] = set()
+        self._seen = SeenPostCache(seen_cache_size)
+        # file_id загруженных файлов, ожидающие записи в БД
+        self._new_file_ids: dict[int, tuple[str, str, str]] = {}
+        self.outbox_batch_size = outbox_batch_size
+        self.outbox_max_attempts = outbox_max_attempts
+        self.outbox_lease = outbox_lease
+        # Имя процесса в арендах записей outbox
+        self.worker_id = worker_id
+        # Отправлять сразу после опроса; в раздельном режиме этим
+        # занимаются процессы-отправители
+        self.deliver_after_poll = deliver_after_poll
+        self._outbox_lock = asyncio.Lock()
+        # Одновременных запросов опроса и постов в пакете дедупликации
+        self.sweep_concurrency = sweep_concurrency
+        self.sweep_batch_size = sweep_batch_size
+        # Локальные фильтры постов, перечитываются из БД перед опросом
+        self.filters = FilterEngine()
 
     async def close(self) -> None:
+        await self.delivery.close()
+        self.media.close()
         await self.api.close()
 
-    async def _notify_admin(self, message: str) -> None:
+    async def warm_up(self) -> None:
+        """Заполняет кэш самыми свежими доставками из БД."""
+        async with self.session_pool() as session:
+            keys = await Repo(session).get_recent_deliveries(
+                self._seen.max_size
+            )
+        # От старых к новым, чтобы свежие пары вытеснялись последними
+        self._seen.update(reversed(keys))
+        logger.debug(f"Seen cache warmed with {len(self._seen)} deliveries")
+
+    async def _notify(self, chat_id: int, message: str) -> None:
         try:
             await self.telegram_bot.send_message(
-                self.admin_id, message, parse_mode=ParseMode.HTML
+                chat_id, message, parse_mode=ParseMode.HTML
             )
         except Exception as e:
-            logger.error(f"Failed to notify admin: {e}")
+            logger.error(f"Failed to notify {chat_id}: {e}")
+
+    async def _notify_admin(self, message: str) -> None:
+        await self._notify(self.admin_id, message)
+
+    async def _on_circuit_change(
+        self, previous: CircuitState, state: CircuitState
+    ) -> None:
+        """Одно сообщение на аварию и одно на восстановление."""
+        if state is CircuitState.OPEN and previous is CircuitState.CLOSED:
+            await self._notify_admin(
+                "<b>Danbooru недоступен.</b> Опрос приостановлен, "
+                f"проверка через {self.api.breaker.retry_in:.0f} с"
+            )
+        elif state is CircuitState.CLOSED:
+            await self._notify_admin(
+                "<b>Danbooru снова доступен.</b> Опрос продолжается"
+            )
 
     async def _filter_new_posts(
-        self, posts: list[DanbooruPost]
-    ) -> list[DanbooruPost]:
-        """Фильтрует посты batch-запросом."""
-        if not posts:
-            return []
+        self, posts: dict[int, RawPost], targets: dict[int, set[int]]
+    ) -> Optional[int]:
+        """Ставит в outbox посты, которых ещё не было в своих чатах.
+
+        targets — чаты по id поста. Пары (чат, пост) сначала проверяются
+        по кэшу, остальные — batch-запросом; дедупликация идёт только по
+        id из сырого JSON. Возвращает число новых доставок или None,
+        если записать их в outbox не удалось.
+        """
+        keys = [
+            (chat_id, post_id)
+            for post_id, chats in targets.items()
+            for chat_id in chats
+        ]
+        _, unknown = self._seen.split(keys)
+        if not unknown:
+            return 0
 
         async with self.session_pool() as session:
             repo = Repo(session)
-            post_ids = [p.id for p in posts]
-            existing_ids = await repo.get_existing_post_ids(post_ids)
-
-            new_posts = [p for p in posts if p.id not in existing_ids]
+            existing = await repo.get_existing_deliveries(unknown)
+            self._seen.update(existing)
+
+            new_keys = [key for key in unknown if key not in existing]
+            if new_keys:
+                payloads = {
+                    post_id: json.dumps(posts[post_id])
+                    for post_id in {post_id for _, post_id in new_keys}
+                }
+                deliveries = [
+                    (chat_id, post_id, payloads[post_id])
+                    for chat_id, post_id in new_keys
+                ]
+                if not await repo.enqueue_posts(deliveries, utcnow()):
+                    return None
+                self._seen.update(new_keys)
 
-            if new_posts:
-                await repo.add_posts_batch([p.id for p in new_posts])
+        return len(new_keys)
 
-            return new_posts
+    async def _load_filters(self, session: AsyncSession) -> None:
+        """Перекомпилирует фильтры, только если правила изменились."""
+        rules = await Repo(session).get_filter_rules()
+        fingerprint = hash(tuple(rules))
+        if fingerprint != self.filters.fingerprint:
+            self.filters.compile(rules, fingerprint)
+            logger.info(f"Compiled {len(rules)} filter rules")
 
     @staticmethod
     def _get_keyboard(post: DanbooruPost) -> InlineKeyboardMarkup:
@@ -70,6 +261,24 @@ class DanbooruService:
             ]
         )
 
+    @staticmethod
+    def _get_album_keyboard(
+        posts: list[DanbooruPost],
+    ) -> InlineKeyboardMarkup:
+        """Одна клавиатура со ссылками на все посты альбома."""
+        buttons = [
+            InlineKeyboardButton(
+                text=str(number),
+                url=f"https://danbooru.donmai.us/posts/{post.id}",
+            )
+            for number, post in enumerate(posts, start=1)
+        ]
+        return InlineKeyboardMarkup(
+            inline_keyboard=[
+                buttons[row : row + 5] for row in range(0, len(buttons), 5)
+            ]
+        )
+
     @staticmethod
     def _get_caption(post: DanbooruPost) -> str:
         return (
@@ -78,52 +287,114 @@ class DanbooruService:
             f"<b>Копирайт:</b> {post.tag_string_copyright or 'Неизвестно'}"
         )[:1024]
 
-    async def _send_post(self, post: DanbooruPost) -> None:
-        if not post.large_file_url:
+    def _remember_file_id(
+        self, post: DanbooruPost, message: Message, media_type: str
+    ) -> None:
+        """Запоминает file_id, который Telegram выдал для файла поста."""
+        if not post.md5:
+            return
+        file = getattr(message, media_type, None)
+        if isinstance(file, list):
+            file = file[-1] if file else None
+        if file is None:
+            return
+        self._new_file_ids[post.id] = (post.md5, file.file_id, media_type)
+
+    async def _load_file_ids(
+        self, posts: list[DanbooruPost]
+    ) -> dict[int, tuple[str, str]]:
+        checksums = {post.id: post.md5 for post in posts if post.md5}
+        if not checksums:
+            return {}
+        async with self.session_pool() as session:
+            return await Repo(session).get_file_ids(checksums)
+
+    async def _flush_file_ids(self) -> None:
+        if not self._new_file_ids:
             return
+        files, self._new_file_ids = self._new_file_ids, {}
+        async with self.session_pool() as session:
+            await Repo(session).save_file_ids(files)
+
+    async def _send_post(
+        self,
+        chat_id: int,
+        post: DanbooruPost,
+        cached: Optional[tuple[str, str]] = None,
+    ) -> bool:
+        """Отправляет пост; False — не удалось, отправку стоит повторить."""
+        if not post.large_file_url:
+            # Файл скрыт на Danbooru — отправлять нечего
+            return True
 
         caption = self._get_caption(post)
         keyboard = self._get_keyboard(post)
 
-        ext_to_method = {
-            ("jpg", "jpeg", "png", "webp"): ("send_photo", "photo"),
-            ("mp4", "webm", "zip"): ("send_video", "video"),
-            ("gif",): ("send_animation", "animation"),
-        }
-
         try:
-            for extensions, (method_name, param_name) in ext_to_method.items():
+            for extensions, (method_name, param_name) in EXT_TO_METHOD.items():
                 if post.file_ext in extensions:
+                    # Уже загруженный в Telegram файл отправляем по file_id
+                    use_cache = cached is not None and cached[1] == param_name
+                    media = cached[0] if use_cache else post.large_file_url
+                    if not use_cache and self._is_oversized(post):
+                        media = await self._shrink(post) or media
                     method = getattr(self.telegram_bot, method_name)
-                    await method(
-                        chat_id=self.admin_id,
-                        **{param_name: post.large_file_url},
+                    message = await method(
+                        chat_id=chat_id,
+                        **{param_name: media},
                         caption=caption,
                         parse_mode=ParseMode.HTML,
                         reply_markup=keyboard,
                     )
-                    return
+                    if not use_cache:
+                        self._remember_file_id(post, message, param_name)
+                    return True
 
             # Неизвестный формат
             await self.telegram_bot.send_message(
-                self.admin_id,
+                chat_id,
                 f"{post.large_file_url}\n{caption}\n\n"
                 f"<b>Формат не поддерживается: {post.file_ext}</b>",
                 parse_mode=ParseMode.HTML,
                 reply_markup=keyboard,
             )
+            return True
         except TelegramBadRequest:
-            await self._send_fallback(post, caption, keyboard)
+            if cached is not None:
+                # file_id устарел — загружаем файл заново по ссылке
+                return await self._send_post(chat_id, post)
+            await self._send_fallback(chat_id, post, caption, keyboard)
+            return True
+        except TelegramRetryAfter:
+            # Повтор по времени сервера выполняет очередь доставки
+            raise
         except Exception as e:
             logger.error(f"Failed to send post {post.id}: {e}")
+            return False
+
+    def _is_oversized(self, post: DanbooruPost) -> bool:
+        return (post.file_size or 0) >= self.file_size_limit
+
+    async def _shrink(self, post: DanbooruPost) -> Optional[BufferedInputFile]:
+        """Уменьшенная копия крупного изображения для загрузки файлом."""
+        if not self.media.can_shrink(post.file_ext):
+            return None
+        file = await self.media.shrink(post.large_file_url, f"{post.id}.jpg")
+        if file is None:
+            logger.debug(f"Post {post.id}: could not shrink, using fallback")
+        return file
 
     async def _send_fallback(
-        self, post: DanbooruPost, caption: str, keyboard: InlineKeyboardMarkup
+        self,
+        chat_id: int,
+        post: DanbooruPost,
+        caption: str,
+        keyboard: InlineKeyboardMarkup,
     ) -> None:
         """Отправка превью при ошибке."""
         if post.preview_file_url and post.file_size >= self.file_size_limit:
             await self.telegram_bot.send_photo(
-                chat_id=self.admin_id,
+                chat_id=chat_id,
                 photo=post.preview_file_url,
                 caption=f"{post.large_file_url}\n{caption}\n\n"
                 f"<b>Файл: {post.file_size / 1_000_000:.2f} МБ</b>",
@@ -132,73 +403,573 @@ class DanbooruService:
             )
         else:
             await self.telegram_bot.send_message(
-                self.admin_id,
+                chat_id,
                 f"{post.large_file_url}\n{caption}",
                 parse_mode=ParseMode.HTML,
                 reply_markup=keyboard,
             )
 
-    async def _send_posts(self, posts: list[DanbooruPost]) -> None:
+    def _is_album_item(self, post: DanbooruPost) -> bool:
+        return (
+            post.large_file_url is not None
+            and post.file_ext in ALBUM_PHOTO_EXTS + ALBUM_VIDEO_EXTS
+            and not self._is_oversized(post)
+        )
+
+    def _group_albums(
+        self, posts: list[DanbooruPost]
+    ) -> list[list[DanbooruPost]]:
+        """Объединяет подряд идущие фото и видео в альбомы до 10 штук."""
+        batches: list[list[DanbooruPost]] = []
+        album: list[DanbooruPost] = []
+        for post in posts:
+            if not self._is_album_item(post):
+                if album:
+                    batches.append(album)
+                    album = []
+                batches.append([post])
+                continue
+            album.append(post)
+            if len(album) == ALBUM_MAX_SIZE:
+                batches.append(album)
+                album = []
+        if album:
+            batches.append(album)
+        return batches
+
+    async def _send_album(
+        self,
+        chat_id: int,
+        posts: list[DanbooruPost],
+        cached: dict[int, tuple[str, str]],
+    ) -> bool:
+        """Отправляет альбом; False — если Telegram его отклонил."""
+        media = []
+        uploaded: list[bool] = []
         for post in posts:
-            await self._send_post(post)
-            await asyncio.sleep(self._send_delay)
+            if post.file_ext in ALBUM_PHOTO_EXTS:
+                media_cls, media_type = InputMediaPhoto, "photo"
+            else:
+                media_cls, media_type = InputMediaVideo, "video"
+            file_id, cached_type = cached.get(post.id, (None, None))
+            use_cache = cached_type == media_type
+            uploaded.append(not use_cache)
+            media.append(
+                media_cls(
+                    media=file_id if use_cache else post.large_file_url,
+                    caption=self._get_caption(post),
+                    parse_mode=ParseMode.HTML,
+                )
+            )
+        try:
+            messages = await self.telegram_bot.send_media_group(
+                chat_id=chat_id, media=media
+            )
+            for post, message, item, by_url in zip(
+                posts, messages, media, uploaded
+            ):
+                if by_url:
+                    self._remember_file_id(post, message, item.type)
+            return True
+        except TelegramBadRequest as e:
+            logger.debug(f"Album of {len(posts)} rejected: {e}")
+            return False
+        except TelegramRetryAfter:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to send album: {e}")
+            return False
 
-    async def _collect_new_posts(
-        self, tags_list: list[str]
-    ) -> list[DanbooruPost]:
-        """Собирает посты с дедупликацией."""
-        tasks = [self.api.search_posts(tags) for tags in tags_list]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+    async def _send_album_sources(
+        self, chat_id: int, posts: list[DanbooruPost]
+    ) -> None:
+        await self.telegram_bot.send_message(
+            chat_id,
+            "<b>Источники</b>",
+            parse_mode=ParseMode.HTML,
+            reply_markup=self._get_album_keyboard(posts),
+        )
 
-        all_posts: dict[int, DanbooruPost] = {}
-        for result in results:
-            if isinstance(result, list):
-                for post in result:
-                    all_posts.setdefault(post.id, post)
+    async def _send_posts(
+        self, chat_id: int, posts: list[DanbooruPost]
+    ) -> set[int]:
+        """Отправляет посты в чат через очередь доставки и ждёт завершения.
 
-        return await self._filter_new_posts(list(all_posts.values()))
+        Возвращает id постов, которые удалось доставить.
+        """
+        if not posts:
+            return set()
+        started = time.monotonic()
 
-    async def check_new_posts(self) -> None:
-        logger.info("Checking new posts")
+        cached = await self._load_file_ids(posts)
+        if self.album_mode:
+            batches = self._group_albums(posts)
+        else:
+            batches = [[post] for post in posts]
+
+        jobs = []
+        for batch in batches:
+            if len(batch) > 1:
+                send = partial(self._send_album, chat_id, batch, cached)
+            else:
+                send = partial(
+                    self._send_post, chat_id, batch[0], cached.get(batch[0].id)
+                )
+            jobs.append((batch, await self.delivery.submit(chat_id, send)))
+
+        # Ссылки на альбомы и поштучная отправка отклонённых альбомов
+        delivered: set[int] = set()
+        followups = []
+        resends = []
+        for batch, future in jobs:
+            try:
+                result = await future
+            except Exception as e:
+                logger.error(f"Failed to deliver {len(batch)} posts: {e}")
+                continue
+            if len(batch) == 1:
+                if result:
+                    delivered.add(batch[0].id)
+                continue
+            if result:
+                delivered.update(post.id for post in batch)
+                followups.append(
+                    await self.delivery.submit(
+                        chat_id,
+                        partial(self._send_album_sources, chat_id, batch),
+                    )
+                )
+                continue
+            for post in batch:
+                resends.append(
+                    (
+                        post,
+                        await self.delivery.submit(
+                            chat_id,
+                            partial(
+                                self._send_post,
+                                chat_id,
+                                post,
+                                cached.get(post.id),
+                            ),
+                        ),
+                    )
+                )
+
+        for post, future in resends:
+            try:
+                if await future:
+                    delivered.add(post.id)
+            except Exception as e:
+                logger.error(f"Failed to deliver post {post.id}: {e}")
+        for result in await asyncio.gather(*followups, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to deliver follow-up: {result}")
+        await self._flush_file_ids()
+
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"Delivered {len(delivered)}/{len(posts)} posts to {chat_id} in "
+            f"{elapsed:.1f}s ({len(delivered) / max(elapsed, 1e-6):.1f}/s); "
+            f"{self.delivery.summary()}"
+        )
+        return delivered
+
+    async def drain_outbox(self) -> int:
+        """Отправляет всё, что ждёт в outbox, пачками.
+
+        Пачки забираются в аренду, так что несколько процессов-
+        отправителей не отправят одну запись дважды. Итоги каждой пачки
+        записываются одним коммитом. Записи, которые не удалось
+        отправить, повторяются после истечения аренды, пока не исчерпан
+        лимит попыток. Возвращает число отправленных.
+        """
+        async with self._outbox_lock:
+            total = 0
+            while True:
+                now = utcnow()
+                async with self.session_pool() as session:
+                    items = await Repo(session).claim_outbox(
+                        self.outbox_batch_size,
+                        self.worker_id,
+                        now,
+                        now + timedelta(seconds=self.outbox_lease),
+                    )
+                if not items:
+                    break
+
+                # Пачка раздаётся по чатам; чаты обслуживаются параллельно,
+                # а темп каждого держат лимиты очереди доставки
+                by_chat: dict[int, list[DanbooruPost]] = {}
+                item_ids: dict[tuple[int, int], int] = {}
+                failed: dict[int, str] = {}
+                for item in items:
+                    built = self.api.build_posts([json_loads(item.payload)])
+                    if not built:
+                        failed[item.id] = "Invalid payload"
+                        continue
+                    by_chat.setdefault(item.chat_id, []).append(built[0])
+                    item_ids[(item.chat_id, item.post_id)] = item.id
+
+                results = await asyncio.gather(
+                    *(
+                        self._send_posts(chat_id, posts)
+                        for chat_id, posts in by_chat.items()
+                    )
+                )
+                delivered = {
+                    (chat_id, post_id)
+                    for chat_id, post_ids in zip(by_chat, results)
+                    for post_id in post_ids
+                }
+                sent = []
+                for key, item_id in item_ids.items():
+                    if key in delivered:
+                        sent.append(item_id)
+                    else:
+                        failed[item_id] = "Not delivered"
+
+                async with self.session_pool() as session:
+                    await Repo(session).finish_outbox(
+                        sent, failed, self.outbox_max_attempts, utcnow()
+                    )
+                total += len(sent)
+
+            if total:
+                logger.info(f"Outbox: sent {total} posts")
+            return total
+
+    async def _fetch_group(self, group: FetchGroup) -> Optional[list[RawPost]]:
+        """Новые подписки получают свежие посты, остальные — только новее."""
+        if group.last_post_id is None:
+            return await self.api.fetch_posts(group.query)
+        return await self.api.fetch_posts_after(
+            group.query, group.last_post_id
+        )
+
+    async def _fetch_stage(
+        self, groups: Iterator[FetchGroup], results: asyncio.Queue
+    ) -> None:
+        """Воркер загрузки: берёт группы из общего итератора.
+
+        Очередь ответов ограничена, поэтому put ждёт, пока дедупликация
+        разберёт прежние ответы, и загрузка не убегает вперёд.
+        """
+        for group in groups:
+            try:
+                result = await self._fetch_group(group)
+            except (CircuitOpenError, DanbooruUnavailableError) as e:
+                # Подписки группы останутся к опросу, повтор — в следующем
+                result = e
+            except Exception as e:
+                logger.error(f"Fetch failed '{group.query}': {e!r}")
+                result = e
+            await results.put((group, result))
+        await results.put(FETCH_DONE)
+
+    async def _flush_batch(self, batch: SweepBatch) -> Optional[int]:
+        """Ставит пакет в outbox и сдвигает отметки его подписок."""
+        sub_ids = {
+            sub_id for ids in batch.post_subs.values() for sub_id in ids
+        }
+        async with self.session_pool() as session:
+            sub_chats = await Repo(session).get_subscription_chats(
+                list(sub_ids)
+            )
+        targets = {}
+        for post_id, sub_ids in batch.post_subs.items():
+            post = batch.posts[post_id]
+            verdict = self.filters.verdict(
+                post.get("tag_string") or "", post.get("rating")
+            )
+            # Пост нужен чату, если его пропускает хотя бы одна подписка
+            targets[post_id] = {
+                chat_id
+                for sub_id in sub_ids
+                for chat_id in sub_chats.get(sub_id, ())
+                if verdict.allows(chat_id, sub_id)
+            }
+
+        new_count = await self._filter_new_posts(batch.posts, targets)
+        if new_count is None:
+            # Отметки не двигаем: эти посты придут в следующем опросе
+            return None
+
+        if batch.marks:
+            async with self.session_pool() as session:
+                await Repo(session).update_last_post_ids(batch.marks)
+        return new_count
+
+    async def _dedupe_stage(
+        self,
+        results: asyncio.Queue,
+        fetchers: int,
+        wakeups: Optional[asyncio.Queue],
+    ) -> tuple[int, dict[int, int]]:
+        """Разбирает ответы микропакетами по мере их прихода.
+
+        Пакет уходит в БД, когда в нём набралось sweep_batch_size постов
+        или самый старый ответ ждёт дольше SWEEP_LINGER: при медленной
+        загрузке первые посты не ждут конца опроса, при быстрой запросы
+        к БД укрупняются.
+        """
+        loop = asyncio.get_running_loop()
+        new_count = 0
+        arrivals: dict[int, int] = {}
+        batch = SweepBatch()
+        deadline: Optional[float] = None
+
+        while fetchers or batch:
+            item = None
+            if fetchers:
+                try:
+                    async with asyncio.timeout_at(deadline):
+                        item = await results.get()
+                except TimeoutError:
+                    pass
+            if item is FETCH_DONE:
+                fetchers -= 1
+            elif item is not None:
+                group, result = item
+                if isinstance(result, list):
+                    if not batch:
+                        deadline = loop.time() + SWEEP_LINGER
+                    if not batch.add(group, result):
+                        # Посты пришли по OR-запросу, но тэг не совпал
+                        # локально, и неясно, каким чатам они нужны.
+                        # Подписки перезапросятся по отдельности
+                        self._unpackable.update(
+                            tags for _, tags, _ in group.subs
+                        )
+                        logger.debug(f"Unmatched posts for '{group.query}'")
+
+            full = batch.size >= self.sweep_batch_size
+            if batch and (item is None or full or not fetchers):
+                queued = await self._flush_batch(batch)
+                if queued is not None:
+                    new_count += queued
+                    arrivals.update(batch.arrivals)
+                    if queued and wakeups is not None and wakeups.empty():
+                        wakeups.put_nowait(True)
+                batch = SweepBatch()
+                deadline = None
+
+        return new_count, arrivals
+
+    async def _deliver_stage(self, wakeups: asyncio.Queue) -> None:
+        """Рассылает outbox, пока опрос ещё идёт."""
+        while await wakeups.get():
+            try:
+                await self.drain_outbox()
+            except Exception as e:
+                logger.error(f"Outbox drain failed: {e!r}")
 
+    async def _collect_new_posts(
+        self,
+        subs: list[SubscriptionRow],
+        wakeups: Optional[asyncio.Queue] = None,
+    ) -> tuple[int, dict[int, int]]:
+        """Ставит новые посты в outbox и сдвигает отметки подписок.
+
+        Каждый запрос выполняется один раз за опрос, а найденное
+        раздаётся всем чатам, подписанным на него. Загрузка, дедупликация
+        и отправка связаны ограниченными очередями: не больше
+        sweep_concurrency запросов сразу, ответы пишутся в БД пакетами,
+        каждый записанный пакет будит отправку через wakeups. Возвращает
+        число новых доставок и число постов новее отметки по каждой
+        успешно опрошенной подписке.
+        """
+        groups = plan_queries(subs, self.api.tag_limit, self._unpackable)
+        logger.debug(f"Planned {len(groups)} queries for {len(subs)} subs")
+        async with self.session_pool() as session:
+            await self._load_filters(session)
+
+        results: asyncio.Queue = asyncio.Queue(self.sweep_concurrency * 2)
+        pending = iter(groups)
+        if groups and not self.api.breaker.closed:
+            # После аварии сначала идёт один пробный запрос
+            probe = next(pending)
+            try:
+                results.put_nowait((probe, await self._fetch_group(probe)))
+            except (CircuitOpenError, DanbooruUnavailableError) as e:
+                logger.info(f"Sweep paused: {e}")
+                return 0, {}
+            except Exception as e:
+                # Неудачная проба: подписки остаются к опросу
+                logger.error(f"Fetch failed '{probe.query}': {e!r}")
+                return 0, {}
+
+        fetchers = [
+            asyncio.create_task(self._fetch_stage(pending, results))
+            for _ in range(min(self.sweep_concurrency, len(groups)) or 1)
+        ]
+        try:
+            return await self._dedupe_stage(results, len(fetchers), wakeups)
+        finally:
+            for task in fetchers:
+                task.cancel()
+            await asyncio.gather(*fetchers, return_exceptions=True)
+
+    async def queue_chat_posts(
+        self, chat_id: int, sub_id: int, posts: list[RawPost]
+    ) -> Optional[int]:
+        """Ставит в outbox посты подписки для одного чата.
+
+        Фильтры и дедупликация те же, что при опросе. Возвращает число
+        новых доставок или None, если записать их не удалось.
+        """
         async with self.session_pool() as session:
-            subs = await Repo(session).get_subscriptions_list()
+            await self._load_filters(session)
+        allowed = {
+            post["id"]: post
+            for post in posts
+            if self.filters.verdict(
+                post.get("tag_string") or "", post.get("rating")
+            ).allows(chat_id, sub_id)
+        }
+        return await self._filter_new_posts(
+            allowed, {post_id: {chat_id} for post_id in allowed}
+        )
+
+    async def check_new_posts(
+        self, subs: Optional[list[SubscriptionRow]] = None
+    ) -> dict[int, int]:
+        """Опрашивает подписки (по умолчанию все) и отправляет новое.
+
+        Возвращает число пришедших постов по опрошенным подпискам.
+        """
+        logger.info("Checking new posts")
+
+        if subs is None:
+            async with self.session_pool() as session:
+                subs = await Repo(session).get_subscriptions_for_polling()
 
         if not subs:
             logger.info("No subscriptions")
-            return
+            return {}
 
-        new_posts = await self._collect_new_posts([s[1] for s in subs])
+        # Отправка идёт параллельно опросу, начиная с первого пакета
+        wakeups: Optional[asyncio.Queue] = None
+        deliverer = None
+        if self.deliver_after_poll:
+            wakeups = asyncio.Queue(1)
+            deliverer = asyncio.create_task(self._deliver_stage(wakeups))
 
-        if new_posts:
-            logger.info(f"Found {len(new_posts)} new posts")
-            await self._send_posts(new_posts)
+        started = time.perf_counter()
+        try:
+            new_count, arrivals = await self._collect_new_posts(subs, wakeups)
+        except BaseException:
+            if deliverer is not None:
+                deliverer.cancel()
+            raise
+        SWEEP_SECONDS.observe(time.perf_counter() - started)
+        SWEEP_POSTS.observe(new_count)
+        if new_count:
+            logger.info(f"Queued {new_count} new deliveries")
+
+        if deliverer is not None:
+            await wakeups.put(False)
+            await deliverer
+
+        return arrivals
 
     async def _check_posts_generic(
         self,
+        chat_id: int,
         fetch: Callable,
         name: str,
     ) -> None:
-        """Универсальный метод проверки."""
+        """Универсальный метод проверки; результат уходит в chat_id."""
         logger.info(f"Checking {name} posts")
-        posts = await fetch()
+        try:
+            posts = await fetch()
+        except CircuitOpenError as e:
+            await self._notify(
+                chat_id,
+                f"<b>Danbooru недоступен</b>, повторите через "
+                f"{e.retry_in:.0f} с ({name})",
+            )
+            return
+        except DanbooruUnavailableError:
+            await self._notify(
+                chat_id, f"<b>Ошибка:</b> Сервер недоступен ({name})"
+            )
+            return
 
         if posts is None:
-            await self._notify_admin(
-                f"<b>Ошибка:</b> Сервер недоступен ({name})"
+            await self._notify(
+                chat_id, f"<b>Ошибка:</b> Сервер недоступен ({name})"
             )
             return
 
         if posts:
+            async with self.session_pool() as session:
+                await self._load_filters(session)
+            posts = [
+                post
+                for post in posts
+                if self.filters.verdict(
+                    post.tag_string or "", post.rating
+                ).allows(chat_id)
+            ]
             logger.info(f"Found {len(posts)} {name} posts")
-            await self._send_posts(posts)
+            await self._send_posts(chat_id, posts)
 
-    async def check_popular_posts(self) -> None:
+    async def check_popular_posts(
+        self, chat_id: int, lane: Lane = Lane.INTERACTIVE
+    ) -> None:
         await self._check_posts_generic(
-            lambda: self.api.get_popular_posts(limit=20), "popular"
+            chat_id,
+            lambda: self.api.get_popular_posts(limit=20, lane=lane),
+            "popular",
         )
 
-    async def check_hot_posts(self) -> None:
+    async def check_hot_posts(
+        self, chat_id: int, lane: Lane = Lane.INTERACTIVE
+    ) -> None:
         await self._check_posts_generic(
-            lambda: self.api.get_hot_posts(limit=20), "hot"
+            chat_id,
+            lambda: self.api.get_hot_posts(limit=20, lane=lane),
+            "hot",
+        )
+
+    async def validate_queries(
+        self, queries: list[str], concurrency: int = 4
+    ) -> tuple[list[str], list[str], list[str]]:
+        """Проверяет запросы на Danbooru перед импортом.
+
+        Запросы идут в полосе BACKFILL общего лимитера и не вытесняют
+        опрос подписок. Возвращает отклонённые сервером запросы (4xx),
+        запросы без постов и непроверенные из-за недоступности сервера:
+        429, 5xx и сетевые ошибки запрос не отклоняют.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def check(query: str) -> Optional[bool]:
+            async with semaphore:
+                posts = await self.api.fetch_posts(
+                    query, limit=1, lane=Lane.BACKFILL
+                )
+                return None if posts is None else bool(posts)
+
+        results = await asyncio.gather(
+            *(check(query) for query in queries), return_exceptions=True
+        )
+        rejected, empty, unchecked = [], [], []
+        for query, result in zip(queries, results):
+            if isinstance(
+                result, (CircuitOpenError, DanbooruUnavailableError)
+            ):
+                unchecked.append(query)
+            elif isinstance(result, BaseException):
+                logger.error(f"Query validation failed {query}: {result!r}")
+                unchecked.append(query)
+            elif result is None:
+                rejected.append(query)
+            elif not result:
+                empty.append(query)
+        logger.info(
+            f"Validated {len(queries)} queries: {len(rejected)} rejected, "
+            f"{len(empty)} empty, {len(unchecked)} unchecked"
         )
+        return rejected, empty, unchecked
@@ -0,0 +1,233 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+from aiogram.exceptions import TelegramRetryAfter
+from loguru import logger
+
+from app.api.danbooru_client import RateLimiter
+
+# Как часто забывать лимитеры простаивающих чатов, с
+IDLE_SWEEP_INTERVAL = 60.0
+
+
+@dataclass
+class DeliveryJob:
+    chat_id: int
+    send: Callable[[], Awaitable[Any]]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    # Попытки, отклонённые Telegram с RetryAfter
+    attempts: int = 0
+
+    def resolve(
+        self, result: Any = None, error: Optional[Exception] = None
+    ) -> None:
+        if self.future.done():
+            return
+        if error is not None:
+            self.future.set_exception(error)
+        else:
+            self.future.set_result(result)
+
+
+@dataclass
+class DeliveryStats:
+    sent: int = 0
+    failed: int = 0
+    retries: int = 0
+    send_time: float = 0.0
+    wait_time: float = 0.0
+    peak_depth: int = 0
+
+
+class DeliveryQueue:
+    """Очередь отправки в Telegram с ограниченным пулом воркеров.
+
+    Каждая отправка проходит через общий лимит бота и лимит своего чата;
+    для групп (отрицательный chat_id) Telegram строже — group_rate
+    сообщений в минуту. Воркер не ждёт лимита чата: если чат сейчас
+    отправлять нельзя, задача откладывается и возвращается в очередь,
+    когда придёт её время, а воркер берёт следующую. Так медленная
+    группа или чат на паузе не занимают воркеры, пока другие чаты ждут.
+    TelegramRetryAfter ставит чат на паузу по времени сервера, после
+    чего отправка повторяется. Лимитеры и паузы хранятся только для
+    недавно писавших чатов: простаивающие раз в IDLE_SWEEP_INTERVAL
+    забываются.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        global_rate: int = 30,
+        chat_rate: int = 1,
+        group_rate: int = 20,
+        max_size: int = 1000,
+        max_retries: int = 3,
+    ):
+        self.workers = workers
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.stats = DeliveryStats()
+        self._global_limiter = RateLimiter(
+            max_calls=global_rate, period=1, name="telegram"
+        )
+        self._chat_limiters: dict[int, RateLimiter] = {}
+        self._paused_until: dict[int, float] = {}
+        self._next_idle_sweep = 0.0
+        # Очередь не ограничена, чтобы отложенная задача всегда могла
+        # вернуться; размер держит семафор, занятый до завершения задачи
+        self._queue: asyncio.Queue[DeliveryJob] = asyncio.Queue()
+        self._slots = asyncio.Semaphore(max_size)
+        self._deferred: dict[int, tuple[asyncio.TimerHandle, DeliveryJob]] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() + len(self._deferred)
+
+    def _ensure_started(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"delivery-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def close(self) -> None:
+        for handle, job in self._deferred.values():
+            handle.cancel()
+            job.future.cancel()
+        self._deferred.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(
+        self, chat_id: int, send: Callable[[], Awaitable[Any]]
+    ) -> asyncio.Future:
+        """Ставит отправку в очередь; ждёт, если очередь заполнена."""
+        self._ensure_started()
+        await self._slots.acquire()
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda _: self._slots.release())
+        self._queue.put_nowait(DeliveryJob(chat_id, send, future))
+        self.stats.peak_depth = max(self.stats.peak_depth, self.depth)
+        return future
+
+    def _chat_limiter(self, chat_id: int) -> RateLimiter:
+        limiter = self._chat_limiters.get(chat_id)
+        if limiter is None:
+            if chat_id < 0:
+                limiter = RateLimiter(
+                    max_calls=self.group_rate, period=60, name="telegram_group"
+                )
+            else:
+                limiter = RateLimiter(
+                    max_calls=self.chat_rate, period=1, name="telegram_chat"
+                )
+            self._chat_limiters[chat_id] = limiter
+        return limiter
+
+    def _drop_idle_chats(self, now: float) -> None:
+        """Забывает чаты с истёкшей паузой и полным ведром жетонов.
+
+        Новый лимитер начинает с полного ведра, так что для отправки
+        это ничего не меняет, а словари не растут с числом чатов.
+        """
+        self._paused_until = {
+            chat_id: until
+            for chat_id, until in self._paused_until.items()
+            if until > now
+        }
+        self._chat_limiters = {
+            chat_id: limiter
+            for chat_id, limiter in self._chat_limiters.items()
+            if chat_id in self._paused_until or not limiter.idle()
+        }
+
+    def _chat_delay(self, chat_id: int) -> float:
+        """0 — чату можно отправлять сейчас, иначе секунды до очереди."""
+        now = asyncio.get_running_loop().time()
+        if now >= self._next_idle_sweep:
+            self._drop_idle_chats(now)
+            self._next_idle_sweep = now + IDLE_SWEEP_INTERVAL
+        paused = self._paused_until.get(chat_id, 0) - now
+        if paused > 0:
+            return paused
+        return self._chat_limiter(chat_id).try_acquire()
+
+    def _defer(self, job: DeliveryJob, delay: float) -> None:
+        handle = asyncio.get_running_loop().call_later(
+            delay, self._requeue, job
+        )
+        self._deferred[id(job)] = (handle, job)
+
+    def _requeue(self, job: DeliveryJob) -> None:
+        self._deferred.pop(id(job), None)
+        if not job.future.done():
+            self._queue.put_nowait(job)
+
+    async def _deliver(self, job: DeliveryJob) -> None:
+        loop = asyncio.get_running_loop()
+        if not job.attempts:
+            self.stats.wait_time += time.monotonic() - job.enqueued_at
+
+        await self._global_limiter.acquire()
+        started = time.monotonic()
+        try:
+            result = await job.send()
+        except TelegramRetryAfter as e:
+            self.stats.retries += 1
+            logger.debug(f"Chat {job.chat_id}: retry after {e.retry_after}s")
+            self._paused_until[job.chat_id] = loop.time() + e.retry_after
+            job.attempts += 1
+            if job.attempts < self.max_retries:
+                self._defer(job, e.retry_after)
+                return
+            self.stats.failed += 1
+            job.resolve(
+                error=RuntimeError(f"Gave up after {self.max_retries} retries")
+            )
+            return
+        except Exception as e:
+            self.stats.failed += 1
+            job.resolve(error=e)
+            return
+        finally:
+            self.stats.send_time += time.monotonic() - started
+
+        self.stats.sent += 1
+        job.resolve(result)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.future.done():
+                    continue
+                delay = self._chat_delay(job.chat_id)
+                if delay > 0:
+                    self._defer(job, delay)
+                else:
+                    await self._deliver(job)
+            except asyncio.CancelledError:
+                if not job.future.done():
+                    job.future.cancel()
+                raise
+            finally:
+                self._queue.task_done()
+
+    def summary(self) -> str:
+        stats = self.stats
+        done = max(stats.sent + stats.failed, 1)
+        return (
+            f"sent={stats.sent} failed={stats.failed} "
+            f"retries={stats.retries} depth={self.depth} "
+            f"peak_depth={stats.peak_depth} "
+            f"avg_wait={stats.wait_time / done * 1000:.0f}ms "
+            f"avg_send={stats.send_time / done * 1000:.0f}ms"
+        )
@@ -0,0 +1,49 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Область для данных, общих для всех чатов
+GLOBAL = None
+
+
+class GetterCache:
+    """Read-through кэш данных геттеров диалога.
+
+    Записи сгруппированы по чатам: запись в БД от имени чата сбрасывает
+    всю его группу разом. TTL страхует от изменений, прошедших мимо
+    Repo (другие процессы, ручные правки БД).
+    """
+
+    def __init__(self, ttl: float = 300, max_chats: int = 1000):
+        self.ttl = ttl
+        self.max_chats = max_chats
+        self._scopes: OrderedDict[
+            Optional[int], dict[Hashable, tuple[float, Any]]
+        ] = OrderedDict()
+
+    async def get_or_load(
+        self,
+        scope: Optional[int],
+        key: Hashable,
+        load: Callable[[], Awaitable[T]],
+        ttl: Optional[float] = None,
+    ) -> T:
+        entries = self._scopes.get(scope)
+        if entries is not None:
+            self._scopes.move_to_end(scope)
+            cached = entries.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+
+        value = await load()
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._scopes.setdefault(scope, {})[key] = (expires_at, value)
+        self._scopes.move_to_end(scope)
+        if len(self._scopes) > self.max_chats:
+            self._scopes.popitem(last=False)
+        return value
+
+    def invalidate(self, scope: Optional[int] = GLOBAL) -> None:
+        self._scopes.pop(scope, None)
@@ -0,0 +1,46 @@
+from datetime import timedelta
+from typing import Awaitable, Callable
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.base import utcnow
+from app.services.repository import Repo
+
+
+class Leases:
+    """Выбор ведущего процесса для задач, которые должны идти в одном.
+
+    Аренда хранится в БД и продлевается каждым запуском задачи; если
+    держатель пропал, по истечении ttl её забирает другой процесс.
+    """
+
+    def __init__(
+        self,
+        session_pool: async_sessionmaker[AsyncSession],
+        owner: str,
+        ttl: int = 60 * 60,
+    ):
+        self.session_pool = session_pool
+        self.owner = owner
+        self.ttl = ttl
+
+    async def acquire(self, name: str) -> bool:
+        now = utcnow()
+        async with self.session_pool() as session:
+            return await Repo(session).acquire_lease(
+                name, self.owner, now, now + timedelta(seconds=self.ttl)
+            )
+
+    def exclusive(
+        self, name: str, job: Callable[[], Awaitable[None]]
+    ) -> Callable[[], Awaitable[None]]:
+        """Обёртка, запускающая job только у держателя аренды name."""
+
+        async def run() -> None:
+            if not await self.acquire(name):
+                logger.debug(f"Skipping {name}: lease held elsewhere")
+                return
+            await job()
+
+        return run
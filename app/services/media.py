@@ -0,0 +1,139 @@
+import asyncio
+import io
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Optional
+
+from aiogram.types import BufferedInputFile
+from aiohttp import ClientSession, ClientTimeout
+from loguru import logger
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow — необязательная зависимость (extra media)
+    Image = None
+
+IMAGE_EXTS = ("jpg", "jpeg", "png", "webp")
+
+
+def _shrink_image(
+    path: str, max_bytes: int, max_side: int, max_pixels: int
+) -> Optional[bytes]:
+    """Уменьшает изображение до JPEG не больше max_bytes.
+
+    Выполняется в отдельном процессе: декодирование больших файлов
+    не блокирует цикл событий бота.
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(path) as source:
+        # Для JPEG декодируем сразу в уменьшенном масштабе
+        source.draft("RGB", (max_side, max_side))
+        image = source.convert("RGB")
+
+    side = max_side
+    while side >= 640:
+        image.thumbnail((side, side))
+        for quality in (90, 80, 70, 60):
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG", quality=quality, optimize=True)
+            if buffer.tell() <= max_bytes:
+                return buffer.getvalue()
+        side = int(side * 0.75)
+    return None
+
+
+class MediaProcessor:
+    """Скачивание и пережатие файлов, которые слишком велики для Telegram.
+
+    Оригинал потоком пишется во временный файл с ограничением размера,
+    затем уменьшается в пуле процессов. В памяти держится только
+    текущий кусок загрузки и готовый результат.
+    """
+
+    def __init__(
+        self,
+        get_session: Callable[[], Awaitable[ClientSession]],
+        max_bytes: int,
+        max_download: int = 50_000_000,
+        concurrency: int = 2,
+        max_side: int = 2560,
+        max_pixels: int = 50_000_000,
+    ):
+        self.get_session = get_session
+        self.max_bytes = max_bytes
+        self.max_download = max_download
+        self.max_side = max_side
+        self.max_pixels = max_pixels
+        self.concurrency = concurrency
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None
+
+    def can_shrink(self, file_ext: str) -> bool:
+        return self.enabled and file_ext in IMAGE_EXTS
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _download(self, url: str) -> Optional[str]:
+        """Скачивает файл во временный файл; None при ошибке или лимите."""
+        session = await self.get_session()
+        spool = tempfile.NamedTemporaryFile(delete=False)
+        try:
+            async with session.get(
+                url, timeout=ClientTimeout(total=120)
+            ) as response:
+                if response.status != 200:
+                    logger.debug(f"Download {url}: {response.status}")
+                    raise ValueError("bad status")
+                if (response.content_length or 0) > self.max_download:
+                    raise ValueError("file too large")
+                size = 0
+                async for chunk in response.content.iter_chunked(65536):
+                    size += len(chunk)
+                    if size > self.max_download:
+                        raise ValueError("file too large")
+                    spool.write(chunk)
+            spool.close()
+            return spool.name
+        except Exception as e:
+            logger.debug(f"Download of {url} aborted: {e}")
+            spool.close()
+            os.remove(spool.name)
+            return None
+
+    async def shrink(
+        self, url: str, filename: str
+    ) -> Optional[BufferedInputFile]:
+        """Готовит уменьшенную копию изображения для загрузки."""
+        if not self.enabled:
+            return None
+        async with self._semaphore:
+            path = await self._download(url)
+            if path is None:
+                return None
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.concurrency)
+            try:
+                data = await asyncio.get_running_loop().run_in_executor(
+                    self._pool,
+                    _shrink_image,
+                    path,
+                    self.max_bytes,
+                    self.max_side,
+                    self.max_pixels,
+                )
+            except Exception as e:
+                logger.error(f"Failed to shrink {url}: {e}")
+                data = None
+            finally:
+                os.remove(path)
+        if data is None:
+            return None
+        return BufferedInputFile(data, filename=filename)
@@ -0,0 +1,162 @@
+import random
+from datetime import datetime, timedelta
+from typing import Optional
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.base import utcnow
+from app.models.subscriptions import Subscription
+from app.services.danbooru import DanbooruService
+from app.services.repository import Repo
+
+
+class PollScheduler:
+    """Адаптивное расписание опроса подписок.
+
+    Для каждой подписки ведётся скользящая оценка потока постов в час.
+    Интервал подбирается так, чтобы за один опрос приходило около
+    target_posts постов, и держится в пределах [min_interval,
+    max_interval]. Частый тик забирает только подписки, которым пора,
+    не больше batch_size за раз, а небольшой разброс времени не даёт
+    им снова собраться в один момент.
+    """
+
+    def __init__(
+        self,
+        session_pool: async_sessionmaker[AsyncSession],
+        danbooru: DanbooruService,
+        min_interval: int = 15 * 60,
+        max_interval: int = 6 * 60 * 60,
+        batch_size: int = 100,
+        target_posts: float = 5.0,
+        smoothing: float = 0.3,
+        jitter: float = 0.1,
+        worker_id: str = "local",
+        lease: int = 10 * 60,
+    ):
+        self.session_pool = session_pool
+        self.danbooru = danbooru
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.batch_size = batch_size
+        self.target_posts = target_posts
+        self.smoothing = smoothing
+        self.jitter = jitter
+        # Подписки забираются в аренду: при нескольких процессах-
+        # опросчиках каждую опрашивает только один
+        self.worker_id = worker_id
+        self.lease = lease
+
+    def _estimate_rate(
+        self, sub: Subscription, arrived: int, now: datetime
+    ) -> Optional[float]:
+        """Скользящая оценка постов в час; None — пока оценить нечем."""
+        if sub.last_post_id is None:
+            # Первый опрос отдаёт последние посты тэга, а не поток;
+            # пустой ответ значит, что постов по запросу пока нет
+            return sub.post_rate if arrived else 0.0
+        if sub.polled_at is None:
+            return sub.post_rate
+        hours = max((now - sub.polled_at).total_seconds() / 3600, 1 / 60)
+        observed = arrived / hours
+        if sub.post_rate is None:
+            return observed
+        return self.smoothing * observed + (1 - self.smoothing) * (
+            sub.post_rate
+        )
+
+    def _next_interval(
+        self, previous: Optional[int], rate: Optional[float]
+    ) -> int:
+        if rate is None:
+            return self.min_interval
+        if rate > 0:
+            target = self.target_posts / rate * 3600
+        else:
+            target = self.max_interval
+        # Тихие тэги замедляем постепенно, не больше чем вдвое за опрос
+        target = min(target, (previous or self.min_interval) * 2)
+        return int(min(max(target, self.min_interval), self.max_interval))
+
+    def _spread(self, interval: int, first: bool = False) -> timedelta:
+        # Первое расписание разбрасываем шире, чтобы подписки,
+        # добавленные разом, не опрашивались всегда вместе
+        jitter = 0.5 if first else self.jitter
+        factor = 1 + random.uniform(-jitter, jitter)
+        return timedelta(seconds=interval * factor)
+
+    async def tick(self) -> None:
+        """Опрашивает подписки, которым пора, и переносит их расписание."""
+        breaker = self.danbooru.api.breaker
+        if breaker.retry_in > 0:
+            # Danbooru лежит: подписки остаются в очереди до пробы
+            logger.debug(f"Polling paused, probe in {breaker.retry_in:.0f}s")
+            return
+
+        now = utcnow()
+        async with self.session_pool() as session:
+            repo = Repo(session)
+            due = await repo.claim_due_subscriptions(
+                now,
+                self.batch_size,
+                self.worker_id,
+                now + timedelta(seconds=self.lease),
+            )
+            if not due:
+                return
+            backlog = await repo.count_due_subscriptions(now)
+
+        if backlog > 0:
+            logger.debug(f"Polling {len(due)} subs, {backlog} still due")
+
+        arrivals = await self.danbooru.check_new_posts(
+            [(sub.id, sub.tags, sub.last_post_id) for sub in due]
+        )
+
+        polled_at = utcnow()
+        schedule = []
+        outage = not breaker.closed
+        for sub in due:
+            if sub.id not in arrivals:
+                if outage:
+                    # Не опрошена из-за аварии — продолжим с неё после пробы
+                    retry_at = now
+                else:
+                    # Запрос не удался — оценку не трогаем, повторим позже
+                    retry_at = polled_at + self._spread(self.min_interval)
+                schedule.append(
+                    {
+                        "id": sub.id,
+                        "post_rate": sub.post_rate,
+                        "poll_interval": sub.poll_interval,
+                        "polled_at": sub.polled_at,
+                        "next_poll_at": retry_at,
+                        "lease_owner": None,
+                    }
+                )
+                continue
+            rate = self._estimate_rate(sub, arrivals[sub.id], polled_at)
+            interval = self._next_interval(sub.poll_interval, rate)
+            schedule.append(
+                {
+                    "id": sub.id,
+                    "post_rate": rate,
+                    "poll_interval": interval,
+                    "polled_at": polled_at,
+                    "next_poll_at": polled_at
+                    + self._spread(interval, first=sub.polled_at is None),
+                    "lease_owner": None,
+                }
+            )
+
+        async with self.session_pool() as session:
+            await Repo(session).update_poll_schedule(schedule)
+
+    async def next_poll_time(self) -> Optional[datetime]:
+        async with self.session_pool() as session:
+            return await Repo(session).get_next_poll_at()
+
+    async def poll_all_now(self) -> None:
+        async with self.session_pool() as session:
+            await Repo(session).reset_next_poll_at(utcnow())
@@ -0,0 +1,122 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+from app.api.danbooru_client import RawPost
+
+# (id, tags, last_post_id) — строка подписки для опроса
+SubscriptionRow = tuple[int, str, Optional[int]]
+
+# Метатэги и маски нельзя проверить по tag_string локально
+_COMPLEX_MARKERS = (":", "*")
+_COMPLEX_PREFIXES = ("-", "~")
+
+
+@dataclass
+class FetchGroup:
+    """Один HTTP-запрос, обслуживающий одну или несколько подписок."""
+
+    query: str
+    last_post_id: Optional[int]
+    subs: list[SubscriptionRow] = field(default_factory=list)
+
+    @property
+    def is_combined(self) -> bool:
+        return len(self.subs) > 1
+
+    def split(
+        self, posts: list[RawPost]
+    ) -> tuple[dict[int, list[RawPost]], list[RawPost]]:
+        """Раскладывает ответ по подпискам группы.
+
+        Возвращает посты по id подписки и посты, которые не удалось
+        сопоставить ни с одной подпиской (например, из-за алиасов тэгов).
+        """
+        if not self.is_combined:
+            return {self.subs[0][0]: posts}, []
+
+        matched: dict[int, list[RawPost]] = {
+            sub_id: [] for sub_id, _, _ in self.subs
+        }
+        unmatched: list[RawPost] = []
+        for post in posts:
+            post_tags = set((post.get("tag_string") or "").split())
+            found = False
+            for sub_id, tag, last_post_id in self.subs:
+                if tag.lower() in post_tags:
+                    found = True
+                    if post["id"] > (last_post_id or 0):
+                        matched[sub_id].append(post)
+            if not found:
+                unmatched.append(post)
+        return matched, unmatched
+
+    def advance_marks(self, posts: list[RawPost]) -> dict[int, int]:
+        """Новые отметки подписок после успешного запроса.
+
+        Ответ непрерывен от отметки группы до самого свежего поста,
+        поэтому все подписки группы можно сдвинуть до него.
+        """
+        newest = max((post["id"] for post in posts), default=None)
+        if newest is None:
+            return {}
+        return {
+            sub_id: newest
+            for sub_id, _, last_post_id in self.subs
+            if newest > (last_post_id or 0)
+        }
+
+
+def is_packable(tags: str) -> bool:
+    """Подписка из одного обычного тэга, проверяемого локально."""
+    parts = tags.split()
+    if len(parts) != 1:
+        return False
+    tag = parts[0]
+    if tag.startswith(_COMPLEX_PREFIXES):
+        return False
+    return not any(marker in tag for marker in _COMPLEX_MARKERS)
+
+
+def plan_queries(
+    subs: list[SubscriptionRow],
+    tag_limit: int,
+    exclude: Optional[set[str]] = None,
+) -> list[FetchGroup]:
+    """Упаковывает однотэговые подписки в OR-запросы (~a ~b).
+
+    Новые подписки без отметки и сложные запросы идут отдельными
+    запросами. Остальные сортируются по отметке, чтобы в одну группу
+    попадали подписки с близкими отметками и ответ был короче.
+    """
+    exclude = exclude or set()
+    groups: list[FetchGroup] = []
+    packable: list[SubscriptionRow] = []
+
+    for sub in subs:
+        _, tags, last_post_id = sub
+        if (
+            tag_limit >= 2
+            and last_post_id is not None
+            and tags not in exclude
+            and is_packable(tags)
+        ):
+            packable.append(sub)
+        else:
+            groups.append(FetchGroup(tags, last_post_id, [sub]))
+
+    packable.sort(key=lambda sub: sub[2])
+    for start in range(0, len(packable), tag_limit):
+        chunk = packable[start : start + tag_limit]
+        if len(chunk) == 1:
+            _, tags, last_post_id = chunk[0]
+            groups.append(FetchGroup(tags, last_post_id, chunk))
+            continue
+        groups.append(
+            FetchGroup(
+                query=" ".join(f"~{tags}" for _, tags, _ in chunk),
+                last_post_id=min(sub[2] for sub in chunk),
+                subs=chunk,
+            )
+        )
+
+    return groups
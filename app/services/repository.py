@@ -1,85 +1,979 @@
-from typing import Optional
+from datetime import datetime
+from typing import Awaitable, Callable, Hashable, Optional, TypeVar
 
 from loguru import logger
-from sqlalchemy import delete, select
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import (
+    ColumnElement,
+    Select,
+    case,
+    delete,
+    exists,
+    func,
+    literal_column,
+    select,
+    table,
+    text,
+    update,
+)
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from app.models.posts import Post
-from app.models.subscriptions import Subscription
+from app.database import dialect_insert
+from app.models.backfill import (
+    BACKFILL_CANCELLED,
+    BACKFILL_DONE,
+    BACKFILL_RUNNING,
+    BackfillJob,
+)
+from app.models.filter_rules import FilterRule
+from app.models.leases import Lease
+from app.models.media_files import MediaFile
+from app.models.outbox import (
+    OUTBOX_FAILED,
+    OUTBOX_PENDING,
+    OUTBOX_SENT,
+    OutboxItem,
+)
+from app.models.subscribers import Subscriber
+from app.models.subscriptions import SEARCH_TABLE, Subscription
+from app.services.getter_cache import GLOBAL, GetterCache
+
+T = TypeVar("T")
+
+# Подписка нужна хотя бы одному чату
+_has_subscribers = exists().where(
+    Subscriber.subscription_id == Subscription.id
+)
 
 
 class Repo:
-    def __init__(self, session: AsyncSession):
-        self.session = session
+    def __init__(
+        self,
+        session: Optional[AsyncSession] = None,
+        cache: Optional[GetterCache] = None,
+        session_pool: Optional[async_sessionmaker[AsyncSession]] = None,
+    ):
+        self._session = session
+        self._session_pool = session_pool
+        self.cache = cache
+
+    @property
+    def session(self) -> AsyncSession:
+        """Сессия из session_pool открывается при первом обращении к БД."""
+        if self._session is None:
+            self._session = self._session_pool()
+        return self._session
+
+    async def close(self) -> None:
+        """Закрывает сессию, если Repo открыл её сам."""
+        if self._session is not None and self._session_pool is not None:
+            await self._session.close()
+            self._session = None
+
+    async def cached(
+        self,
+        chat_id: Optional[int],
+        key: Hashable,
+        load: Callable[[], Awaitable[T]],
+        ttl: Optional[float] = None,
+    ) -> T:
+        """Данные для геттера через кэш; без кэша — сразу из БД."""
+        if self.cache is None:
+            return await load()
+        return await self.cache.get_or_load(chat_id, key, load, ttl)
+
+    def _invalidate(self, chat_id: int) -> None:
+        if self.cache is not None:
+            self.cache.invalidate(chat_id)
+            # Новая подписка сдвигает ближайший опрос
+            self.cache.invalidate(GLOBAL)
+
+    def _insert(self, model):
+        """INSERT с поддержкой ON CONFLICT для текущей БД."""
+        dialect = self.session.get_bind().dialect.name
+        return dialect_insert(dialect)(model)
+
+    @staticmethod
+    def _chat_subscriptions(chat_id: int, *columns) -> Select:
+        return (
+            select(*columns)
+            .select_from(Subscription)
+            .join(Subscriber, Subscriber.subscription_id == Subscription.id)
+            .where(Subscriber.chat_id == chat_id)
+        )
+
+    async def _has_search_index(self) -> bool:
+        """Есть ли FTS5-индекс тегов; ответ кэшируется на соединении."""
+        connection = await self.session.connection()
+        if connection.dialect.name != "sqlite":
+            return False
+        if SEARCH_TABLE not in connection.info:
+            found = await connection.scalar(
+                text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+                {"name": SEARCH_TABLE},
+            )
+            connection.info[SEARCH_TABLE] = bool(found)
+        return connection.info[SEARCH_TABLE]
+
+    async def _tags_match(self, query: str) -> ColumnElement[bool]:
+        """Условие поиска подписок по подстроке тегов."""
+        # trigram не ищет строки короче трёх символов
+        if len(query) >= 3 and await self._has_search_index():
+            phrase = '"' + query.replace('"', '""') + '"'
+            return Subscription.id.in_(
+                select(literal_column("rowid"))
+                .select_from(table(SEARCH_TABLE))
+                .where(literal_column(SEARCH_TABLE).op("MATCH")(phrase))
+            )
+        # В тегах Danbooru полно подчёркиваний — экранируем и их
+        pattern = (
+            query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        )
+        return Subscription.tags.ilike(f"%{pattern}%", escape="\\")
 
-    async def get_subscriptions_list(self) -> Optional[list[tuple[int, str]]]:
+    async def get_subscriptions_list(
+        self, chat_id: int, limit: Optional[int] = None, offset: int = 0
+    ) -> Optional[list[tuple[int, str]]]:
+        """Подписки чата в порядке добавления, страница limit/offset."""
         result = await self.session.execute(
-            select(Subscription.id, Subscription.tags)
+            self._chat_subscriptions(
+                chat_id, Subscription.id, Subscription.tags
+            )
+            .order_by(Subscription.id)
+            .limit(limit)
+            .offset(offset)
         )
         subs = result.all()
         return subs or None
 
-    async def get_existing_post_ids(self, post_ids: list[int]) -> set[int]:
-        """Batch-проверка существующих постов."""
-        if not post_ids:
-            return set()
+    async def search_subscribes_by_tags(
+        self,
+        query: str,
+        chat_id: int,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> Optional[list[tuple[int, str]]]:
+        """Подписки чата, в тегах которых есть подстрока query."""
+        result = await self.session.execute(
+            self._chat_subscriptions(
+                chat_id, Subscription.id, Subscription.tags
+            )
+            .where(await self._tags_match(query))
+            .order_by(Subscription.id)
+            .limit(limit)
+            .offset(offset)
+        )
+        subs = result.all()
+        return subs or None
+
+    async def count_subscriptions(
+        self, chat_id: int, query: Optional[str] = None
+    ) -> int:
+        """Число подписок чата, с фильтром по тегам или без."""
+        stmt = self._chat_subscriptions(chat_id, func.count())
+        if query:
+            stmt = stmt.where(await self._tags_match(query))
+        return await self.session.scalar(stmt) or 0
+
+    async def get_subscriptions_for_polling(
+        self,
+    ) -> list[tuple[int, str, Optional[int]]]:
         result = await self.session.execute(
-            select(Post.id).where(Post.id.in_(post_ids))
+            select(
+                Subscription.id, Subscription.tags, Subscription.last_post_id
+            ).where(_has_subscribers)
+        )
+        return list(result.all())
+
+    async def get_subscription_chats(
+        self, sub_ids: list[int]
+    ) -> dict[int, list[int]]:
+        """Чаты по id подписки — куда отправлять найденное по запросу."""
+        if not sub_ids:
+            return {}
+        result = await self.session.execute(
+            select(Subscriber.subscription_id, Subscriber.chat_id).where(
+                Subscriber.subscription_id.in_(sub_ids)
+            )
         )
-        return {row[0] for row in result.all()}
+        chats: dict[int, list[int]] = {}
+        for sub_id, chat_id in result.all():
+            chats.setdefault(sub_id, []).append(chat_id)
+        return chats
 
-    async def add_posts_batch(self, post_ids: list[int]) -> int:
-        """Batch-вставка с ON CONFLICT DO NOTHING."""
-        if not post_ids:
+    async def adopt_orphan_subscriptions(self, chat_id: int) -> int:
+        """Отдаёт чату подписки без подписчиков (данные до мультичата)."""
+        result = await self.session.execute(
+            select(Subscription.id).where(~_has_subscribers)
+        )
+        orphans = list(result.scalars().all())
+        if not orphans:
             return 0
         try:
-            stmt = insert(Post).values([{"id": pid} for pid in post_ids])
-            stmt = stmt.on_conflict_do_nothing(index_elements=["id"])
-            result = await self.session.execute(stmt)
+            self.session.add_all(
+                Subscriber(subscription_id=sub_id, chat_id=chat_id)
+                for sub_id in orphans
+            )
             await self.session.commit()
-            return result.rowcount or 0
-        except Exception as e:
+        except IntegrityError:
+            # Другой процесс успел раньше
             await self.session.rollback()
-            logger.error(f"Batch insert failed: {e}")
             return 0
+        self._invalidate(chat_id)
+        return len(orphans)
+
+    async def update_last_post_ids(self, marks: dict[int, int]) -> None:
+        """Batch-обновление последних полученных постов подписок."""
+        if not marks:
+            return
+        try:
+            await self.session.execute(
+                update(Subscription),
+                [
+                    {"id": sub_id, "last_post_id": post_id}
+                    for sub_id, post_id in marks.items()
+                ],
+            )
+            await self.session.commit()
+        except Exception as e:
+            await self.session.rollback()
+            logger.error(f"Watermark update failed: {e}")
 
-    async def get_post(self, post_id: int) -> Optional[Post]:
-        return await self.session.get(Post, post_id)
+    async def claim_due_subscriptions(
+        self, now: datetime, limit: int, owner: str, lease_until: datetime
+    ) -> list[Subscription]:
+        """Забирает подписки, которым пора в опрос, самые просроченные первыми.
 
-    async def add_post(self, post_id: int) -> bool:
+        Забранные подписки переносятся на lease_until, поэтому другие
+        опросчики их не видят; если владелец упадёт, по истечении аренды
+        подписки снова станут доступны. Условие повторяется во внешнем
+        UPDATE: в PostgreSQL второй опросчик, дождавшийся блокировки
+        строки, перепроверяет только его и не перезапишет аренду.
+        """
+        is_due = (Subscription.next_poll_at.is_(None)) | (
+            Subscription.next_poll_at <= now
+        )
+        due = (
+            select(Subscription.id)
+            .where(is_due, _has_subscribers)
+            .order_by(Subscription.next_poll_at.asc().nulls_first())
+            .limit(limit)
+            # Занятые другим опросчиком строки пропускаются (PostgreSQL)
+            .with_for_update(skip_locked=True)
+        )
         try:
-            self.session.add(Post(id=post_id))
+            await self.session.execute(
+                update(Subscription)
+                .where(Subscription.id.in_(due), is_due)
+                .values(next_poll_at=lease_until, lease_owner=owner)
+                .execution_options(synchronize_session=False)
+            )
+            await self.session.commit()
+        except Exception as e:
+            await self.session.rollback()
+            logger.error(f"Subscription claim failed: {e}")
+            return []
+        result = await self.session.execute(
+            select(Subscription).where(
+                Subscription.lease_owner == owner,
+                Subscription.next_poll_at == lease_until,
+            )
+        )
+        return list(result.scalars().all())
+
+    async def count_due_subscriptions(self, now: datetime) -> int:
+        result = await self.session.execute(
+            select(func.count(Subscription.id)).where(
+                (Subscription.next_poll_at.is_(None))
+                | (Subscription.next_poll_at <= now),
+                _has_subscribers,
+            )
+        )
+        return result.scalar_one()
+
+    async def get_next_poll_at(self) -> Optional[datetime]:
+        """Ближайшее время опроса; подписка без расписания — «сейчас»."""
+        result = await self.session.execute(
+            select(
+                func.min(Subscription.next_poll_at),
+                func.count(),
+                func.count(Subscription.next_poll_at),
+            ).where(_has_subscribers)
+        )
+        next_poll_at, total, scheduled = result.one()
+        if total and total != scheduled:
+            return datetime.min
+        return next_poll_at
+
+    async def update_poll_schedule(self, schedule: list[dict]) -> None:
+        """Batch-обновление расписания опроса по id подписки."""
+        if not schedule:
+            return
+        try:
+            await self.session.execute(update(Subscription), schedule)
+            await self.session.commit()
+        except Exception as e:
+            await self.session.rollback()
+            logger.error(f"Poll schedule update failed: {e}")
+
+    async def reset_next_poll_at(self, now: datetime) -> None:
+        """Делает все подписки готовыми к опросу."""
+        await self.session.execute(
+            update(Subscription).values(next_poll_at=now)
+        )
+        await self.session.commit()
+
+    async def get_existing_deliveries(
+        self, keys: list[tuple[int, int]]
+    ) -> set[tuple[int, int]]:
+        """Пары (chat_id, post_id), которые уже есть в outbox."""
+        if not keys:
+            return set()
+        wanted = set(keys)
+        result = await self.session.execute(
+            select(OutboxItem.chat_id, OutboxItem.post_id).where(
+                OutboxItem.post_id.in_({post_id for _, post_id in keys})
+            )
+        )
+        return {tuple(row) for row in result.all()} & wanted
+
+    async def get_recent_deliveries(self, limit: int) -> list[tuple[int, int]]:
+        """Последние пары (chat_id, post_id) из outbox, от новых к старым."""
+        result = await self.session.execute(
+            select(OutboxItem.chat_id, OutboxItem.post_id)
+            .order_by(OutboxItem.id.desc())
+            .limit(limit)
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def enqueue_posts(
+        self, deliveries: list[tuple[int, int, str]], now: datetime
+    ) -> bool:
+        """Ставит посты в outbox.
+
+        deliveries — тройки (chat_id, post_id, JSON поста). Записанная
+        пара (chat_id, post_id) сразу становится историей доставок.
+        """
+        if not deliveries:
+            return True
+        try:
+            items = self._insert(OutboxItem).values(
+                [
+                    {
+                        "chat_id": chat_id,
+                        "post_id": post_id,
+                        "payload": payload,
+                        "status": OUTBOX_PENDING,
+                        "attempts": 0,
+                        "created_at": now,
+                        "updated_at": now,
+                    }
+                    for chat_id, post_id, payload in deliveries
+                ]
+            )
+            await self.session.execute(
+                items.on_conflict_do_nothing(
+                    index_elements=["chat_id", "post_id"]
+                )
+            )
+            await self.session.commit()
+            return True
+        except Exception as e:
+            await self.session.rollback()
+            logger.error(f"Outbox enqueue failed: {e}")
+            return False
+
+    async def claim_outbox(
+        self, limit: int, owner: str, now: datetime, lease_until: datetime
+    ) -> list[OutboxItem]:
+        """Забирает следующую пачку неотправленных постов в порядке очереди.
+
+        Записи, арендованные другим отправителем, пропускаются до
+        истечения аренды. Условия аренды повторяются во внешнем UPDATE,
+        чтобы два отправителя не забрали одну запись.
+        """
+        available = (OutboxItem.status == OUTBOX_PENDING) & (
+            (OutboxItem.lease_until.is_(None)) | (OutboxItem.lease_until < now)
+        )
+        pending = (
+            select(OutboxItem.id)
+            .where(available)
+            .order_by(OutboxItem.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        try:
+            await self.session.execute(
+                update(OutboxItem)
+                .where(OutboxItem.id.in_(pending), available)
+                .values(lease_owner=owner, lease_until=lease_until)
+                .execution_options(synchronize_session=False)
+            )
+            await self.session.commit()
+        except Exception as e:
+            await self.session.rollback()
+            logger.error(f"Outbox claim failed: {e}")
+            return []
+        result = await self.session.execute(
+            select(OutboxItem)
+            .where(
+                OutboxItem.status == OUTBOX_PENDING,
+                OutboxItem.lease_owner == owner,
+                OutboxItem.lease_until == lease_until,
+            )
+            .order_by(OutboxItem.id)
+        )
+        return list(result.scalars().all())
+
+    async def finish_outbox(
+        self,
+        sent: list[int],
+        failed: dict[int, str],
+        max_attempts: int,
+        now: datetime,
+    ) -> None:
+        """Записывает итоги пачки одним коммитом.
+
+        Неудачные попытки остаются pending, пока не исчерпан
+        max_attempts, после чего запись помечается failed. Аренда
+        неудачных записей не снимается: повтор будет после её истечения.
+        """
+        if not sent and not failed:
+            return
+        try:
+            if sent:
+                await self.session.execute(
+                    update(OutboxItem)
+                    .where(OutboxItem.id.in_(sent))
+                    .values(status=OUTBOX_SENT, error=None, updated_at=now)
+                )
+            for error, ids in _group_by_value(failed).items():
+                await self.session.execute(
+                    update(OutboxItem)
+                    .where(OutboxItem.id.in_(ids))
+                    .values(
+                        attempts=OutboxItem.attempts + 1,
+                        status=case(
+                            (
+                                OutboxItem.attempts + 1 >= max_attempts,
+                                OUTBOX_FAILED,
+                            ),
+                            else_=OUTBOX_PENDING,
+                        ),
+                        error=error[:255],
+                        updated_at=now,
+                    )
+                )
+            await self.session.commit()
+        except Exception as e:
+            await self.session.rollback()
+            logger.error(f"Outbox update failed: {e}")
+
+    async def acquire_lease(
+        self, name: str, owner: str, now: datetime, until: datetime
+    ) -> bool:
+        """Берёт или продлевает аренду; False — её держит другой процесс."""
+        try:
+            result = await self.session.execute(
+                update(Lease)
+                .where(
+                    Lease.name == name,
+                    (Lease.owner == owner) | (Lease.expires_at < now),
+                )
+                .values(owner=owner, expires_at=until)
+            )
+            if not result.rowcount:
+                self.session.add(
+                    Lease(name=name, owner=owner, expires_at=until)
+                )
             await self.session.commit()
             return True
         except IntegrityError:
             await self.session.rollback()
             return False
 
-    async def add_subscription(self, tags: str) -> bool:
+    async def count_outbox(self) -> dict[str, int]:
+        result = await self.session.execute(
+            select(OutboxItem.status, func.count(OutboxItem.id)).group_by(
+                OutboxItem.status
+            )
+        )
+        return dict(result.all())
+
+    async def compact_sent_outbox(
+        self, before: datetime, batch_size: int
+    ) -> int:
+        """Очищает JSON одной пачки давно отправленных записей outbox.
+
+        Сама запись остаётся: пара (chat_id, post_id) — история
+        доставок, без неё пост снова уйдёт в чат при догрузке истории,
+        повторной подписке или сброшенной отметке.
+        """
+        batch = (
+            select(OutboxItem.id)
+            .where(
+                OutboxItem.status == OUTBOX_SENT,
+                OutboxItem.updated_at < before,
+                OutboxItem.payload != "",
+            )
+            .limit(batch_size)
+        )
+        try:
+            result = await self.session.execute(
+                update(OutboxItem)
+                .where(OutboxItem.id.in_(batch))
+                .values(payload="", lease_owner=None, lease_until=None)
+                .execution_options(synchronize_session=False)
+            )
+            await self.session.commit()
+            return result.rowcount or 0
+        except Exception as e:
+            await self.session.rollback()
+            logger.error(f"Outbox compaction failed: {e}")
+            return 0
+
+    async def get_chat_watermarks(self) -> dict[int, int]:
+        """Наименьшая отметка подписок каждого чата.
+
+        Ещё не опрошенная подписка считается отметкой 0: её первый опрос
+        может вернуть любые посты.
+        """
+        result = await self.session.execute(
+            select(
+                Subscriber.chat_id,
+                func.min(func.coalesce(Subscription.last_post_id, 0)),
+            )
+            .join(Subscription, Subscription.id == Subscriber.subscription_id)
+            .group_by(Subscriber.chat_id)
+        )
+        return dict(result.all())
+
+    async def get_outbox_chats(self) -> list[int]:
+        result = await self.session.execute(
+            select(OutboxItem.chat_id).distinct()
+        )
+        return list(result.scalars().all())
+
+    async def get_outbox_keep_floor(
+        self, chat_id: int, keep: int
+    ) -> Optional[int]:
+        """post_id keep-й по свежести записи чата; None — записей меньше."""
+        result = await self.session.execute(
+            select(OutboxItem.post_id)
+            .where(OutboxItem.chat_id == chat_id)
+            .order_by(OutboxItem.post_id.desc())
+            .offset(keep - 1)
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+    async def delete_outbox_history(
+        self, chat_id: int, below: int, before: datetime, batch_size: int
+    ) -> int:
+        """Удаляет пачку завершённых записей чата с post_id ниже below."""
+        batch = (
+            select(OutboxItem.id)
+            .where(
+                OutboxItem.chat_id == chat_id,
+                OutboxItem.post_id < below,
+                OutboxItem.status != OUTBOX_PENDING,
+                OutboxItem.updated_at < before,
+            )
+            .limit(batch_size)
+        )
         try:
-            self.session.add(Subscription(tags=tags))
+            result = await self.session.execute(
+                delete(OutboxItem)
+                .where(OutboxItem.id.in_(batch))
+                .execution_options(synchronize_session=False)
+            )
             await self.session.commit()
+            return result.rowcount or 0
+        except Exception as e:
+            await self.session.rollback()
+            logger.error(f"Outbox pruning failed: {e}")
+            return 0
+
+    async def get_file_ids(
+        self, posts: dict[int, str]
+    ) -> dict[int, tuple[str, str]]:
+        """file_id и тип медиа по id поста для пар (post_id, md5)."""
+        if not posts:
+            return {}
+        result = await self.session.execute(
+            select(
+                MediaFile.post_id,
+                MediaFile.md5,
+                MediaFile.file_id,
+                MediaFile.media_type,
+            ).where(MediaFile.post_id.in_(list(posts)))
+        )
+        return {
+            post_id: (file_id, media_type)
+            for post_id, md5, file_id, media_type in result.all()
+            if posts[post_id] == md5
+        }
+
+    async def save_file_ids(
+        self, files: dict[int, tuple[str, str, str]]
+    ) -> None:
+        """Batch-сохранение (md5, file_id, тип медиа) по id поста."""
+        if not files:
+            return
+        try:
+            stmt = self._insert(MediaFile).values(
+                [
+                    {
+                        "post_id": post_id,
+                        "md5": md5,
+                        "file_id": file_id,
+                        "media_type": media_type,
+                    }
+                    for post_id, (md5, file_id, media_type) in files.items()
+                ]
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["post_id", "md5"],
+                set_={
+                    "file_id": stmt.excluded.file_id,
+                    "media_type": stmt.excluded.media_type,
+                },
+            )
+            await self.session.execute(stmt)
+            await self.session.commit()
+        except Exception as e:
+            await self.session.rollback()
+            logger.error(f"File id save failed: {e}")
+
+    async def add_subscription(self, tags: str, chat_id: int) -> bool:
+        """Подписывает чат на запрос; False — если уже подписан.
+
+        Запрос общий для всех чатов: опрашивается он один раз, сколько
+        бы чатов на него ни подписалось.
+        """
+        try:
+            sub_id = await self.session.scalar(
+                select(Subscription.id).where(Subscription.tags == tags)
+            )
+            if sub_id is None:
+                sub = Subscription(tags=tags)
+                self.session.add(sub)
+                await self.session.flush()
+                sub_id = sub.id
+            self.session.add(
+                Subscriber(subscription_id=sub_id, chat_id=chat_id)
+            )
+            await self.session.commit()
+            self._invalidate(chat_id)
             return True
         except IntegrityError:
             await self.session.rollback()
             return False
 
-    async def delete_sub(self, sub_id: int) -> Optional[str]:
+    async def add_subscriptions_bulk(
+        self, queries: list[str], chat_id: int, chunk_size: int = 500
+    ) -> Optional[tuple[list[str], list[str]]]:
+        """Подписывает чат на много запросов одной транзакцией.
+
+        Возвращает новые подписки чата и те, на которые он уже был
+        подписан; None — если транзакция не удалась.
+        """
+        if not queries:
+            return [], []
+        try:
+            sub_ids: dict[str, int] = {}
+            for start in range(0, len(queries), chunk_size):
+                chunk = queries[start : start + chunk_size]
+                stmt = self._insert(Subscription).values(
+                    [{"tags": tags} for tags in chunk]
+                )
+                await self.session.execute(
+                    stmt.on_conflict_do_nothing(index_elements=["tags"])
+                )
+                result = await self.session.execute(
+                    select(Subscription.tags, Subscription.id).where(
+                        Subscription.tags.in_(chunk)
+                    )
+                )
+                sub_ids.update(result.all())
+
+            result = await self.session.execute(
+                select(Subscriber.subscription_id).where(
+                    Subscriber.chat_id == chat_id,
+                    Subscriber.subscription_id.in_(sub_ids.values()),
+                )
+            )
+            subscribed = set(result.scalars().all())
+            added = [t for t in queries if sub_ids[t] not in subscribed]
+            existing = [t for t in queries if sub_ids[t] in subscribed]
+
+            for start in range(0, len(added), chunk_size):
+                stmt = self._insert(Subscriber).values(
+                    [
+                        {"subscription_id": sub_ids[tags], "chat_id": chat_id}
+                        for tags in added[start : start + chunk_size]
+                    ]
+                )
+                await self.session.execute(stmt.on_conflict_do_nothing())
+            await self.session.commit()
+        except Exception as e:
+            await self.session.rollback()
+            logger.error(f"Bulk subscribe failed: {e}")
+            return None
+        self._invalidate(chat_id)
+        return added, existing
+
+    async def delete_sub(self, sub_id: int, chat_id: int) -> Optional[str]:
+        """Отписывает чат; запрос без подписчиков удаляется целиком."""
         try:
             result = await self.session.execute(
-                select(Subscription.tags).where(Subscription.id == sub_id)
+                select(Subscription.tags)
+                .join(
+                    Subscriber, Subscriber.subscription_id == Subscription.id
+                )
+                .where(
+                    Subscription.id == sub_id, Subscriber.chat_id == chat_id
+                )
             )
             tag = result.scalar_one_or_none()
             if tag is None:
                 return None
 
             await self.session.execute(
-                delete(Subscription).where(Subscription.id == sub_id)
+                delete(Subscriber).where(
+                    Subscriber.subscription_id == sub_id,
+                    Subscriber.chat_id == chat_id,
+                )
+            )
+            # Правила и догрузки чата для этой подписки больше не нужны
+            for model in (FilterRule, BackfillJob):
+                await self.session.execute(
+                    delete(model).where(
+                        model.subscription_id == sub_id,
+                        model.chat_id == chat_id,
+                    )
+                )
+            await self.session.execute(
+                delete(Subscription).where(
+                    Subscription.id == sub_id, ~_has_subscribers
+                )
             )
             await self.session.commit()
+            self._invalidate(chat_id)
             return tag
         except Exception:
             await self.session.rollback()
             return None
+
+    async def get_chat_subscription_id(
+        self, chat_id: int, tags: str
+    ) -> Optional[int]:
+        return await self.session.scalar(
+            self._chat_subscriptions(chat_id, Subscription.id).where(
+                Subscription.tags == tags
+            )
+        )
+
+    async def get_filter_rules(
+        self,
+    ) -> list[tuple[Optional[int], Optional[int], str, str]]:
+        """Все правила фильтрации в стабильном порядке."""
+        result = await self.session.execute(
+            select(
+                FilterRule.chat_id,
+                FilterRule.subscription_id,
+                FilterRule.kind,
+                FilterRule.value,
+            ).order_by(FilterRule.id)
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def get_chat_filter_rules(
+        self, chat_id: int
+    ) -> list[tuple[int, Optional[int], Optional[str], str, str]]:
+        """Правила чата и общие правила: id, чат, подписка, вид, значение."""
+        result = await self.session.execute(
+            select(
+                FilterRule.id,
+                FilterRule.chat_id,
+                Subscription.tags,
+                FilterRule.kind,
+                FilterRule.value,
+            )
+            .outerjoin(
+                Subscription, Subscription.id == FilterRule.subscription_id
+            )
+            .where(
+                (FilterRule.chat_id == chat_id) | FilterRule.chat_id.is_(None)
+            )
+            .order_by(FilterRule.id)
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def add_filter_rules(
+        self,
+        chat_id: Optional[int],
+        sub_id: Optional[int],
+        kind: str,
+        values: list[str],
+    ) -> int:
+        """Добавляет правила области, пропуская уже существующие."""
+        result = await self.session.execute(
+            select(FilterRule.value).where(
+                FilterRule.chat_id.is_(None)
+                if chat_id is None
+                else FilterRule.chat_id == chat_id,
+                FilterRule.subscription_id.is_(None)
+                if sub_id is None
+                else FilterRule.subscription_id == sub_id,
+                FilterRule.kind == kind,
+            )
+        )
+        existing = set(result.scalars().all())
+        new_values = [value for value in values if value not in existing]
+        if not new_values:
+            return 0
+        self.session.add_all(
+            FilterRule(
+                chat_id=chat_id, subscription_id=sub_id, kind=kind, value=value
+            )
+            for value in new_values
+        )
+        await self.session.commit()
+        return len(new_values)
+
+    async def delete_filter_rule(
+        self, rule_id: int, chat_id: int, is_admin: bool
+    ) -> bool:
+        """Удаляет правило чата; общие правила удаляет только админ."""
+        owner = FilterRule.chat_id == chat_id
+        if is_admin:
+            owner = owner | FilterRule.chat_id.is_(None)
+        result = await self.session.execute(
+            delete(FilterRule).where(FilterRule.id == rule_id, owner)
+        )
+        await self.session.commit()
+        return bool(result.rowcount)
+
+    async def clear_filter_rules(self, chat_id: int) -> int:
+        result = await self.session.execute(
+            delete(FilterRule).where(FilterRule.chat_id == chat_id)
+        )
+        await self.session.commit()
+        return result.rowcount
+
+    async def get_subscription_tags(
+        self, sub_id: int, chat_id: int
+    ) -> Optional[str]:
+        return await self.session.scalar(
+            self._chat_subscriptions(chat_id, Subscription.tags).where(
+                Subscription.id == sub_id
+            )
+        )
+
+    async def get_backfill(
+        self, sub_id: int, chat_id: int
+    ) -> Optional[BackfillJob]:
+        """Последняя догрузка истории подписки для чата."""
+        return await self.session.scalar(
+            select(BackfillJob)
+            .where(
+                BackfillJob.subscription_id == sub_id,
+                BackfillJob.chat_id == chat_id,
+            )
+            .order_by(BackfillJob.id.desc())
+            .limit(1)
+        )
+
+    async def start_backfill(
+        self, sub_id: int, chat_id: int, max_posts: int, now: datetime
+    ) -> bool:
+        """Создаёт догрузку; False — такая уже идёт."""
+        job = await self.get_backfill(sub_id, chat_id)
+        if job is not None and job.status == BACKFILL_RUNNING:
+            return False
+        self.session.add(
+            BackfillJob(
+                subscription_id=sub_id,
+                chat_id=chat_id,
+                status=BACKFILL_RUNNING,
+                fetched=0,
+                queued=0,
+                max_posts=max_posts,
+                created_at=now,
+                updated_at=now,
+            )
+        )
+        await self.session.commit()
+        return True
+
+    async def get_running_backfills(
+        self,
+    ) -> list[tuple[int, int, int, str, Optional[int], int, int]]:
+        """Идущие догрузки: id, подписка, чат, тэги, курсор, счётчики."""
+        result = await self.session.execute(
+            select(
+                BackfillJob.id,
+                BackfillJob.subscription_id,
+                BackfillJob.chat_id,
+                Subscription.tags,
+                BackfillJob.cursor,
+                BackfillJob.fetched,
+                BackfillJob.max_posts,
+            )
+            .join(Subscription, Subscription.id == BackfillJob.subscription_id)
+            .where(BackfillJob.status == BACKFILL_RUNNING)
+            .order_by(BackfillJob.id)
+        )
+        return [tuple(row) for row in result.all()]
+
+    async def advance_backfill(
+        self,
+        job_id: int,
+        cursor: Optional[int],
+        fetched: int,
+        queued: int,
+        done: bool,
+        now: datetime,
+    ) -> bool:
+        """Сохраняет курсор и счётчики страницы; False — задачу отменили."""
+        values = {
+            "cursor": cursor,
+            "fetched": BackfillJob.fetched + fetched,
+            "queued": BackfillJob.queued + queued,
+            "updated_at": now,
+        }
+        if done:
+            values["status"] = BACKFILL_DONE
+        result = await self.session.execute(
+            update(BackfillJob)
+            .where(
+                BackfillJob.id == job_id,
+                BackfillJob.status == BACKFILL_RUNNING,
+            )
+            .values(**values)
+        )
+        await self.session.commit()
+        return bool(result.rowcount)
+
+    async def cancel_backfill(
+        self, sub_id: int, chat_id: int, now: datetime
+    ) -> bool:
+        result = await self.session.execute(
+            update(BackfillJob)
+            .where(
+                BackfillJob.subscription_id == sub_id,
+                BackfillJob.chat_id == chat_id,
+                BackfillJob.status == BACKFILL_RUNNING,
+            )
+            .values(status=BACKFILL_CANCELLED, updated_at=now)
+        )
+        await self.session.commit()
+        return bool(result.rowcount)
+
+
+def _group_by_value(items: dict[int, str]) -> dict[str, list[int]]:
+    groups: dict[str, list[int]] = {}
+    for key, value in items.items():
+        groups.setdefault(value, []).append(key)
+    return groups
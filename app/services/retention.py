@@ -0,0 +1,204 @@
+import asyncio
+import os
+import random
+import time
+from datetime import timedelta
+from statistics import median
+from typing import Awaitable, Callable, Optional
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+)
+
+from app.api.http_cache import HttpCache
+from app.models.base import utcnow
+from app.services.repository import Repo
+
+
+class RetentionService:
+    """Чистка outbox и обслуживание SQLite.
+
+    Записи outbox — история доставок, по которой идёт дедупликация.
+    Завершённые записи старше keep_sent_days дней удаляются, только
+    если пост ниже отметок всех подписок чата (опрос его больше не
+    вернёт) и не входит в keep_per_chat самых свежих записей чата — их
+    может снова принести догрузка истории. У оставшихся отправленных
+    записей очищается JSON поста.
+    Заодно из дискового кэша HTTP удаляются файлы старше
+    http_cache_days дней.
+    """
+
+    def __init__(
+        self,
+        session_pool: async_sessionmaker[AsyncSession],
+        engine: AsyncEngine,
+        notify: Callable[[str], Awaitable[None]],
+        batch_size: int = 5_000,
+        keep_sent_days: int = 7,
+        keep_per_chat: int = 1_000,
+        http_cache: Optional[HttpCache] = None,
+        http_cache_days: int = 2,
+    ):
+        self.session_pool = session_pool
+        self.engine = engine
+        self.notify = notify
+        self.batch_size = batch_size
+        self.keep_sent_days = keep_sent_days
+        self.keep_per_chat = keep_per_chat
+        self.http_cache = http_cache
+        self.http_cache_days = http_cache_days
+
+    def _db_size(self) -> Optional[int]:
+        """Размер файла БД вместе с WAL, в байтах."""
+        if self.engine.dialect.name != "sqlite":
+            return None
+        path = self.engine.url.database
+        if not path or path == ":memory:":
+            return None
+        return sum(
+            os.path.getsize(file)
+            for file in (path, f"{path}-wal")
+            if os.path.exists(file)
+        )
+
+    async def _lookup_latency(self, runs: int = 5, sample: int = 500) -> float:
+        """Медианное время проверки доставок, как при опросе, в мс.
+
+        Половина пар выборки — известные доставки, половина — те же
+        посты в чужих чатах, которых в outbox нет.
+        """
+        async with self.session_pool() as session:
+            repo = Repo(session)
+            known = await repo.get_recent_deliveries(sample * 10)
+            if not known:
+                return 0.0
+            timings = []
+            for _ in range(runs):
+                keys = random.sample(known, min(sample // 2, len(known)))
+                keys += [(-chat_id, post_id) for chat_id, post_id in keys]
+                started = time.perf_counter()
+                await repo.get_existing_deliveries(keys)
+                timings.append((time.perf_counter() - started) * 1000)
+        return median(timings)
+
+    async def compact_outbox(self) -> int:
+        """Очищает JSON давно отправленных записей outbox пачками.
+
+        Пары (chat_id, post_id) не удаляются: по ним идёт дедупликация.
+        """
+        before = utcnow() - timedelta(days=self.keep_sent_days)
+        compacted = 0
+        while True:
+            async with self.session_pool() as session:
+                count = await Repo(session).compact_sent_outbox(
+                    before, self.batch_size
+                )
+            compacted += count
+            if count < self.batch_size:
+                break
+            await asyncio.sleep(0)
+
+        logger.info(f"Retention: compacted {compacted} sent outbox items")
+        return compacted
+
+    async def _prune_floor(
+        self, repo: Repo, chat_id: int, watermarks: dict[int, int]
+    ) -> Optional[int]:
+        """Граница удаления для чата: post_id ниже неё можно забыть."""
+        floor = await repo.get_outbox_keep_floor(chat_id, self.keep_per_chat)
+        if floor is None:
+            return None
+        # Чат без подписок опрос больше не затронет
+        watermark = watermarks.get(chat_id)
+        return floor if watermark is None else min(floor, watermark)
+
+    async def prune_outbox(self) -> int:
+        """Удаляет пачками историю доставок, ненужную для дедупликации."""
+        before = utcnow() - timedelta(days=self.keep_sent_days)
+        async with self.session_pool() as session:
+            repo = Repo(session)
+            watermarks = await repo.get_chat_watermarks()
+            chats = await repo.get_outbox_chats()
+
+        deleted = 0
+        for chat_id in chats:
+            async with self.session_pool() as session:
+                below = await self._prune_floor(
+                    Repo(session), chat_id, watermarks
+                )
+            while below is not None:
+                async with self.session_pool() as session:
+                    count = await Repo(session).delete_outbox_history(
+                        chat_id, below, before, self.batch_size
+                    )
+                deleted += count
+                if count < self.batch_size:
+                    break
+                await asyncio.sleep(0)
+
+        logger.info(f"Retention: deleted {deleted} outbox items")
+        return deleted
+
+    async def _optimize(self) -> None:
+        if self.engine.dialect.name != "sqlite":
+            async with self.engine.begin() as conn:
+                await conn.execute(text("ANALYZE"))
+            return
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("ANALYZE"))
+            await conn.execute(text("VACUUM"))
+            await conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+
+    async def compact(self) -> None:
+        """Плановая чистка и сжатие БД с отчётом администратору."""
+        logger.info("Starting database compaction")
+        size_before = self._db_size()
+        latency_before = await self._lookup_latency()
+
+        try:
+            outbox_deleted = await self.prune_outbox()
+            outbox_compacted = await self.compact_outbox()
+            await self._optimize()
+            cache_removed = (
+                await self.http_cache.prune(self.http_cache_days * 86_400)
+                if self.http_cache is not None
+                else 0
+            )
+        except Exception as e:
+            logger.error(f"Compaction failed: {e}")
+            await self.notify(f"<b>Ошибка:</b> Обслуживание БД ({e})")
+            return
+
+        size_after = self._db_size()
+        latency_after = await self._lookup_latency()
+
+        lines = [
+            "<b>Обслуживание БД</b>",
+            f"Удалено записей outbox: {outbox_deleted}",
+            f"Очищено записей outbox: {outbox_compacted}",
+        ]
+        if cache_removed:
+            lines.append(f"Удалено файлов кэша HTTP: {cache_removed}")
+        if size_before is not None and size_after is not None:
+            reclaimed = max(size_before - size_after, 0)
+            lines.append(
+                f"Размер: {size_before / 1_000_000:.2f} → "
+                f"{size_after / 1_000_000:.2f} МБ "
+                f"(освобождено {reclaimed / 1_000_000:.2f} МБ)"
+            )
+        lines.append(
+            f"Поиск доставок: {latency_before:.2f} → {latency_after:.2f} мс"
+        )
+        logger.info(
+            f"Compaction done: outbox deleted {outbox_deleted}, "
+            f"compacted {outbox_compacted}, "
+            f"http cache {cache_removed}, "
+            f"size {size_before} -> {size_after} bytes, "
+            f"lookup {latency_before:.2f} -> {latency_after:.2f} ms"
+        )
+        await self.notify("\n".join(lines))
@@ -1,19 +1,50 @@
 from datetime import datetime
+from typing import Optional
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from pytz import timezone
+
+from app.models.base import utcnow
+from app.services.getter_cache import GLOBAL, GetterCache
+from app.services.poll_scheduler import PollScheduler
+
+POLL_JOB = "poll_subscriptions"
+# Время ближайшего опроса в меню может отставать не больше чем на минуту
+NEXT_POLL_TTL = 60
 
 
 class Schedules:
-    def __init__(self, scheduler: AsyncIOScheduler):
+    def __init__(
+        self,
+        scheduler: AsyncIOScheduler,
+        poll_scheduler: PollScheduler,
+        cache: Optional[GetterCache] = None,
+    ):
         self.scheduler = scheduler
+        self.poll_scheduler = poll_scheduler
+        self.cache = cache
 
     async def get_next_update_time(self) -> int:
-        """return minutes before next run"""
-        current_time = datetime.now(timezone("Europe/Moscow"))
-        next_run_time = self.scheduler.get_jobs()[0].next_run_time
-        return int((next_run_time - current_time).total_seconds() / 60)
+        """return minutes before next subscription poll"""
+        if self.cache is None:
+            next_poll_at = await self.poll_scheduler.next_poll_time()
+        else:
+            next_poll_at = await self.cache.get_or_load(
+                GLOBAL,
+                "next_poll",
+                self.poll_scheduler.next_poll_time,
+                NEXT_POLL_TTL,
+            )
+        if next_poll_at is None:
+            return 0
+        seconds = (next_poll_at - utcnow()).total_seconds()
+        return max(int(seconds / 60), 0)
 
     async def do_next_job_now(self) -> bool:
-        job = self.scheduler.get_jobs()[0]
-        job.modify(next_run_time=datetime.now())
+        await self.poll_scheduler.poll_all_now()
+        if self.cache is not None:
+            self.cache.invalidate(GLOBAL)
+        # В процессе без опроса подписки заберёт ближайший тик опросчика
+        job = self.scheduler.get_job(POLL_JOB)
+        if job is not None:
+            job.modify(next_run_time=datetime.now())
+        return True
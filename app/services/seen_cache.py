@@ -0,0 +1,50 @@
+from collections import OrderedDict
+from typing import Iterable
+
+# (chat_id, key) — пост, поставленный в отправку в чат
+DeliveryKey = tuple[int, int]
+
+
+class SeenPostCache:
+    """Ограниченное LRU-множество уже поставленных в отправку постов.
+
+    Хранит только подтверждённые пары (чат, пост), поэтому попадание в
+    кэш точно означает, что пост в этот чат уже уходил. Промах ничего
+    не гарантирует — такие пары проверяются по таблице outbox.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._keys: OrderedDict[DeliveryKey, None] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: DeliveryKey) -> bool:
+        return key in self._keys
+
+    def add(self, key: DeliveryKey) -> None:
+        if self.max_size <= 0:
+            return
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+        if len(self._keys) > self.max_size:
+            self._keys.popitem(last=False)
+
+    def update(self, keys: Iterable[DeliveryKey]) -> None:
+        for key in keys:
+            self.add(key)
+
+    def split(
+        self, keys: Iterable[DeliveryKey]
+    ) -> tuple[set[DeliveryKey], list[DeliveryKey]]:
+        """Делит пары на точно известные и те, что нужно проверить в БД."""
+        known: set[DeliveryKey] = set()
+        unknown: list[DeliveryKey] = []
+        for key in keys:
+            if key in self._keys:
+                self._keys.move_to_end(key)
+                known.add(key)
+            else:
+                unknown.append(key)
+        return known, unknown
@@ -0,0 +1,67 @@
+import json
+from typing import Iterable
+
+# Больше подписок за один импорт не принимаем
+MAX_IMPORT = 5_000
+MAX_QUERY_LENGTH = 255
+
+
+def normalize_query(query: str) -> str:
+    """Приводит запрос к каноническому виду.
+
+    Тэги Danbooru регистронезависимы, поэтому запрос переводится в
+    нижний регистр, лишние пробелы и повторы тэгов убираются. Порядок
+    тэгов сохраняется.
+    """
+    tags = dict.fromkeys(query.lower().split())
+    return " ".join(tags)
+
+
+def _document_queries(data: bytes) -> Iterable[str]:
+    text = data.decode("utf-8-sig", errors="replace")
+    try:
+        document = json.loads(text)
+    except ValueError:
+        # Обычный текст: запрос на строку, # — комментарий
+        return (
+            line
+            for line in text.splitlines()
+            if not line.lstrip().startswith("#")
+        )
+    if isinstance(document, dict):
+        document = document.get("subscriptions", [])
+    if not isinstance(document, list):
+        return []
+    return (
+        item.get("tags", "") if isinstance(item, dict) else item
+        for item in document
+        if isinstance(item, (str, dict))
+    )
+
+
+def parse_import(data: bytes) -> tuple[list[str], list[str]]:
+    """Разбирает документ импорта: текст или JSON.
+
+    JSON — список строк, список объектов с ключом tags или объект
+    {"subscriptions": [...]} из экспорта. Возвращает уникальные
+    нормализованные запросы и отклонённые строки.
+    """
+    queries: dict[str, None] = {}
+    rejected = []
+    for raw in _document_queries(data):
+        if not isinstance(raw, str):
+            continue
+        query = normalize_query(raw)
+        if not query:
+            continue
+        if len(query) > MAX_QUERY_LENGTH or len(queries) >= MAX_IMPORT:
+            rejected.append(raw.strip())
+            continue
+        queries[query] = None
+    return list(queries), rejected
+
+
+def export_document(queries: Iterable[str]) -> bytes:
+    """Текст экспорта: запрос на строку, читается обратно импортом."""
+    lines = ["# boorubot subscriptions", *queries]
+    return ("\n".join(lines) + "\n").encode()
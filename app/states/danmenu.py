@@ -6,3 +6,5 @@ class DanMenu(StatesGroup):
     sub_list = State()
     add = State()
     delete = State()
+    import_subs = State()
+    subscription = State()
@@ -9,7 +9,7 @@ from app.states.danmenu import DanMenu
 deleting_window = Window(
     Const("Подтвердить удаление?"),
     Row(
-        SwitchTo(Const("👈 Назад"), state=DanMenu.sub_list, id="back"),
+        SwitchTo(Const("👈 Назад"), state=DanMenu.subscription, id="back"),
         Button(
             Const("👍 Да, удаляем"),
             id="delete_sub",
@@ -0,0 +1,28 @@
+from aiogram.enums import ContentType, ParseMode
+from aiogram_dialog import Window
+from aiogram_dialog.widgets.input import MessageInput
+from aiogram_dialog.widgets.kbd import Checkbox, SwitchTo
+from aiogram_dialog.widgets.text import Const
+
+from app.handlers.subscribes import VALIDATE_ID, import_subscribes
+from app.states.danmenu import DanMenu
+
+import_window = Window(
+    Const("<b>📥 Отправьте файл .txt или .json со списком запросов</b>\n"),
+    Const(
+        "В тексте — один запрос на строку, строки с # пропускаются. "
+        "Список можно прислать и обычным сообщением."
+    ),
+    MessageInput(
+        import_subscribes,
+        content_types=[ContentType.TEXT, ContentType.DOCUMENT],
+    ),
+    Checkbox(
+        Const("✅ Проверять запросы на Danbooru"),
+        Const("⬜ Проверять запросы на Danbooru"),
+        id=VALIDATE_ID,
+    ),
+    SwitchTo(Const("👈 Назад"), id="back", state=DanMenu.sub_list),
+    state=DanMenu.import_subs,
+    parse_mode=ParseMode.HTML,
+)
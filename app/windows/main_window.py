@@ -40,6 +40,7 @@ main_window = Window(
             Const("📬 Проверить сейчас"),
             id="update_now",
             on_click=on_update_now,
+            when="is_admin",
         ),
     ),
     Row(
@@ -4,17 +4,24 @@ from aiogram_dialog import Window
 from aiogram_dialog.widgets.input import MessageInput
 from aiogram_dialog.widgets.kbd import (
     Button,
+    CurrentPage,
+    FirstPage,
+    Group,
+    LastPage,
+    NextPage,
+    PrevPage,
     Row,
-    ScrollingGroup,
     Select,
     Start,
+    StubScroll,
     SwitchTo,
 )
 from aiogram_dialog.widgets.text import Const, Format
 
 from app.callbacks.clear_filter import on_clear_filter
 from app.callbacks.delete_subscribe import on_select_sub
-from app.getters.subscribes_selector import get_subscribes
+from app.callbacks.export_subscribes import on_export_click
+from app.getters.subscribes_selector import SCROLL_ID, get_subscribes
 from app.handlers.subscribes import search_subscribes
 from app.states.danmenu import DanMenu
 
@@ -50,7 +57,7 @@ sublist_window = Window(
         when=~F["subscriptions"] & ~F["dialog_data"]["search_query"],
     ),
     MessageInput(search_subscribes, content_types=[ContentType.TEXT]),
-    ScrollingGroup(
+    Group(
         Select(
             Format("{item[1]}"),  # Текст кнопки — тег подписки
             items="subscriptions",  # Список кортежей (id, tag)
@@ -59,10 +66,18 @@ sublist_window = Window(
             on_click=on_select_sub,
         ),
         width=2,
-        height=10,
-        id="scrolling_tags",
         when="subscriptions",  # Показывать, если есть подписки
     ),
+    # Страницы листаются запросами к БД: геттер читает только текущую
+    StubScroll(id=SCROLL_ID, pages="pages"),
+    Row(
+        FirstPage(scroll=SCROLL_ID),
+        PrevPage(scroll=SCROLL_ID),
+        CurrentPage(scroll=SCROLL_ID),
+        NextPage(scroll=SCROLL_ID),
+        LastPage(scroll=SCROLL_ID),
+        when=F["pages"] > 1,
+    ),
     Button(
         Const("🧹 Очистить поисковый фильтр"),
         id="clear_filter",
@@ -81,6 +96,19 @@ sublist_window = Window(
             state=DanMenu.add,
         ),
     ),
+    Row(
+        SwitchTo(
+            Const("📥 Импорт"),
+            id="import_subs",
+            state=DanMenu.import_subs,
+        ),
+        Button(
+            Const("📤 Экспорт"),
+            id="export_subs",
+            on_click=on_export_click,
+            when="subscriptions",
+        ),
+    ),
     getter=get_subscribes,
     state=DanMenu.sub_list,
     parse_mode=ParseMode.HTML,
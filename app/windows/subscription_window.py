@@ -0,0 +1,45 @@
+from aiogram import F
+from aiogram.enums import ParseMode
+from aiogram_dialog import Window
+from aiogram_dialog.widgets.kbd import Button, Row, SwitchTo
+from aiogram_dialog.widgets.text import Const, Format
+
+from app.callbacks.backfill import on_backfill_cancel, on_backfill_start
+from app.getters.subscription import subscription_getter
+from app.states.danmenu import DanMenu
+
+subscription_window = Window(
+    Format("<b>🔖 {tags}</b>"),
+    Format(
+        "\n📜 История: {backfill_status}\n"
+        "Получено постов: {fetched} из {max_posts}, новых в отправке: "
+        "{queued}",
+        when="backfill_status",
+    ),
+    # Догрузка истории расходует общий лимит запросов — только админ
+    Button(
+        Const("📜 Загрузить историю"),
+        id="backfill_start",
+        on_click=on_backfill_start,
+        when=F["is_admin"] & ~F["backfill_running"],
+    ),
+    Row(
+        Button(
+            Const("⏹ Остановить загрузку"),
+            id="backfill_cancel",
+            on_click=on_backfill_cancel,
+        ),
+        # Нажатие просто перерисовывает окно со свежим прогрессом
+        Button(Const("🔄 Обновить"), id="backfill_refresh"),
+        when=F["is_admin"] & F["backfill_running"],
+    ),
+    Row(
+        SwitchTo(Const("👈 Назад"), id="back", state=DanMenu.sub_list),
+        SwitchTo(
+            Const("🗑 Удалить подписку"), id="delete", state=DanMenu.delete
+        ),
+    ),
+    getter=subscription_getter,
+    state=DanMenu.subscription,
+    parse_mode=ParseMode.HTML,
+)
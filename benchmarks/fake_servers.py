@@ -0,0 +1,201 @@
+"""Локальные заменители Danbooru и Telegram Bot API для бенчмарков.
+
+FakeDanbooru отвечает на /posts.json и /explore/posts/popular.json
+постами, тэги которых совпадают с запросом, с заданной задержкой и
+долей ответов 429 и 5xx. FakeTelegram принимает любые методы Bot API
+и отвечает правдоподобными сообщениями.
+"""
+
+import asyncio
+import random
+import time
+from collections import Counter
+from typing import Optional
+
+from aiohttp import web
+
+from benchmarks.parse_posts import make_post
+
+FAKE_TOKEN = "123456:BENCHMARK-fake-token"
+
+
+async def _start(app: web.Application) -> tuple[web.AppRunner, str]:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+
+class FakeDanbooru:
+    """Danbooru, на каждый запрос отдающий несколько новых постов.
+
+    Посты для пары (запрос, страница) создаются один раз, поэтому
+    повтор после 429 или 5xx получает тот же ответ. Id новых постов
+    начинаются с first_id и только растут, как на настоящем сервере.
+    """
+
+    def __init__(
+        self,
+        first_id: int,
+        new_posts: int = 2,
+        latency: float = 0.02,
+        rate_limited: float = 0.0,
+        server_errors: float = 0.0,
+        retry_after: float = 1.0,
+        seed: int = 42,
+    ):
+        self.new_posts = new_posts
+        self.latency = latency
+        self.rate_limited = rate_limited
+        self.server_errors = server_errors
+        self.retry_after = retry_after
+        self.responses: Counter[int] = Counter()
+        self.url = ""
+        self._next_id = first_id
+        self._pages: dict[tuple[str, str], list[dict]] = {}
+        self._random = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def requests(self) -> int:
+        return sum(self.responses.values())
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get("/posts.json", self._posts)
+        app.router.add_get("/explore/posts/popular.json", self._popular)
+        self._runner, self.url = await _start(app)
+        return self.url
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def _make_post(self, tags: list[str]) -> dict:
+        post = make_post(self._next_id)
+        self._next_id += 1
+        # Небольшой файл: отправка по ссылке, без загрузки и сжатия
+        post.update(
+            tag_string=" ".join(tags + post["tag_string"].split()[:20]),
+            rating="g",
+            file_size=500_000,
+        )
+        return post
+
+    def _generate(self, query: str, count: int) -> list[dict]:
+        """Посты, подходящие под запрос: обычные тэги и одна из ~альтернатив."""
+        words = query.split()
+        alternatives = [word[1:] for word in words if word.startswith("~")]
+        required = [
+            word
+            for word in words
+            if word[0] not in "~-" and ":" not in word and "*" not in word
+        ]
+        posts = []
+        for i in range(count):
+            tags = list(required)
+            if alternatives:
+                tags.append(alternatives[i % len(alternatives)])
+            posts.append(self._make_post(tags))
+        posts.reverse()
+        return posts
+
+    async def _respond(self, posts_for) -> web.Response:
+        await asyncio.sleep(self.latency)
+        roll = self._random.random()
+        if roll < self.rate_limited:
+            self.responses[429] += 1
+            return web.Response(
+                status=429, headers={"Retry-After": f"{self.retry_after:g}"}
+            )
+        if roll < self.rate_limited + self.server_errors:
+            self.responses[503] += 1
+            return web.Response(status=503)
+        self.responses[200] += 1
+        return web.json_response(posts_for())
+
+    async def _posts(self, request: web.Request) -> web.Response:
+        query = request.query.get("tags", "")
+        limit = int(request.query.get("limit", 20))
+        page = request.query.get("page", "")
+
+        def posts_for() -> list[dict]:
+            if page.startswith("b"):
+                # Догрузку истории бенчмарк не измеряет
+                return []
+            key = (query, page)
+            if key not in self._pages:
+                self._pages[key] = self._generate(
+                    query, min(self.new_posts, limit)
+                )
+            return self._pages[key]
+
+        return await self._respond(posts_for)
+
+    async def _popular(self, request: web.Request) -> web.Response:
+        limit = int(request.query.get("limit", 20))
+        return await self._respond(lambda: self._generate("", limit))
+
+
+class FakeTelegram:
+    """Bot API, мгновенно принимающий любые отправки."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self.url = ""
+        self._message_id = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._method)
+        self._runner, self.url = await _start(app)
+        return self.url
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def _message(self, chat_id: int, media_type: Optional[str]) -> dict:
+        self._message_id += 1
+        message = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+        }
+        file = {
+            "file_id": f"file-{self._message_id}",
+            "file_unique_id": f"unique-{self._message_id}",
+            "width": 720,
+            "height": 720,
+        }
+        if media_type == "photo":
+            message["photo"] = [file]
+        elif media_type in ("video", "animation"):
+            message[media_type] = {**file, "duration": 1}
+        else:
+            message["text"] = "ok"
+        return message
+
+    async def _method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        data = await request.post()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        chat_id = int(data.get("chat_id", 0))
+
+        if method == "sendMediaGroup":
+            result = [
+                self._message(chat_id, "photo")
+                for _ in range(str(data.get("media", "")).count('"type"'))
+            ]
+        elif method.startswith("send"):
+            media_type = method.removeprefix("send").lower()
+            result = self._message(chat_id, media_type)
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
@@ -0,0 +1,121 @@
+"""Сравнение полного и ленивого разбора ответа posts.json.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.parse_posts
+"""
+
+import json
+import random
+import timeit
+
+from app.api.danbooru_client import DanbooruAPI, json_loads
+from app.models.danbooru import DanbooruPost
+
+POSTS = 200
+# Доля постов, уже известных по прошлым опросам
+SEEN_SHARE = 0.95
+ROUNDS = 200
+
+
+def make_post(post_id: int) -> dict:
+    """Пост с набором полей, близким к реальному ответу Danbooru."""
+    tags = " ".join(f"tag_{random.randint(0, 50_000)}" for _ in range(40))
+    variants = [
+        {
+            "type": name,
+            "url": f"https://cdn.donmai.us/{name}/{post_id}.jpg",
+            "width": 180 * (i + 1),
+            "height": 240 * (i + 1),
+            "file_ext": "jpg",
+        }
+        for i, name in enumerate(("180x180", "360x360", "720x720", "sample"))
+    ]
+    return {
+        "id": post_id,
+        "created_at": "2025-01-01T00:00:00.000-05:00",
+        "uploader_id": random.randint(1, 10**6),
+        "score": random.randint(0, 500),
+        "source": f"https://example.com/{post_id}",
+        "md5": f"{post_id:032x}",
+        "last_comment_bumped_at": None,
+        "rating": random.choice("gsqe"),
+        "image_width": 2000,
+        "image_height": 3000,
+        "tag_string": tags,
+        "fav_count": random.randint(0, 1000),
+        "file_ext": "jpg",
+        "last_noted_at": None,
+        "parent_id": None,
+        "has_children": False,
+        "approver_id": None,
+        "tag_count_general": 35,
+        "tag_count_artist": 1,
+        "tag_count_character": 2,
+        "tag_count_copyright": 1,
+        "file_size": random.randint(100_000, 5_000_000),
+        "up_score": 10,
+        "down_score": 0,
+        "is_pending": False,
+        "is_flagged": False,
+        "is_deleted": False,
+        "tag_count": 40,
+        "updated_at": "2025-01-01T00:00:00.000-05:00",
+        "is_banned": False,
+        "pixiv_id": None,
+        "last_commented_at": None,
+        "has_active_children": False,
+        "bit_flags": 0,
+        "tag_count_meta": 1,
+        "has_large": True,
+        "has_visible_children": False,
+        "media_asset": {"id": post_id, "variants": variants},
+        "tag_string_general": tags,
+        "tag_string_character": "character_a character_b",
+        "tag_string_copyright": "copyright_a",
+        "tag_string_artist": "artist_a",
+        "tag_string_meta": "highres",
+        "file_url": f"https://cdn.donmai.us/original/{post_id}.jpg",
+        "large_file_url": f"https://cdn.donmai.us/sample/{post_id}.jpg",
+        "preview_file_url": f"https://cdn.donmai.us/180x180/{post_id}.jpg",
+    }
+
+
+def full_path(payload: bytes, seen: set[int]) -> list[DanbooruPost]:
+    """Прежний путь: модель для каждого поста, затем дедупликация."""
+    posts = [DanbooruPost(**post) for post in json.loads(payload)]
+    return [post for post in posts if post.id not in seen]
+
+
+def lazy_path(payload: bytes, seen: set[int]) -> list[DanbooruPost]:
+    """Новый путь: дедупликация по id, модели только для новых."""
+    raw_posts = DanbooruAPI._raw_posts(json_loads(payload))
+    fresh = [post for post in raw_posts if post["id"] not in seen]
+    return DanbooruAPI.build_posts(fresh)
+
+
+def main() -> None:
+    random.seed(42)
+    posts = [make_post(post_id) for post_id in range(1, POSTS + 1)]
+    payload = json.dumps(posts).encode()
+    seen = set(random.sample(range(1, POSTS + 1), int(POSTS * SEEN_SHARE)))
+
+    assert [p.id for p in full_path(payload, seen)] == [
+        p.id for p in lazy_path(payload, seen)
+    ]
+
+    print(
+        f"{POSTS} posts, {len(payload) / 1024:.0f} KiB, "
+        f"{SEEN_SHARE:.0%} already seen, decoder: {json_loads.__module__}"
+    )
+    results = {}
+    for name, func in (("full", full_path), ("lazy", lazy_path)):
+        timer = timeit.Timer(lambda: func(payload, seen))
+        best = min(timer.repeat(repeat=5, number=ROUNDS)) / ROUNDS
+        results[name] = best
+        print(f"{name:>5}: {best * 1000:.3f} ms per response")
+    print(f"speedup: {results['full'] / results['lazy']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Полный опрос подписок против локальных Danbooru и Telegram.
+
+Для каждого числа подписок прогоняет DanbooruService.check_new_posts
+на копии БД с STORED_POSTS уже доставленными постами, затем отдельно
+рассылку outbox. Danbooru и Bot API подменены серверами из
+benchmarks.fake_servers, поэтому замер не зависит от сети и лимитов
+настоящих сервисов.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.sweep
+    python -m benchmarks.sweep --subs 10 1000 --posts 100000 \\
+        --latency 0.05 --rate-limited 0.02 --server-errors 0.01
+
+Пиковый RSS — максимум процесса с начала запуска, поэтому сценарии
+идут по возрастанию числа подписок. Время БД — сумма длительностей
+запросов из метрик; параллельные сессии могут дать больше wall time.
+"""
+
+import argparse
+import asyncio
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from loguru import logger
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.api.priority_limiter import PriorityRateLimiter
+from app.database import create_engine
+from app.metrics import DB_QUERY_SECONDS
+from app.models.outbox import OUTBOX_PENDING
+from app.models.subscribers import Subscriber
+from app.models.subscriptions import Subscription
+from app.services.danbooru import DanbooruService
+from app.services.delivery import DeliveryQueue
+from app.services.repository import Repo
+from benchmarks.dedupe_insert import seed
+from benchmarks.fake_servers import FAKE_TOKEN, FakeDanbooru, FakeTelegram
+
+STORED_POSTS = 1_000_000
+SUBSCRIPTIONS = (10, 1_000, 10_000)
+CHATS = 100
+ADMIN_ID = 1
+# Доля подписок со сложным запросом, которые не упаковываются в OR
+COMPLEX_SHARE = 0.1
+SEED_CHUNK = 5_000
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux считает в KiB, macOS — в байтах
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def db_seconds() -> float:
+    return DB_QUERY_SECONDS.merged().sum
+
+
+async def seed_subscriptions(engine, count: int, stored: int) -> None:
+    """Подписки с отметками среди уже сохранённых постов."""
+    rng = random.Random(count)
+    for start in range(1, count + 1, SEED_CHUNK):
+        ids = range(start, min(start + SEED_CHUNK, count + 1))
+        subs = []
+        for sub_id in ids:
+            tags = f"tag_{sub_id}"
+            if rng.random() < COMPLEX_SHARE:
+                tags += " rating:g"
+            subs.append(
+                {
+                    "id": sub_id,
+                    "tags": tags,
+                    "last_post_id": stored - rng.randrange(1_000),
+                }
+            )
+        async with engine.begin() as conn:
+            await conn.execute(insert(Subscription), subs)
+            await conn.execute(
+                insert(Subscriber),
+                [
+                    {"subscription_id": sub_id, "chat_id": 1 + sub_id % CHATS}
+                    for sub_id in ids
+                ],
+            )
+
+
+def make_service(
+    session_pool: async_sessionmaker, bot: Bot, url: str, args
+) -> DanbooruService:
+    service = DanbooruService(
+        session_pool,
+        bot,
+        ADMIN_ID,
+        delivery=DeliveryQueue(
+            global_rate=args.telegram_rate,
+            chat_rate=args.telegram_rate,
+            group_rate=args.telegram_rate,
+        ),
+        deliver_after_poll=False,
+        danbooru_url=url,
+        sweep_concurrency=args.concurrency,
+        sweep_batch_size=args.batch_size,
+    )
+    # Бюджет запросов настоящего Danbooru сделал бы замер замером лимита
+    service.api.rate_limiter = PriorityRateLimiter(
+        max_calls=args.danbooru_rate, period=1
+    )
+    return service
+
+
+async def run_scenario(
+    template: Path, workdir: Path, subs_count: int, args
+) -> None:
+    path = workdir / f"sweep_{subs_count}.sqlite"
+    shutil.copyfile(template, path)
+    engine = create_engine(f"sqlite+aiosqlite:///{path}")
+    await seed_subscriptions(engine, subs_count, args.posts)
+    session_pool = async_sessionmaker(
+        engine, expire_on_commit=False, autoflush=False
+    )
+
+    danbooru = FakeDanbooru(
+        first_id=args.posts + 1,
+        new_posts=args.new_posts,
+        latency=args.latency,
+        rate_limited=args.rate_limited,
+        server_errors=args.server_errors,
+        retry_after=args.retry_after,
+    )
+    telegram = FakeTelegram()
+    await danbooru.start()
+    await telegram.start()
+    bot = Bot(
+        FAKE_TOKEN,
+        session=AiohttpSession(api=TelegramAPIServer.from_base(telegram.url)),
+    )
+    service = make_service(session_pool, bot, danbooru.url, args)
+    try:
+        await service.warm_up()
+        async with session_pool() as session:
+            subs = await Repo(session).get_subscriptions_for_polling()
+
+        db_before = db_seconds()
+        started = time.perf_counter()
+        arrivals = await service.check_new_posts(subs)
+        sweep_time = time.perf_counter() - started
+        sweep_db = db_seconds() - db_before
+        async with session_pool() as session:
+            outbox = await Repo(session).count_outbox()
+        queued = outbox.get(OUTBOX_PENDING, 0)
+
+        db_before = db_seconds()
+        started = time.perf_counter()
+        sent = await service.drain_outbox()
+        deliver_time = time.perf_counter() - started
+        deliver_db = db_seconds() - db_before
+
+        statuses = ", ".join(
+            f"{status}: {count}"
+            for status, count in sorted(danbooru.responses.items())
+        )
+        print(
+            f"{subs_count} subs: sweep {sweep_time:.2f}s "
+            f"(db {sweep_db:.2f}s), {danbooru.requests} requests "
+            f"[{statuses}], {len(arrivals)} subs polled, "
+            f"{queued} queued; "
+            f"delivery {deliver_time:.2f}s (db {deliver_db:.2f}s), "
+            f"{sent} sent, {sum(telegram.calls.values())} Bot API calls; "
+            f"peak RSS {peak_rss_mb():.0f} MB"
+        )
+    finally:
+        await service.close()
+        await bot.session.close()
+        await danbooru.close()
+        await telegram.close()
+        await engine.dispose()
+        path.unlink()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--subs", type=int, nargs="+", default=list(SUBSCRIPTIONS)
+    )
+    parser.add_argument("--posts", type=int, default=STORED_POSTS)
+    parser.add_argument(
+        "--new-posts",
+        type=int,
+        default=2,
+        help="новых постов в ответе на каждый запрос",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="задержка Danbooru, с"
+    )
+    parser.add_argument(
+        "--rate-limited", type=float, default=0.01, help="доля ответов 429"
+    )
+    parser.add_argument(
+        "--server-errors", type=float, default=0.01, help="доля ответов 503"
+    )
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="запросов опроса сразу"
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=500, help="постов в пакете БД"
+    )
+    parser.add_argument("--danbooru-rate", type=int, default=1_000)
+    parser.add_argument("--telegram-rate", type=int, default=1_000)
+    args = parser.parse_args()
+
+    # Логи опроса на каждый запрос исказили бы замер
+    logger.disable("app")
+    print(
+        f"{args.posts} stored posts, {args.new_posts} new per query, "
+        f"latency {args.latency * 1000:.0f} ms, "
+        f"{args.rate_limited:.0%} 429, {args.server_errors:.0%} 5xx"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        template = workdir / "template.sqlite"
+        engine = create_engine(f"sqlite+aiosqlite:///{template}")
+        started = time.perf_counter()
+        await seed(engine, args.posts)
+        # Закрытие последнего соединения переносит WAL в файл БД
+        await engine.dispose()
+        elapsed = time.perf_counter() - started
+        print(f"seeded {args.posts} posts in {elapsed:.1f}s")
+        for subs_count in sorted(args.subs):
+            await run_scenario(template, workdir, subs_count, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
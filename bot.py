@@ -1,38 +1,69 @@
 import asyncio
 import os
+import socket
+from datetime import datetime
 
 from aiogram import Bot, Dispatcher
-from aiogram.filters import CommandStart
+from aiogram.filters import Command, CommandStart
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.methods import DeleteWebhook
 from aiogram_dialog import setup_dialogs
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from dotenv import load_dotenv
 from loguru import logger
-from sqlalchemy.ext.asyncio import (
-    AsyncEngine,
-    async_sessionmaker,
-    create_async_engine,
-)
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
 
+from app.api.danbooru_client import DANBOORU_URL
 from app.commands import set_default_commands
 from app.config import logger_setup
+from app.database import DEFAULT_DATABASE_URL, create_engine
 from app.dialogs.main_dialog import dialog
-from app.filters.is_admin import AdminFilter
+from app.filters.is_allowed import AllowedFilter
+from app.handlers.filters import filter_command
 from app.handlers.start import start
+from app.handlers.stats import stats_command
+from app.metrics import CIRCUIT_OPEN, LIMITER_WAITING, start_metrics_server
+from app.middlewares.backfill import BackfillMiddleware
 from app.middlewares.danbooru import DanbooruMiddleware
 from app.middlewares.repo import RepoMiddleware
 from app.middlewares.scheduler import SchedulerMiddleware
-from app.models.base import Base
+from app.middlewares.telegram_metrics import TelegramMetricsMiddleware
+from app.models.base import Base, add_missing_columns
+from app.models.outbox import migrate_legacy_posts
+from app.models.subscriptions import create_search_index
+from app.services.backfill import BackfillService
 from app.services.danbooru import DanbooruService
+from app.services.delivery import DeliveryQueue
+from app.services.getter_cache import GetterCache
+from app.services.leases import Leases
+from app.services.poll_scheduler import PollScheduler
+from app.services.repository import Repo
+from app.services.retention import RetentionService
+from app.services.schedules import POLL_JOB
 
 load_dotenv()
 
+RUN_MODES = {"ui", "poller", "sender"}
 
-async def create_schema(engine: AsyncEngine):
+
+def parse_run_mode(value: str) -> set[str]:
+    """RUN_MODE: all или список ролей процесса через запятую."""
+    if value.strip() in ("", "all"):
+        return set(RUN_MODES)
+    modes = {mode.strip() for mode in value.split(",") if mode.strip()}
+    unknown = modes - RUN_MODES
+    if unknown:
+        raise ValueError(f"Unknown run mode: {', '.join(sorted(unknown))}")
+    return modes
+
+
+async def create_schema(engine: AsyncEngine, admin_id: int):
     try:
         async with engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(add_missing_columns)
+            await conn.run_sync(migrate_legacy_posts, admin_id)
+            await conn.run_sync(create_search_index)
     except Exception as e:
         logger.error(e)
 
@@ -47,39 +78,176 @@ async def main():
     if not admin_id:
         logger.error("Не найден id администратора!")
         exit()
+    admin_user_id = int(admin_id)
+    allowed_users = os.getenv("ALLOWED_USERS", "").strip()
+    if allowed_users == "*":
+        allowed_ids = None
+    else:
+        allowed_ids = {
+            int(user_id) for user_id in allowed_users.split(",") if user_id
+        } | {admin_user_id}
 
-    url = "sqlite+aiosqlite:///database/db.sqlite"
-    engine = create_async_engine(url, echo=False, future=True)
-    await create_schema(engine)
+    modes = parse_run_mode(os.getenv("RUN_MODE", "all"))
+    worker_id = os.getenv("WORKER_ID") or (
+        f"{socket.gethostname()}-{os.getpid()}"
+    )
+
+    engine = create_engine(
+        os.getenv("DATABASE_URL") or DEFAULT_DATABASE_URL,
+        pool_size=int(os.getenv("DB_POOL_SIZE", 5)),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        sqlite_cache_mb=int(os.getenv("SQLITE_CACHE_MB", 64)),
+        sqlite_mmap_mb=int(os.getenv("SQLITE_MMAP_MB", 256)),
+    )
+    await create_schema(engine, admin_user_id)
     session_pool = async_sessionmaker(
         engine, expire_on_commit=False, autoflush=False
     )
+    async with session_pool() as session:
+        # Подписки из однопользовательской версии достаются администратору
+        adopted = await Repo(session).adopt_orphan_subscriptions(admin_user_id)
+    if adopted:
+        logger.info(f"Assigned {adopted} subscriptions to admin")
     storage = MemoryStorage()
     bot = Bot(token=bot_token)
+    bot.session.middleware(TelegramMetricsMiddleware())
     dp = Dispatcher(storage=storage)
-    danbooru = DanbooruService(session_pool, bot, admin_id)
+    danbooru = DanbooruService(
+        session_pool,
+        bot,
+        admin_user_id,
+        tag_limit=int(os.getenv("DANBOORU_TAG_LIMIT", 2)),
+        seen_cache_size=int(os.getenv("SEEN_CACHE_SIZE", 100_000)),
+        delivery=DeliveryQueue(
+            workers=int(os.getenv("DELIVERY_WORKERS", 4)),
+            global_rate=int(os.getenv("TELEGRAM_GLOBAL_RATE", 30)),
+            chat_rate=int(os.getenv("TELEGRAM_CHAT_RATE", 1)),
+            group_rate=int(os.getenv("TELEGRAM_GROUP_RATE", 20)),
+        ),
+        album_mode=os.getenv("DELIVERY_MODE", "single") == "album",
+        media_max_download=int(os.getenv("MEDIA_MAX_DOWNLOAD", 50_000_000)),
+        media_concurrency=int(os.getenv("MEDIA_CONCURRENCY", 2)),
+        http_cache_dir=os.getenv("HTTP_CACHE_DIR") or None,
+        outbox_batch_size=int(os.getenv("OUTBOX_BATCH_SIZE", 50)),
+        outbox_max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", 5)),
+        outbox_lease=int(os.getenv("OUTBOX_LEASE_SECONDS", 300)),
+        worker_id=worker_id,
+        deliver_after_poll="sender" in modes,
+        danbooru_url=os.getenv("DANBOORU_URL") or DANBOORU_URL,
+        sweep_concurrency=int(os.getenv("SWEEP_CONCURRENCY", 8)),
+        sweep_batch_size=int(os.getenv("SWEEP_BATCH_SIZE", 500)),
+    )
+    if "poller" in modes:
+        await danbooru.warm_up()
+    LIMITER_WAITING.set_function(danbooru.api.rate_limiter.waiting)
+    CIRCUIT_OPEN.set_function(lambda: not danbooru.api.breaker.closed)
+    metrics_port = int(os.getenv("METRICS_PORT") or 0)
+    metrics_runner = (
+        await start_metrics_server(metrics_port) if metrics_port else None
+    )
+    retention = RetentionService(
+        session_pool,
+        engine,
+        danbooru._notify_admin,
+        batch_size=int(os.getenv("RETENTION_BATCH_SIZE", 5_000)),
+        keep_sent_days=int(os.getenv("OUTBOX_KEEP_DAYS", 7)),
+        keep_per_chat=int(os.getenv("OUTBOX_KEEP_PER_CHAT", 1_000)),
+        http_cache=danbooru.api.cache,
+        http_cache_days=int(os.getenv("HTTP_CACHE_KEEP_DAYS", 2)),
+    )
+    poll_scheduler = PollScheduler(
+        session_pool,
+        danbooru,
+        min_interval=int(os.getenv("POLL_MIN_MINUTES", 15)) * 60,
+        max_interval=int(os.getenv("POLL_MAX_MINUTES", 360)) * 60,
+        batch_size=int(os.getenv("POLL_BATCH_SIZE", 100)),
+        worker_id=worker_id,
+    )
+    backfill = BackfillService(
+        session_pool,
+        danbooru,
+        page_size=int(os.getenv("BACKFILL_PAGE_SIZE", 100)),
+        max_posts=int(os.getenv("BACKFILL_MAX_POSTS", 1000)),
+    )
+    leases = Leases(session_pool, worker_id)
     scheduler = AsyncIOScheduler()
-    await set_default_commands(bot)
-
-    dp.include_router(dialog)
-    setup_dialogs(dp)
-    dp.update.middleware(RepoMiddleware(session_pool))
-    dp.update.outer_middleware(DanbooruMiddleware(danbooru_service=danbooru))
-    dp.update.outer_middleware(SchedulerMiddleware(scheduler))
-    dp.message.register(start, CommandStart(), AdminFilter(int(admin_id)))
 
     logger_setup()
 
-    scheduler.add_job(
-        danbooru.check_new_posts, "interval", hours=1, max_instances=1
-    )
+    if "poller" in modes:
+        scheduler.add_job(
+            poll_scheduler.tick,
+            "interval",
+            minutes=1,
+            max_instances=1,
+            coalesce=True,
+            id=POLL_JOB,
+        )
+        # Обслуживание БД выполняет только один из опросчиков
+        scheduler.add_job(
+            leases.exclusive("compaction", retention.compact),
+            "cron",
+            hour=int(os.getenv("COMPACTION_HOUR", 4)),
+            max_instances=1,
+            id="compaction",
+        )
+        # Аренда короткая: запуск догрузки ограничен run_budget, и при
+        # падении держателя задачи быстро подхватит другой опросчик
+        scheduler.add_job(
+            Leases(session_pool, worker_id, ttl=5 * 60).exclusive(
+                "backfill", backfill.run
+            ),
+            "interval",
+            minutes=1,
+            max_instances=1,
+            coalesce=True,
+            id="backfill",
+        )
+    if "sender" in modes:
+        # Первый запуск сразу: досылает то, что не ушло до перезапуска
+        scheduler.add_job(
+            danbooru.drain_outbox,
+            "interval",
+            seconds=int(os.getenv("OUTBOX_INTERVAL_SECONDS", 30)),
+            max_instances=1,
+            coalesce=True,
+            next_run_time=datetime.now(),
+            id="outbox",
+        )
     scheduler.start()
 
-    logger.debug("boorubot 👻 запущен!")
-    await bot(DeleteWebhook(drop_pending_updates=True))
+    logger.debug(f"boorubot 👻 запущен: {', '.join(sorted(modes))}")
 
     try:
-        await dp.start_polling(bot)
+        if "ui" in modes:
+            await set_default_commands(bot)
+            dp.include_router(dialog)
+            setup_dialogs(dp)
+            getter_cache = GetterCache(
+                ttl=int(os.getenv("GETTER_CACHE_TTL", 300))
+            )
+            dp.update.middleware(RepoMiddleware(session_pool, getter_cache))
+            dp.update.outer_middleware(
+                DanbooruMiddleware(danbooru_service=danbooru)
+            )
+            dp.update.outer_middleware(BackfillMiddleware(backfill))
+            dp.update.outer_middleware(
+                SchedulerMiddleware(scheduler, poll_scheduler, getter_cache)
+            )
+            dp.message.register(
+                start, CommandStart(), AllowedFilter(allowed_ids)
+            )
+            dp.message.register(
+                filter_command, Command("filter"), AllowedFilter(allowed_ids)
+            )
+            dp.message.register(
+                stats_command, Command("stats"), AllowedFilter(allowed_ids)
+            )
+            await bot(DeleteWebhook(drop_pending_updates=True))
+            await dp.start_polling(bot)
+        else:
+            # Фоновые роли работают только через планировщик
+            await asyncio.Event().wait()
     except asyncio.CancelledError:
         pass
     except Exception as e:
@@ -87,6 +255,8 @@ async def main():
     finally:
         if scheduler.running:
             scheduler.shutdown(wait=False)
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
         await danbooru.close()
         await bot.session.close()
         logger.info("Бот остановлен, ресурсы освобождены")
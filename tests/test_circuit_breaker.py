@@ -0,0 +1,96 @@
+import pytest
+
+from app.api import circuit_breaker
+from app.api.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitState,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+def _open(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_opens_after_threshold_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    # Успех сбрасывает счётчик: сбоев подряд пока два
+    assert breaker.closed
+
+    breaker.record_failure()
+
+    assert breaker.state is CircuitState.OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_in == 60
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    _open(breaker)
+
+    clock.now += 60
+    breaker.before_call()
+
+    assert breaker.state is CircuitState.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+
+    assert breaker.closed
+    breaker.before_call()
+
+
+def test_failed_probe_reopens_with_doubled_timeout(clock):
+    breaker = CircuitBreaker(
+        failure_threshold=1, reset_timeout=60, max_reset_timeout=100
+    )
+    _open(breaker)
+
+    clock.now += 60
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state is CircuitState.OPEN
+    assert breaker.retry_in == 100
+
+    clock.now += 100
+    breaker.before_call()
+    breaker.record_success()
+    _open(breaker)
+    # После восстановления таймаут снова исходный
+    assert breaker.retry_in == 60
+
+
+def test_released_probe_frees_the_slot(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    _open(breaker)
+    clock.now += 60
+    breaker.before_call()
+
+    breaker.release()
+
+    assert breaker.state is CircuitState.HALF_OPEN
+    breaker.before_call()
@@ -0,0 +1,64 @@
+from app.models.filter_rules import RULE_EXCLUDE, RULE_INCLUDE, RULE_RATING
+from app.services.content_filter import FilterEngine
+
+CHAT_ID = 5
+OTHER_CHAT = 7
+SUB_ID = 1
+
+
+def _engine(*rules) -> FilterEngine:
+    engine = FilterEngine()
+    engine.compile(rules)
+    return engine
+
+
+def test_no_rules_allow_everything():
+    engine = _engine()
+
+    assert not engine
+    assert engine.verdict("tag_a", "e").allows(CHAT_ID, SUB_ID)
+
+
+def test_global_exclude_applies_to_every_chat():
+    engine = _engine((None, None, RULE_EXCLUDE, "gore"))
+
+    assert not engine.verdict("tag_a gore", "g").allows(CHAT_ID)
+    assert not engine.verdict("gore", "g").allows(OTHER_CHAT, SUB_ID)
+    assert engine.verdict("tag_a", "g").allows(CHAT_ID)
+
+
+def test_chat_and_subscription_rules_stay_in_their_scope():
+    engine = _engine(
+        (CHAT_ID, None, RULE_EXCLUDE, "tag_b"),
+        (CHAT_ID, SUB_ID, RULE_INCLUDE, "solo"),
+        (CHAT_ID, SUB_ID, RULE_INCLUDE, "tag_a"),
+    )
+
+    assert not engine.verdict("tag_a tag_b solo", "g").allows(CHAT_ID)
+    assert engine.verdict("tag_a tag_b solo", "g").allows(OTHER_CHAT)
+    # Обязательны все тэги include, но только в своей подписке
+    assert not engine.verdict("tag_a", "g").allows(CHAT_ID, SUB_ID)
+    assert engine.verdict("tag_a solo", "g").allows(CHAT_ID, SUB_ID)
+    assert engine.verdict("tag_a", "g").allows(CHAT_ID, 2)
+
+
+def test_rating_rules_are_merged():
+    engine = _engine(
+        (CHAT_ID, None, RULE_RATING, "g"),
+        (CHAT_ID, None, RULE_RATING, "sx"),
+    )
+
+    assert engine.verdict("tag_a", "g").allows(CHAT_ID)
+    assert engine.verdict("tag_a", "s").allows(CHAT_ID)
+    assert not engine.verdict("tag_a", "e").allows(CHAT_ID)
+    assert not engine.verdict("tag_a", None).allows(CHAT_ID)
+
+
+def test_recompile_replaces_rules():
+    engine = _engine((None, None, RULE_EXCLUDE, "tag_a"))
+
+    engine.compile([(None, None, RULE_EXCLUDE, "tag_b")], fingerprint=(1,))
+
+    assert engine.verdict("tag_a", "g").allows(CHAT_ID)
+    assert not engine.verdict("tag_b", "g").allows(CHAT_ID)
+    assert engine.fingerprint == (1,)
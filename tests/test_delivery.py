@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from app.services.delivery import DeliveryQueue
+
+
+async def _send_ok():
+    return "ok"
+
+
+def _flood_wait(chat_id: int, retry_after: int) -> TelegramRetryAfter:
+    return TelegramRetryAfter(
+        method=SendMessage(chat_id=chat_id, text="test"),
+        message="Too Many Requests",
+        retry_after=retry_after,
+    )
+
+
+async def _deliver_after_flood_wait() -> tuple[list[int], DeliveryQueue]:
+    queue = DeliveryQueue(workers=1, global_rate=1_000, chat_rate=1_000)
+    delivered = []
+
+    async def send_flooded():
+        delivered.append(1)
+        if delivered.count(1) == 1:
+            raise _flood_wait(1, 1)
+
+    async def send_other():
+        delivered.append(2)
+
+    try:
+        first = await queue.submit(1, send_flooded)
+        second = await queue.submit(2, send_other)
+        await asyncio.wait_for(second, timeout=0.5)
+        # Пока чат 1 на паузе, его отправка ждёт вне очереди
+        assert queue.depth == 1
+        await asyncio.wait_for(first, timeout=3)
+        return delivered, queue
+    finally:
+        await queue.close()
+
+
+async def _give_up_after_retries() -> DeliveryQueue:
+    queue = DeliveryQueue(workers=1, max_retries=1)
+
+    async def send():
+        raise _flood_wait(1, 30)
+
+    try:
+        with pytest.raises(RuntimeError, match="Gave up"):
+            await (await queue.submit(1, send))
+        return queue
+    finally:
+        await queue.close()
+
+
+def test_retry_after_defers_chat_without_blocking_others():
+    delivered, queue = asyncio.run(_deliver_after_flood_wait())
+
+    assert delivered == [1, 2, 1]
+    assert queue.stats.retries == 1
+    assert queue.stats.sent == 2
+
+
+def test_retry_after_gives_up_after_max_retries():
+    queue = asyncio.run(_give_up_after_retries())
+
+    assert queue.stats.retries == 1
+    assert queue.stats.failed == 1
+
+
+async def _chats_after_idle() -> tuple[int, set[int]]:
+    queue = DeliveryQueue(workers=2, global_rate=1_000, chat_rate=1_000)
+    try:
+        await asyncio.gather(
+            *[await queue.submit(chat_id, _send_ok) for chat_id in range(50)]
+        )
+        seen = len(queue._chat_limiters)
+        # Вёдра успевают наполниться; следующая отправка запускает чистку
+        await asyncio.sleep(0.05)
+        queue._next_idle_sweep = 0
+        await (await queue.submit(100, _send_ok))
+        return seen, set(queue._chat_limiters)
+    finally:
+        await queue.close()
+
+
+def test_idle_chat_limiters_are_dropped():
+    seen, left = asyncio.run(_chats_after_idle())
+
+    assert seen == 50
+    assert left == {100}
@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+from aiogram import Bot
+from aiohttp import web
+
+from app.api.priority_limiter import PriorityRateLimiter
+from app.services.danbooru import DanbooruService
+from app.services.subscription_io import (
+    MAX_QUERY_LENGTH,
+    export_document,
+    normalize_query,
+    parse_import,
+)
+
+
+def test_normalize_query():
+    assert normalize_query("  Tag_A   tag_b TAG_A ") == "tag_a tag_b"
+    assert normalize_query("   ") == ""
+
+
+def test_parse_text_skips_comments_and_duplicates():
+    data = "# мои подписки\ntag_a\n\nTAG_A\n  tag_b  rating:g\n".encode()
+
+    assert parse_import(data) == (["tag_a", "tag_b rating:g"], [])
+
+
+def test_parse_json_forms():
+    listed = json.dumps(["tag_a", {"tags": "tag_b"}, 5]).encode()
+    exported = json.dumps({"subscriptions": [{"tags": "tag_c"}]}).encode()
+
+    assert parse_import(listed) == (["tag_a", "tag_b"], [])
+    assert parse_import(exported) == (["tag_c"], [])
+    assert parse_import(b'{"other": 1}') == ([], [])
+
+
+def test_parse_rejects_too_long_queries():
+    long_query = "x" * (MAX_QUERY_LENGTH + 1)
+
+    queries, rejected = parse_import(f"tag_a\n{long_query}".encode())
+
+    assert queries == ["tag_a"]
+    assert rejected == [long_query]
+
+
+def test_export_round_trip():
+    queries = ["tag_a", "tag_b rating:g"]
+
+    assert parse_import(export_document(queries)) == (queries, [])
+
+
+# Ответ Danbooru по запросу: 429 и 503 — временные отказы, 422 — отказ
+RESPONSES = {
+    "busy": lambda: web.Response(status=429, headers={"Retry-After": "0"}),
+    "down": lambda: web.Response(status=503),
+    "bad": lambda: web.json_response({"success": False}, status=422),
+    "quiet": lambda: web.json_response([]),
+    "tag_a": lambda: web.json_response([{"id": 1, "tag_string": "tag_a"}]),
+}
+
+
+async def _posts(request: web.Request) -> web.Response:
+    return RESPONSES[request.query["tags"]]()
+
+
+async def _validate(queries: list[str]) -> tuple[list, list, list]:
+    app = web.Application()
+    app.router.add_get("/posts.json", _posts)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+
+    bot = Bot("123456:test-token")
+    service = DanbooruService(
+        None, bot, admin_id=1, danbooru_url=f"http://{host}:{port}"
+    )
+    # Доля полосы BACKFILL в настоящем бюджете растянула бы тест
+    service.api.rate_limiter = PriorityRateLimiter(max_calls=1_000, period=1)
+    try:
+        return await service.validate_queries(queries)
+    finally:
+        await service.close()
+        await bot.session.close()
+        await runner.cleanup()
+
+
+def test_transient_failures_are_unchecked_not_rejected():
+    rejected, empty, unchecked = asyncio.run(_validate(list(RESPONSES)))
+
+    assert rejected == ["bad"]
+    assert empty == ["quiet"]
+    assert unchecked == ["busy", "down"]
@@ -0,0 +1,71 @@
+import asyncio
+
+from aiogram import Bot
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.database import create_engine
+from app.services.danbooru import DanbooruService
+from app.services.repository import Repo
+from bot import create_schema
+
+ADMIN_ID = 1
+SEEN = range(101, 111)
+# Схема до мультичата: история отправленного — голые id в posts
+BASELINE_DDL = (
+    "CREATE TABLE subscriptions "
+    "(id INTEGER PRIMARY KEY, tags VARCHAR(255) UNIQUE)",
+    "CREATE TABLE posts (id INTEGER PRIMARY KEY)",
+    "INSERT INTO subscriptions (id, tags) VALUES (1, 'tag_a')",
+    *(f"INSERT INTO posts (id) VALUES ({post_id})" for post_id in SEEN),
+)
+
+
+def _post(post_id: int) -> dict:
+    return {"id": post_id, "file_ext": "jpg", "tag_string": "tag_a"}
+
+
+async def _upgrade_and_sweep(tmp_path) -> tuple[dict, bool]:
+    engine = create_engine(f"sqlite+aiosqlite:///{tmp_path}/db.sqlite")
+    async with engine.begin() as conn:
+        for statement in BASELINE_DDL:
+            await conn.execute(text(statement))
+
+    await create_schema(engine, ADMIN_ID)
+    session_pool = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_pool() as session:
+        repo = Repo(session)
+        await repo.adopt_orphan_subscriptions(ADMIN_ID)
+        subs = await repo.get_subscriptions_for_polling()
+
+    bot = Bot("123456:test-token")
+    service = DanbooruService(
+        session_pool, bot, ADMIN_ID, deliver_after_poll=False
+    )
+
+    async def fetch_group(group):
+        # Danbooru отдаёт те же последние посты, что видела старая версия
+        return [_post(post_id) for post_id in reversed(SEEN)]
+
+    service._fetch_group = fetch_group
+    try:
+        await service.check_new_posts(subs)
+    finally:
+        await service.close()
+        await bot.session.close()
+
+    async with session_pool() as session:
+        outbox = await Repo(session).count_outbox()
+    async with engine.connect() as conn:
+        has_posts = await conn.run_sync(
+            lambda sync_conn: inspect(sync_conn).has_table("posts")
+        )
+    await engine.dispose()
+    return outbox, has_posts
+
+
+def test_upgrade_keeps_seen_posts(tmp_path):
+    outbox, has_posts = asyncio.run(_upgrade_and_sweep(tmp_path))
+
+    assert outbox == {"sent": len(SEEN)}
+    assert not has_posts
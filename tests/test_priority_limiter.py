@@ -0,0 +1,59 @@
+import asyncio
+
+from app.api.priority_limiter import Lane, PriorityRateLimiter
+
+
+async def _grant_order() -> list[Lane]:
+    limiter = PriorityRateLimiter(max_calls=1, period=0.02)
+    await limiter.acquire(Lane.INTERACTIVE)
+    order = []
+
+    async def take(lane: Lane) -> None:
+        await limiter.acquire(lane)
+        order.append(lane)
+
+    # Ведро пустое: все ждут, фоновые полосы встали в очередь первыми
+    tasks = []
+    for lane in (Lane.BACKFILL, Lane.SCHEDULED, Lane.INTERACTIVE):
+        tasks.append(asyncio.create_task(take(lane)))
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    await limiter.close()
+    return order
+
+
+def test_higher_priority_lane_is_served_first():
+    assert asyncio.run(_grant_order()) == [
+        Lane.INTERACTIVE,
+        Lane.SCHEDULED,
+        Lane.BACKFILL,
+    ]
+
+
+async def _wait_after_429() -> tuple[float, float]:
+    limiter = PriorityRateLimiter(max_calls=100, period=1)
+    await limiter.acquire()
+    limiter.on_rate_limited(0.2)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await limiter.acquire(Lane.INTERACTIVE)
+    waited = loop.time() - started
+    await limiter.close()
+    return waited, limiter.rate
+
+
+def test_rate_limited_pauses_all_lanes_and_halves_rate():
+    waited, rate = asyncio.run(_wait_after_429())
+
+    assert waited >= 0.2
+    assert rate == 50
+
+
+def test_rate_recovers_after_successes():
+    limiter = PriorityRateLimiter(max_calls=100, period=1, recovery=0.25)
+    limiter.rate = 30
+
+    for _ in range(3):
+        limiter.on_success()
+
+    assert limiter.rate == 100
@@ -0,0 +1,91 @@
+from app.services.query_planner import FetchGroup, is_packable, plan_queries
+
+
+def _post(post_id: int, tags: str) -> dict:
+    return {"id": post_id, "tag_string": tags}
+
+
+def test_single_tag_subscriptions_are_packed_by_watermark():
+    subs = [
+        (1, "tag_a", 100),
+        (2, "tag_b", 10),
+        (3, "tag_c", 50),
+        (4, "tag_d", 90),
+    ]
+
+    groups = plan_queries(subs, tag_limit=2)
+
+    # Близкие отметки попадают в одну группу, запрос — от меньшей
+    assert [(g.query, g.last_post_id) for g in groups] == [
+        ("~tag_b ~tag_c", 10),
+        ("~tag_d ~tag_a", 90),
+    ]
+
+
+def test_complex_new_and_excluded_subscriptions_go_alone():
+    subs = [
+        (1, "tag_a rating:g", 10),
+        (2, "-tag_b", 10),
+        (3, "tag_*", 10),
+        (4, "tag_new", None),
+        (5, "tag_alias", 10),
+        (6, "tag_x", 10),
+    ]
+
+    groups = plan_queries(subs, tag_limit=2, exclude={"tag_alias"})
+
+    assert [g.query for g in groups] == [
+        "tag_a rating:g",
+        "-tag_b",
+        "tag_*",
+        "tag_new",
+        "tag_alias",
+        "tag_x",
+    ]
+    assert not any(g.is_combined for g in groups)
+
+
+def test_no_packing_without_or_support():
+    groups = plan_queries([(1, "tag_a", 1), (2, "tag_b", 1)], tag_limit=1)
+
+    assert [g.query for g in groups] == ["tag_a", "tag_b"]
+
+
+def test_is_packable():
+    assert is_packable("tag_a")
+    assert not is_packable("tag_a tag_b")
+    assert not is_packable("~tag_a")
+    assert not is_packable("order:rank")
+
+
+def test_split_matches_posts_above_each_watermark():
+    group = FetchGroup(
+        "~tag_a ~tag_b", 10, [(1, "tag_a", 10), (2, "tag_b", 20)]
+    )
+    posts = [
+        _post(25, "tag_a tag_b"),
+        _post(15, "tag_b"),
+        _post(12, "tag_alias_of_a"),
+    ]
+
+    matched, unmatched = group.split(posts)
+
+    # Пост 15 старше отметки tag_b — он уже был доставлен
+    assert {
+        sub_id: [p["id"] for p in found] for sub_id, found in matched.items()
+    } == {
+        1: [25],
+        2: [25],
+    }
+    assert [p["id"] for p in unmatched] == [12]
+
+
+def test_marks_advance_to_newest_post():
+    group = FetchGroup(
+        "~tag_a ~tag_b", 10, [(1, "tag_a", 10), (2, "tag_b", 40)]
+    )
+
+    assert group.advance_marks([_post(30, "tag_a"), _post(20, "tag_a")]) == {
+        1: 30
+    }
+    assert group.advance_marks([]) == {}
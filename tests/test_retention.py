@@ -0,0 +1,159 @@
+import asyncio
+from datetime import timedelta
+
+from aiogram import Bot
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.database import create_engine
+from app.models.base import Base, utcnow
+from app.models.outbox import (
+    OUTBOX_FAILED,
+    OUTBOX_PENDING,
+    OUTBOX_SENT,
+    OutboxItem,
+)
+from app.models.subscribers import Subscriber
+from app.models.subscriptions import Subscription
+from app.services.danbooru import DanbooruService
+from app.services.repository import Repo
+from app.services.retention import RetentionService
+
+CHAT_ID = 5
+POST = {"id": 10, "file_ext": "jpg", "tag_string": "tag_a", "rating": "g"}
+
+
+async def _queue_post(session_pool) -> int:
+    """Ставит POST в outbox свежим сервисом — с пустым кэшем доставок."""
+    bot = Bot("123456:test-token")
+    service = DanbooruService(session_pool, bot, admin_id=1)
+    try:
+        return await service._filter_new_posts(
+            {POST["id"]: POST}, {POST["id"]: {CHAT_ID}}
+        )
+    finally:
+        await service.close()
+        await bot.session.close()
+
+
+async def _compact_then_requeue(tmp_path) -> tuple[int, int, list]:
+    engine = create_engine(f"sqlite+aiosqlite:///{tmp_path}/db.sqlite")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_pool = async_sessionmaker(engine, expire_on_commit=False)
+
+    assert await _queue_post(session_pool) == 1
+    # Отправлено давно — за пределами keep_sent_days
+    sent_at = utcnow() - timedelta(days=30)
+    async with session_pool() as session:
+        repo = Repo(session)
+        items = await repo.claim_outbox(10, "test", sent_at, utcnow())
+        await repo.finish_outbox([item.id for item in items], {}, 5, sent_at)
+
+    retention = RetentionService(
+        session_pool, engine, notify=None, keep_sent_days=7
+    )
+    compacted = await retention.compact_outbox()
+    requeued = await _queue_post(session_pool)
+
+    async with session_pool() as session:
+        rows = (
+            await session.execute(
+                select(OutboxItem.status, OutboxItem.payload)
+            )
+        ).all()
+    await engine.dispose()
+    return compacted, requeued, rows
+
+
+def test_compacted_delivery_is_not_requeued(tmp_path):
+    compacted, requeued, rows = asyncio.run(_compact_then_requeue(tmp_path))
+
+    assert compacted == 1
+    assert requeued == 0
+    assert [tuple(row) for row in rows] == [(OUTBOX_SENT, "")]
+
+
+def _outbox_row(chat_id: int, post_id: int, status: str, at) -> dict:
+    return {
+        "chat_id": chat_id,
+        "post_id": post_id,
+        "payload": "",
+        "status": status,
+        "attempts": 0,
+        "created_at": at,
+        "updated_at": at,
+    }
+
+
+async def _prune(tmp_path) -> tuple[int, list]:
+    engine = create_engine(f"sqlite+aiosqlite:///{tmp_path}/db.sqlite")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_pool = async_sessionmaker(engine, expire_on_commit=False)
+
+    old = utcnow() - timedelta(days=30)
+    async with session_pool() as session:
+        session.add_all(
+            [
+                Subscription(id=1, tags="tag_a", last_post_id=100),
+                Subscription(id=2, tags="tag_b", last_post_id=50),
+                Subscriber(subscription_id=1, chat_id=CHAT_ID),
+                Subscriber(subscription_id=2, chat_id=CHAT_ID),
+                # Ещё не опрошенная подписка: первый опрос вернёт что угодно
+                Subscription(id=3, tags="tag_c"),
+                Subscriber(subscription_id=3, chat_id=7),
+            ]
+        )
+        await session.commit()
+        rows = [
+            # Ниже отметок чата 5 (50): удаляются, кроме ожидающей
+            *(_outbox_row(CHAT_ID, i, OUTBOX_SENT, old) for i in range(10)),
+            _outbox_row(CHAT_ID, 10, OUTBOX_FAILED, old),
+            _outbox_row(CHAT_ID, 11, OUTBOX_PENDING, old),
+            _outbox_row(CHAT_ID, 12, OUTBOX_SENT, utcnow()),
+            # Выше отметки tag_b: их ещё может вернуть опрос
+            _outbox_row(CHAT_ID, 60, OUTBOX_SENT, old),
+            _outbox_row(CHAT_ID, 70, OUTBOX_SENT, old),
+            _outbox_row(7, 1, OUTBOX_SENT, old),
+            # Чат без подписок: остаются только keep_per_chat свежих
+            *(_outbox_row(9, i, OUTBOX_SENT, old) for i in range(5)),
+        ]
+        await session.execute(insert(OutboxItem), rows)
+        await session.commit()
+
+    retention = RetentionService(
+        session_pool,
+        engine,
+        notify=None,
+        batch_size=3,
+        keep_sent_days=7,
+        keep_per_chat=2,
+    )
+    deleted = await retention.prune_outbox()
+
+    async with session_pool() as session:
+        left = (
+            await session.execute(
+                select(OutboxItem.chat_id, OutboxItem.post_id).order_by(
+                    OutboxItem.chat_id, OutboxItem.post_id
+                )
+            )
+        ).all()
+    await engine.dispose()
+    return deleted, [tuple(row) for row in left]
+
+
+def test_prune_deletes_history_below_watermarks(tmp_path):
+    deleted, left = asyncio.run(_prune(tmp_path))
+
+    assert deleted == 14
+    assert left == [
+        (CHAT_ID, 11),
+        (CHAT_ID, 12),
+        (CHAT_ID, 60),
+        (CHAT_ID, 70),
+        (7, 1),
+        (9, 3),
+        (9, 4),
+    ]
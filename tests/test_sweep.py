@@ -0,0 +1,82 @@
+import asyncio
+
+from aiogram import Bot
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.database import create_engine
+from app.models.base import Base
+from app.models.subscribers import Subscriber
+from app.models.subscriptions import Subscription
+from app.services.danbooru import DanbooruService
+from app.services.repository import Repo
+
+CHAT_ID = 5
+# Ответ Danbooru на упакованный запрос ~tag_a ~tag_b
+POSTS = [
+    {"id": 30, "file_ext": "jpg", "tag_string": "tag_a", "rating": "g"},
+    {"id": 25, "file_ext": "jpg", "tag_string": "tag_b", "rating": "g"},
+    {"id": 20, "file_ext": "jpg", "tag_string": "tag_a", "rating": "g"},
+]
+
+
+async def _sweep_twice(tmp_path) -> tuple[dict, dict, list, list]:
+    engine = create_engine(f"sqlite+aiosqlite:///{tmp_path}/db.sqlite")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_pool = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_pool() as session:
+        session.add_all(
+            [
+                Subscription(id=1, tags="tag_a", last_post_id=10),
+                Subscription(id=2, tags="tag_b", last_post_id=22),
+                Subscriber(subscription_id=1, chat_id=CHAT_ID),
+                Subscriber(subscription_id=2, chat_id=CHAT_ID),
+            ]
+        )
+        await session.commit()
+
+    bot = Bot("123456:test-token")
+    service = DanbooruService(
+        session_pool, bot, admin_id=1, deliver_after_poll=False
+    )
+    queries = []
+
+    async def fetch_group(group):
+        queries.append(group.query)
+        return [post for post in POSTS if post["id"] > group.last_post_id]
+
+    service._fetch_group = fetch_group
+    queued = []
+    try:
+        for _ in range(2):
+            async with session_pool() as session:
+                subs = await Repo(session).get_subscriptions_for_polling()
+            arrivals = await service.check_new_posts(subs)
+            async with session_pool() as session:
+                queued.append(await Repo(session).count_outbox())
+    finally:
+        await service.close()
+        await bot.session.close()
+
+    async with session_pool() as session:
+        marks = dict(
+            (
+                await session.execute(
+                    select(Subscription.id, Subscription.last_post_id)
+                )
+            ).all()
+        )
+    await engine.dispose()
+    return marks, arrivals, queries, queued
+
+
+def test_sweep_advances_watermarks_and_skips_seen_posts(tmp_path):
+    marks, arrivals, queries, queued = asyncio.run(_sweep_twice(tmp_path))
+
+    # Обе подписки — в одном запросе, от меньшей отметки
+    assert queries == ["~tag_a ~tag_b", "~tag_a ~tag_b"]
+    assert marks == {1: 30, 2: 30}
+    # Второй опрос начинается с новой отметки и ничего не находит
+    assert arrivals == {1: 0, 2: 0}
+    assert queued == [{"pending": 3}, {"pending": 3}]